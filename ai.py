@@ -3,8 +3,11 @@ import math
 import pymunk
 from pymunk import Vec2d
 from collections import deque  # , defaultdict # Also unused.
+import heapq
 from typing import Any, Callable, List
 import gameobjects
+import mapcompile
+from metrics import counters
 
 # 3 degrees, a bit more than we can turn each tick.
 MIN_ANGLE_DIF = math.radians(2)
@@ -35,6 +38,10 @@ class AI:
     Also capable of shooting other tanks and or woodboxes.
     """
 
+    # Ticks the forward model plays ahead, to decide whether shooting a
+    # woodbox pays off: long enough to fire the two shots breaking one.
+    LOOKAHEAD = 90
+
     def __init__(self, tank, objects, tanks_list, space, current_map):
         """Initialize an instance of AI."""
         self.tank = tank
@@ -46,10 +53,17 @@ class AI:
         self.MAX_X = current_map.width - 1
         self.MAX_Y = current_map.height - 1
 
+        # Precomputed reachability and distances (see mapcompile).
+        self.compiled_map = mapcompile.compiled(current_map)
+
         self.move_cycle = self.move_cycle_gen()
         self.update_grid_pos()
         self.path = deque()
 
+        # The last woodbox looked at, with its hp and from which tile, and
+        # whether shooting it was worth it.
+        self._box_decision = (None, False)
+
     def update_grid_pos(self):
         """
         Update the AI's position on the grid.
@@ -71,7 +85,8 @@ class AI:
         """
         Make a raycast query in front of the tank.
 
-        If another tank or a wooden box is found, then shoot.
+        If another tank is found, then shoot. A wooden box is only shot if
+        that gets the tank closer to its target (see worth_shooting).
         """
         start = (self.tank.body.position
                  + Vec2d(0, 0.4).rotated(self.tank.body.angle))
@@ -80,6 +95,7 @@ class AI:
                                          .rotated(self.tank.body.angle)
                                          * (self.MAX_X**2))
 
+        counters.raycasts += 1
         obj_looked_at = self.tank.space.segment_query_first(
             start,
             end,
@@ -87,7 +103,11 @@ class AI:
             pymunk.ShapeFilter()
         )
 
-        if obj_looked_at and obj_looked_at.shape.collision_type in {2, 3}:
+        if not obj_looked_at:
+            return None
+        if (obj_looked_at.shape.collision_type == 3
+                or (obj_looked_at.shape.collision_type == 2
+                    and self.worth_shooting(obj_looked_at.shape.parent, gs))):
             bullet = self.tank.shoot(gs)
             self.tank.guided_bullet = None
             # Increase speed for AI bullets.
@@ -95,6 +115,51 @@ class AI:
                 bullet.body.velocity *= 1.3
             return bullet
 
+    def worth_shooting(self, box, gs):
+        """
+        Return whether shooting a woodbox gets the tank closer to its target.
+
+        The forward model plays the tank's current move for LOOKAHEAD ticks,
+        once shooting and once holding fire. The decision is kept until the
+        tank looks at another box, from another tile or at another hp.
+
+        While the tank is not driving, or the box is further than it can
+        drive in LOOKAHEAD ticks, the model cannot tell whether the box is
+        in the way, and it is shot as before.
+        """
+        reach = (self.tank.NORMAL_MAX_SPEED * self.LOOKAHEAD
+                 / gs.settings.FRAMERATE + 1)
+        if (not self.tank.acceleration
+                or self.tank.body.position.get_distance(box.body.position)
+                > reach):
+            return True
+
+        key = (box, box.hp,
+               self.get_tile_of_position(self.tank.body.position))
+        if key != self._box_decision[0]:
+            goal = self.get_target_tile()
+            team = self.tanks_list.index(self.tank)
+            move = (self.tank.acceleration, self.tank.rotation)
+            shoot, hold = gs.forward_model().evaluate(
+                team,
+                [[(*move, 1)] * self.LOOKAHEAD, [(*move, 0)] * self.LOOKAHEAD],
+                lambda rollout, team: self.distance_left(
+                    Vec2d(*rollout.tank_position(team)), goal))
+            self._box_decision = (key, shoot < hold)
+        return self._box_decision[1]
+
+    def distance_left(self, position, goal):
+        """
+        Return how far a position is from the goal tile.
+
+        Returned as the distance in tiles along the map, when it is
+        precomputed, then in a straight line.
+        """
+        tile = self.get_tile_of_position(position)
+        distance = self.compiled_map.distance(tile, goal)
+        return (math.inf if distance is None else distance,
+                position.get_distance(goal + Vec2d(0.5, 0.5)))
+
     def get_angle(self, next_coord):
         """Get angle to go next."""
         diff = (self.grid_pos - next_coord + Vec2d(0.5, 0.5)).int_tuple
@@ -187,12 +252,26 @@ class AI:
         A simple Breadth First Search using integer coordinates as our nodes.
         Edges are calculated as we go, using an external function.
         """
+        counters.replans += 1
         goal = self.get_target_tile()
 
+        # Don't search for a goal which cannot be reached at all.
+        if not self.compiled_map.reachable(self.grid_pos, goal):
+            return deque([self.grid_pos])
+
+        # Exact distances to the goal, if they are precomputed for it.
+        field = self.compiled_map.distances_to(goal)
+        # Tiles searched are all on the map, so they are read from the grid
+        # without the bounds check of boxAt.
+        grid, width = self.current_map.grid, self.current_map.width
+
         def heuristic(v):
-            distance = goal.get_dist_sqrd(v)
+            if field is not None:
+                distance = field[v.y * width + v.x]
+            else:
+                distance = goal.get_dist_sqrd(v)
 
-            if self.current_map.boxAt(v.x, v.y) == 3:
+            if grid[v.y * width + v.x] == 3:
                 return distance + 9000
             else:
                 return distance
@@ -262,10 +341,12 @@ class AI:
         up = coord - Vec2d(0, 1)
         down = coord + Vec2d(0, 1)
 
+        # Read from the grid once on the map, as boxAt checks it again.
+        grid, width = self.current_map.grid, self.current_map.width
         return [i for i in [left, right, up, down]
                 if 0 <= i.x <= self.MAX_X
                 and 0 <= i.y <= self.MAX_Y
-                and self.current_map.boxAt(i.x, i.y) in {0, 2, 3}]
+                and grid[i.y * width + i.x] in {0, 2, 3}]
 
 
 def A_star(goal: tuple,
@@ -274,34 +355,36 @@ def A_star(goal: tuple,
            nextfn: Callable[[Any], List[Any]],
            heuristic: Callable[[Any], Any]
            ) -> dict:
-    """Search for shortest path to a vertex in a graph."""
-    if not queue or queue[0] == goal:
-        return {}
-    else:
-        next_vertices = [pos_tuple for v in nextfn(queue[0][0])
-                         if (pos_tuple := (v, heuristic(v))) not in visited
-                         and pos_tuple not in queue]
-
-        return merge_dicts({v[0]: queue[0][0] for v in next_vertices},
-                           A_star(goal,
-                                  visited + queue[:1],
-                                  sorted(queue[1:] + next_vertices,
-                                         key=lambda x: x[1]),
-                                  nextfn,
-                                  heuristic
-                                  ))
+    """
+    Search for shortest path to a vertex in a graph.
+
+    Vertices are expanded lowest heuristic first (in the order they were
+    found on ties), until the goal is. Return the vertex every vertex was
+    found from.
+    """
+    seen = {v for v, _ in visited} | {v for v, _ in queue}
+    heap = [(h, i, v) for i, (v, h) in enumerate(queue)]
+    heapq.heapify(heap)
+    found = len(heap)
+    traversal = {}
+    while heap:
+        _, _, vertex = heapq.heappop(heap)
+        if vertex == goal:
+            break
+        for v in nextfn(vertex):
+            if v not in seen:
+                seen.add(v)
+                traversal[v] = vertex
+                heapq.heappush(heap, (heuristic(v), found, v))
+                found += 1
+    return traversal
 
 
 def reconstruct(goal: Any, traversal: dict) -> list:
     """Reconstruct the shortest to a goal path from a BFS traversal."""
-    if goal not in traversal:
-        return []
-    else:
-        return reconstruct(traversal[goal], traversal) + [goal]
-
-
-def merge_dicts(d1: dict, d2: dict) -> dict:
-    """Return the result of d1.update(d2) dictionaries without altering d1."""
-    temp = d1.copy()
-    temp.update(d2)
-    return temp
+    path = []
+    while goal in traversal:
+        path.append(goal)
+        goal = traversal[goal]
+    path.reverse()
+    return path
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Packs all sprites, decoded and ready to draw, into one cache file.
+
+Building the cache (run this module) loads every sprite category the normal
+way and stores the final pixels of each surface in one file, after an index.
+At launch the file is memory-mapped and the surfaces are created straight
+from it, skipping PNG decoding, scaling and conversion. The cache is ignored
+(and should be rebuilt) as soon as a PNG in the data directory, the way a
+category is loaded (resources.CATEGORIES) or the version of pygame changes.
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import types
+import pygame
+import resources
+
+MAIN_DIR = os.path.split(os.path.abspath(__file__))[0]
+DATA_DIR = os.path.join(MAIN_DIR, 'data')
+CACHE_FILE = os.path.join(DATA_DIR, 'assets.cache')
+
+# File layout: magic, version, length of the JSON index, the index, then the
+# pixel buffers (in BGRA order, the layout of convert_alpha surfaces).
+MAGIC = b'CTFASSET'
+VERSION = 2
+_HEADER = struct.Struct('<8sII')
+_ALIGN = 16
+_FORMAT = 'BGRA'
+
+
+def _sources():
+    """Return the size and modification time of every PNG, by file name."""
+    sources = {}
+    for file_name in sorted(os.listdir(DATA_DIR)):
+        if file_name.endswith('.png'):
+            stat = os.stat(os.path.join(DATA_DIR, file_name))
+            sources[file_name] = [stat.st_size, stat.st_mtime_ns]
+    return sources
+
+
+def _code_key(code):
+    """Return what a function's code does, leaving out its line numbers."""
+    return [code.co_code.hex(),
+            code.co_names,
+            [_code_key(const) if isinstance(const, types.CodeType)
+             else repr(const)
+             for const in code.co_consts]]
+
+
+def _loaders():
+    """Return a hash of how every sprite category is loaded and converted."""
+    loaders = {category: _code_key(load.__code__)
+               for category, load in resources.CATEGORIES.items()}
+    loaders['_load_image'] = _code_key(resources._load_image.__code__)
+    return hashlib.sha1(json.dumps(loaders).encode()).hexdigest()
+
+
+def _key():
+    """Return what the cached sprites depend on, besides the PNG files."""
+    return {'loaders': _loaders(), 'pygame': pygame.version.ver}
+
+
+def _aligned(offset):
+    """Round offset up to the buffer alignment."""
+    return -(-offset // _ALIGN) * _ALIGN
+
+
+def build(path=CACHE_FILE):
+    """Load every sprite category and write them to the cache at path."""
+    if pygame.display.get_surface() is None:
+        # Surfaces can only be converted once there is a display.
+        pygame.display.set_mode((1, 1), pygame.HIDDEN)
+
+    index = {'sources': _sources(), 'key': _key(), 'categories': {}}
+    buffers = []
+    offset = 0
+    for category in resources.CATEGORIES:
+        sprites = resources.CATEGORIES[category]()
+        is_list = isinstance(sprites, list)
+        images = []
+        for surface in (sprites if is_list else [sprites]):
+            data = pygame.image.tobytes(surface, _FORMAT)
+            images.append([offset, *surface.get_size()])
+            buffers.append((offset, data))
+            offset = _aligned(offset + len(data))
+        index['categories'][category] = {'list': is_list, 'images': images}
+
+    index_bytes = json.dumps(index).encode()
+    start = _aligned(_HEADER.size + len(index_bytes))
+    # Write a temporary file and move it in place, so that an interrupted
+    # build never leaves a partial cache behind.
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, len(index_bytes)))
+            f.write(index_bytes)
+            for buffer_offset, data in buffers:
+                f.seek(start + buffer_offset)
+                f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def load(path=CACHE_FILE):
+    """
+    Return every cached sprite category, by name.
+
+    Return an empty dict if there is no cache, or it is out of date or
+    truncated.
+    """
+    try:
+        with open(path, 'rb') as f:
+            # A private mapping: drawing on a sprite never touches the file.
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    except (OSError, ValueError):
+        return {}
+
+    try:
+        magic, version, index_size = _HEADER.unpack_from(mapped)
+        if magic != MAGIC or version != VERSION:
+            return {}
+        index = json.loads(mapped[_HEADER.size:_HEADER.size + index_size])
+        if index['sources'] != _sources() or index['key'] != _key():
+            return {}
+    except (struct.error, ValueError, KeyError, TypeError):
+        return {}
+
+    start = _aligned(_HEADER.size + index_size)
+    if any(start + offset + 4 * w * h > len(mapped)
+           for entry in index['categories'].values()
+           for offset, w, h in entry['images']):
+        return {}
+    view = memoryview(mapped)
+    categories = {}
+    for category, entry in index['categories'].items():
+        surfaces = [pygame.image.frombuffer(
+                        view[start + offset:start + offset + 4 * w * h],
+                        (w, h),
+                        _FORMAT)
+                    for offset, w, h in entry['images']]
+        categories[category] = surfaces if entry['list'] else surfaces[0]
+    return categories
+
+
+if __name__ == '__main__':
+    pygame.init()
+    build()
+    print(f'Wrote {CACHE_FILE}')
@@ -0,0 +1,73 @@
+"""Helpers shared by the benchmarks: headless setup, maps and timing."""
+import os
+import statistics
+import sys
+import time
+
+MAIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, MAIN_DIR)
+
+# Benchmarks never open a window or play sound.
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import pygame  # noqa: E402
+import camera  # noqa: E402
+import gamestate  # noqa: E402
+import handle_events  # noqa: E402
+import mapgen  # noqa: E402
+import resources  # noqa: E402
+
+
+def init_display(size=(800, 800)):
+    """Initialize pygame headless and return the screen."""
+    pygame.init()
+    return pygame.display.set_mode(size)
+
+
+def sweep_sizes(max_size):
+    """Return the map sizes of the benchmark sweep, up to max_size."""
+    return [size for size in mapgen.SWEEP_SIZES if size <= max_size]
+
+
+def generated_map(size, players=4, seed=0):
+    """Return the generated square map used by benchmarks for a size."""
+    return mapgen.generate(size, size, players=players, seed=seed)
+
+
+def new_gamestate(screen, current_map, nplayers=0, **settings_overrides):
+    """
+    Return a fresh game state on a map, without sound or clock.
+
+    Keyword arguments override settings, e.g. PHYSICS_SUBSTEPS=2.
+    """
+    settings = resources.Constants()
+    settings.SOUND = False
+    settings.USE_CLOCK = False
+    settings.NPLAYERS = nplayers
+    for name, value in settings_overrides.items():
+        setattr(settings, name, value)
+    gs = gamestate.GameState(screen, current_map=current_map,
+                             settings=settings)
+    gs.generate_fresh()
+    gs.add_collision_handlers()
+    return gs
+
+
+def show(screen, gs):
+    """Set up the camera of a game state, return the surface it draws on."""
+    target, ratio = handle_events.render_target(screen, gs.current_map,
+                                                gs.settings)
+    gs.sprites.rescale(ratio)
+    gs.camera = camera.Camera(target, gs, ratio)
+    return target
+
+
+def timed(function, repeat=5):
+    """Call function repeat times, return the median of its run time."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
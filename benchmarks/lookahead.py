@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Throughput and accuracy of the forward model (forwardmodel.py).
+
+For map0 and generated maps, reports the time of a game tick (physics, flag)
+and of a model tick, the time to copy the model, and how many rollouts of a
+second of play fit in a frame. Then replays the tanks' actions of a game in
+the model, shots included, a second at a time, and reports how far (in
+tiles) the model's tanks drift from the game's, and on how many tiles boxes
+and woodbox hp differ.
+Usage: python benchmarks/lookahead.py [ticks]
+"""
+import statistics
+import sys
+from common import generated_map, init_display, new_gamestate, timed
+import forwardmodel
+import maps
+
+MAPS = {'map0': lambda: maps.map0,
+        'generated-50, 4 tanks': lambda: generated_map(50),
+        'generated-100, 50 tanks': lambda: generated_map(100, players=50)}
+
+
+def run(screen, current_map, ticks):
+    """Return the time of a game tick, a model tick and a model copy."""
+    gs = new_gamestate(screen, current_map)
+
+    def game_ticks():
+        for _ in range(ticks):
+            gs.update_physics(0)
+            gs.tanks_try_grab_flag()
+            gs.tanks_won()
+    game = timed(game_ticks, 3) / ticks
+
+    model = forwardmodel.ForwardModel.from_game(gs)
+    actions = {team: (1, (-1) ** team, 1) for team in range(len(gs.tanks))}
+
+    def model_ticks():
+        rollout = model.copy()
+        for _ in range(ticks):
+            rollout.step(actions)
+    tick = timed(model_ticks, 3) / ticks
+    copy = timed(lambda: [model.copy() for _ in range(100)]) / 100
+    return game, tick, copy
+
+
+def drift(screen, ticks, window=60):
+    """
+    Return how far the model drifts from the game over windows.
+
+    Returned as the median and largest distance of the tanks from the
+    game's, and of tiles whose box or woodbox hp differ from the game's.
+    """
+    gs = new_gamestate(screen, maps.map0)
+    drifts, boxes = [], []
+    model = forwardmodel.ForwardModel.from_game(gs)
+    # Tanks which shot when deciding, which the game fires on the next tick.
+    shot = {}
+    for tick in range(1, ticks + 1):
+        actions = {team: (tank.acceleration, tank.rotation,
+                          shot.get(team, False))
+                   for team, tank in enumerate(gs.tanks)}
+        gs.update_physics(0)
+        gs.tanks_try_grab_flag()
+        if gs.tanks_won():
+            gs.generate_fresh()
+            gs.add_collision_handlers()
+            model = forwardmodel.ForwardModel.from_game(gs)
+            shot = {}
+            continue
+        model.step(actions)
+        gs.decide_all_bots()
+        # Shooting resets the cooldown to the framerate.
+        shot = {team: tank.cooldown_bullet == gs.settings.FRAMERATE
+                for team, tank in enumerate(gs.tanks)}
+
+        if tick % window == 0:
+            drifts.append(max(
+                tank.body.position.get_distance(model.tank_position(team))
+                for team, tank in enumerate(gs.tanks)))
+            game = forwardmodel.ForwardModel.from_game(gs)
+            boxes.append(sum(
+                (a, b) != (c, d) for a, b, c, d in zip(
+                    model.grid, model.box_hp, game.grid, game.box_hp)))
+            model = game
+    return (statistics.median(drifts), max(drifts),
+            statistics.median(boxes), max(boxes))
+
+
+def main(ticks):
+    """Print the model's throughput for every map, and its drift."""
+    screen = init_display()
+    print(f'{"map":<26}{"game tick us":>14}{"model tick us":>15}'
+          f'{"copy us":>9}{"rollouts/frame":>16}')
+    for name, current_map in MAPS.items():
+        game, tick, copy = run(screen, current_map(), ticks)
+        # Rollouts of a second of play which fit in a frame.
+        rollouts = (1 / 60) / (60 * tick + copy)
+        print(f'{name:<26}{game * 1e6:>14.1f}{tick * 1e6:>15.1f}'
+              f'{copy * 1e6:>9.1f}{rollouts:>16.1f}')
+
+    median, largest, boxes, most = drift(screen, max(ticks, 600))
+    print(f'\nDrift of the tanks after a second on map0: median '
+          f'{median:.2f} tiles, largest {largest:.2f} tiles')
+    print(f'Tiles whose box or woodbox hp differ: median {boxes:.0f}, '
+          f'most {most}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 600)
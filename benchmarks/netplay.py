@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Tick time and bandwidth of the game server (server.py) under 8 clients.
+
+Runs a server on a generated map, and 8 bot clients over UDP on localhost
+holding random keys, for some seconds of play at 60 ticks a second. The
+clients drop a share of the snapshots they get, as a lossy network would,
+and every snapshot they rebuild from deltas is checked against the
+server's. Reports the server's tick time, the bandwidth per client, and the
+size of the deltas against the full snapshots.
+Usage: python benchmarks/netplay.py [seconds] [loss]
+"""
+import asyncio
+import random
+import statistics
+import sys
+from common import generated_map
+import client
+import netcode
+import server
+
+CLIENTS = 8
+MAP_SIZE = 32
+
+# Chance a bot changes the keys it holds, every tick.
+KEY_CHANGE = 1 / 20
+
+
+class BotClient(client.ClientProtocol):
+    """A client losing some snapshots, checking those it rebuilds."""
+
+    def __init__(self, game, loss, rng):
+        """Initialize a bot of a server, losing a share loss of snapshots."""
+        super().__init__()
+        self.game = game
+        self.loss = loss
+        self.rng = rng
+        self.checked = 0
+        self.mismatches = 0
+
+    def datagram_received(self, data, address):
+        """Lose the snapshot, or check it against the server's."""
+        if data[0] == netcode.SNAPSHOT and self.rng.random() < self.loss:
+            return
+        tick = self.tick
+        super().datagram_received(data, address)
+        if self.tick != tick and self.tick in self.game.history:
+            self.checked += 1
+            if self.entities() != self.game.history[self.tick]:
+                self.mismatches += 1
+
+
+async def drive(transport, protocol, rng, period):
+    """Send random keys every tick, until cancelled."""
+    keys = (0, 0, 0)
+    while True:
+        if rng.random() < KEY_CHANGE:
+            keys = (rng.choice((-1, 0, 1, 1)), rng.choice((-1, 0, 1)),
+                    rng.random() < 0.5)
+        transport.sendto(netcode.input_message(protocol.tick, *keys))
+        await asyncio.sleep(period)
+
+
+async def run(seconds, loss):
+    """Play seconds of a server with bots, and print its stats."""
+    gs = server.new_gamestate(generated_map(MAP_SIZE, players=CLIENTS),
+                              CLIENTS)
+    game = server.GameServer(gs)
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: game, local_addr=('127.0.0.1', 0))
+    address = transport.get_extra_info('sockname')
+
+    rng = random.Random(0)
+    bots = [await loop.create_datagram_endpoint(
+                lambda: BotClient(game, loss, rng), remote_addr=address)
+            for _ in range(CLIENTS)]
+    for bot_transport, bot in bots:
+        bot_transport.sendto(netcode.hello())
+    await asyncio.gather(*(bot.welcomed for _, bot in bots))
+
+    tasks = [asyncio.create_task(drive(bot_transport, bot, rng,
+                                       1 / game.tick_rate))
+             for bot_transport, bot in bots]
+    await game.run(seconds)
+    for task in tasks:
+        task.cancel()
+
+    sent = sum(c.bytes_sent for c in game.clients.values())
+    snapshots = sum(c.snapshots_sent for c in game.clients.values())
+    full = statistics.mean(len(netcode.snapshot(tick, entities))
+                           for tick, entities in game.history.items())
+    print(f'{CLIENTS} clients on a generated {MAP_SIZE}x{MAP_SIZE} map, '
+          f'{len(gs.objects)} objects, {loss:.0%} snapshots lost\n')
+    print(game.report(seconds))
+    print(f'\nmean snapshot: {sent / snapshots:.0f} B as deltas, '
+          f'{full:.0f} B in full')
+    print(f'snapshots checked: {sum(bot.checked for _, bot in bots)}, '
+          f'mismatches: {sum(bot.mismatches for _, bot in bots)}')
+
+    for bot_transport, _ in bots:
+        bot_transport.close()
+    transport.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(run(float(sys.argv[1]) if len(sys.argv) > 1 else 10,
+                    float(sys.argv[2]) if len(sys.argv) > 2 else 0.05))
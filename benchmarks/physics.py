@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Benchmark physics ticks for different thread and substep counts.
+
+Times GameState.update_physics, with every tank driven by an AI, on
+generated maps of growing size.
+Usage: python benchmarks/physics.py [max map size]
+"""
+import sys
+from common import generated_map, init_display, new_gamestate, \
+    sweep_sizes, timed
+
+THREADS = [1, 2]
+SUBSTEPS = [1, 2, 4]
+
+
+def main(max_size):
+    """Print the time of a physics tick for every setting and map size."""
+    screen = init_display()
+    print(f'{"size":>6}{"threads":>9}{"substeps":>10}{"tick ms":>10}')
+    for size in sweep_sizes(max_size):
+        current_map = generated_map(size)
+        for threads in THREADS:
+            for substeps in SUBSTEPS:
+                gs = new_gamestate(screen, current_map,
+                                   PHYSICS_THREADS=threads,
+                                   PHYSICS_SUBSTEPS=substeps)
+                tick = timed(lambda: gs.update_physics(0), 20)
+                print(f'{size:>6}{threads:>9}{substeps:>10}'
+                      f'{tick * 1000:>10.3f}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Benchmark drawing a frame, over map sizes.
+
+Times handle_events.update_display in an 800x800 window, with the camera
+following player 1, on generated maps of growing size.
+Usage: python benchmarks/render.py [max map size]
+"""
+import sys
+from common import generated_map, init_display, new_gamestate, show, \
+    sweep_sizes, timed
+import handle_events
+
+
+def main(max_size):
+    """Print the time of a frame and the objects drawn, per map size."""
+    screen = init_display()
+    print(f'{"size":>6}{"objects":>9}{"drawn":>7}{"frame ms":>10}')
+    for size in sweep_sizes(max_size):
+        gs = new_gamestate(screen, generated_map(size), nplayers=1)
+        target = show(screen, gs)
+        frame = timed(lambda: handle_events.update_display(
+            target, gs, {}, -5000), 50)
+        print(f'{size:>6}{len(gs.objects):>9}'
+              f'{len(gs.camera.visible_objects()):>7}{frame * 1000:>10.3f}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Rollout throughput of the training environment (env.VecEnv).
+
+Steps batches of 1 to 32 games on map0 with random actions, in this process
+and in worker processes, and reports the steps per second (a step being one
+tick of one game) and how many of them observing takes.
+Usage: python benchmarks/rollout.py [steps] [max workers]
+"""
+import os
+import sys
+import time
+import numpy as np
+import common  # noqa: F401 (headless, and the game on the path)
+import env
+import maps
+import resources
+
+COUNTS = [1, 8, 32]
+WORKERS = [0, 2, 4]
+
+
+def run(count, workers, steps):
+    """Return the steps per second of count games in workers processes."""
+    envs = env.VecEnv(maps.map0, count, workers=workers)
+    envs.reset()
+    rng = np.random.default_rng(0)
+    actions = np.stack([rng.integers(0, 3, (steps, count)),
+                        rng.integers(0, 3, (steps, count)),
+                        rng.integers(0, 2, (steps, count))], axis=2)
+
+    start = time.perf_counter()
+    for step_actions in actions:
+        envs.step(step_actions)
+    seconds = time.perf_counter() - start
+    envs.close()
+    return steps * count / seconds
+
+
+def observe_share(steps):
+    """Return the share of a step spent observing, in one game."""
+    game = env.GameEnv(resources.init_headless(), maps.map0)
+    game.reset()
+    start = time.perf_counter()
+    for _ in range(steps):
+        game.step((env.FORWARD, env.LEFT, 1))
+    stepping = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(steps):
+        env.observe(game.gs, game.rocks)
+    return (time.perf_counter() - start) / stepping
+
+
+def main(steps, max_workers):
+    """Print the steps per second for every batch size and worker count."""
+    print(f'{os.cpu_count()} CPUs, observing is '
+          f'{observe_share(steps):.0%} of a step')
+    print(f'{"games":>6}{"workers":>9}{"steps/s":>10}')
+    for count in COUNTS:
+        for workers in WORKERS:
+            if workers > min(count, max_workers):
+                continue
+            steps_per_second = run(count, workers, steps)
+            print(f'{count:>6}{workers:>9}{steps_per_second:>10.0f}',
+                  flush=True)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 300,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 4)
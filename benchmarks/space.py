@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Benchmark building the pymunk space and stepping it, over map sizes.
+
+Compares rockboxes merged into rectangles on the static body (what the game
+does) with one static body and shape per rockbox tile (what it used to do),
+and pymunk's bounding box tree (the default) with its spatial hash.
+Usage: python benchmarks/space.py [max map size]
+"""
+import sys
+import pymunk
+from common import generated_map, init_display, new_gamestate, \
+    sweep_sizes, timed
+import gameobjects
+import objectcreation
+
+MODES = ['merged', 'per tile', 'hash']
+
+
+def per_tile_rockboxes(gs):
+    """Replace the merged rockboxes by one static Box per rockbox tile."""
+    gs.space.remove(*[shape for shape in gs.space.shapes
+                      if shape.body is gs.space.static_body
+                      and isinstance(shape, pymunk.Poly)])
+    return [gameobjects.get_box_with_type(x, y, 1, gs.space, gs)
+            for x in range(gs.current_map.width)
+            for y in range(gs.current_map.height)
+            if gs.current_map.boxAt(x, y) == 1]
+
+
+def build(gs, mode):
+    """Build the space of a fresh game, as done in a mode."""
+    gs.settings.SPATIAL_HASH = mode == 'hash'
+    gs.flag, gs.tanks, gs.objects, gs.space = \
+        objectcreation.create_everything(gs)
+    if mode == 'per tile':
+        per_tile_rockboxes(gs)
+
+
+def main(max_size):
+    """Print build and step times for every map size."""
+    screen = init_display()
+    print(f'{"size":>6}{"mode":>10}{"shapes":>9}{"build ms":>11}'
+          f'{"step ms":>10}')
+    for size in sweep_sizes(max_size):
+        gs = new_gamestate(screen, generated_map(size))
+        for mode in MODES:
+            build_time = timed(lambda: build(gs, mode), 3)
+            step_time = timed(lambda: gs.space.step(1 / 60), 20)
+            print(f'{size:>6}{mode:>10}{len(gs.space.shapes):>9}'
+                  f'{build_time * 1000:>11.2f}{step_time * 1000:>10.3f}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
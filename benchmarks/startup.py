@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark the time to first frame, with and without the asset cache.
+
+Every run is a fresh process, which loads the sprites, creates a game on
+map1 and draws one frame. Both the time from process start and the time
+from the display being ready are reported.
+Usage: python benchmarks/startup.py [runs]
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+START = time.perf_counter()
+
+MAIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, MAIN_DIR)
+
+
+def first_frame(use_cache):
+    """
+    Start a game headless and time its first frame.
+
+    Return the seconds from process start, and from the display being ready.
+    """
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    os.chdir(MAIN_DIR)
+    import pygame
+    import assetcache
+    import camera
+    import gamestate
+    import handle_events
+    import maps
+    import resources
+
+    from gameobjects import Explosion
+
+    pygame.init()
+    screen = pygame.display.set_mode((800, 800))
+    display_ready = time.perf_counter()
+    if use_cache:
+        resources.assets.cache = assetcache.load()
+        assert resources.assets.cache, 'asset cache missing or out of date'
+
+    settings = resources.Constants()
+    settings.USE_CLOCK = False
+    gs = gamestate.GameState(screen, current_map=maps.map1, settings=settings)
+    gs.generate_fresh()
+    target, ratio = handle_events.render_target(screen, gs.current_map,
+                                                settings)
+    gs.sprites.rescale(ratio)
+    gs.camera = camera.Camera(target, gs, ratio)
+    # Draw an explosion too, so every sprite category is loaded.
+    explosion = Explosion(gs.current_map.flag_position, gs)
+    gs.objects.append(explosion)
+    explosion.update_index(gs)
+    handle_events.update_display(target, gs, {}, -5000)
+    end = time.perf_counter()
+    return end - START, end - display_ready
+
+
+def main(runs):
+    """Build the cache, then time first frames in fresh processes."""
+    subprocess.run([sys.executable, os.path.join(MAIN_DIR, 'assetcache.py')],
+                   check=True, capture_output=True,
+                   env={'SDL_VIDEODRIVER': 'dummy', **os.environ})
+    for mode in ['png', 'cache']:
+        results = [subprocess.run([sys.executable, __file__, '--child', mode],
+                                  check=True, capture_output=True, text=True
+                                  ).stdout.split()[-2:]
+                   for _ in range(runs)]
+        for i, phase in enumerate(['from start', 'from display']):
+            times = [float(result[i]) for result in results]
+            print(f'{mode:<6}{phase:<14}'
+                  f'median {statistics.median(times) * 1000:8.1f} ms   '
+                  f'min {min(times) * 1000:8.1f} ms')
+
+
+if __name__ == '__main__':
+    if '--child' in sys.argv:
+        print(*first_frame(sys.argv[sys.argv.index('--child') + 1] == 'cache'))
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
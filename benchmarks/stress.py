@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Stress test: many AI tanks on a generated map.
+
+Runs games of 50 to 500 AI tanks, each on a map just big enough for their
+bases around its edge, and reports the time of a frame split into AI,
+physics and render (drawing in an 800x800 window).
+Usage: python benchmarks/stress.py [max tanks] [ticks]
+"""
+import sys
+import time
+from common import init_display, new_gamestate, show
+import handle_events
+import mapgen
+
+TANK_COUNTS = [50, 100, 200, 500]
+
+
+def map_size(tanks):
+    """Return the width of a map with room for tanks bases on its edge."""
+    return max(50, tanks // 2 + 2)
+
+
+def run(screen, tanks, ticks):
+    """Return the total time of ticks frames in AI, physics and render."""
+    size = map_size(tanks)
+    current_map = mapgen.generate(size, size, players=tanks, seed=0)
+    gs = new_gamestate(screen, current_map)
+    target = show(screen, gs)
+
+    times = dict.fromkeys(['ai', 'physics', 'render'], 0)
+    for _ in range(ticks):
+        start = time.perf_counter()
+        gs.decide_all_bots()
+        ai_done = time.perf_counter()
+        gs.update_physics(0)
+        gs.tanks_try_grab_flag()
+        gs.tanks_won()
+        physics_done = time.perf_counter()
+        handle_events.update_display(target, gs, {}, -5000)
+        render_done = time.perf_counter()
+
+        times['ai'] += ai_done - start
+        times['physics'] += physics_done - ai_done
+        times['render'] += render_done - physics_done
+    return size, times
+
+
+def main(max_tanks, ticks):
+    """Print the time of a frame per part, for every number of tanks."""
+    screen = init_display()
+    print(f'{"tanks":>6}{"map":>6}{"ai ms":>9}{"physics ms":>12}'
+          f'{"render ms":>11}{"frame ms":>10}')
+    for tanks in [count for count in TANK_COUNTS if count <= max_tanks]:
+        size, times = run(screen, tanks, ticks)
+        ai, physics, render = (times[part] * 1000 / ticks
+                               for part in ['ai', 'physics', 'render'])
+        print(f'{tanks:>6}{size:>6}{ai:>9.2f}{physics:>12.2f}'
+              f'{render:>11.2f}{ai + physics + render:>10.2f}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 100)
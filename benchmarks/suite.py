@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite of the game's hot paths, with results saved as JSON.
+
+Every case is timed headless, and reported as the median time of one
+operation. Results can be saved, and compared with saved ones: cases more
+than --tolerance slower than the baseline are reported as regressions, and
+make the suite exit with status 1.
+
+Usage:
+python benchmarks/suite.py [--quick] [--only TEXT] [--save FILE]
+                           [--compare FILE] [--tolerance 0.15]
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import pygame
+import pymunk
+from common import generated_map, init_display, new_gamestate, show, timed
+import gameobjects
+import handle_events
+import mapgen
+import maps
+import resources
+
+SHIPPED_MAPS = {'map0': maps.map0, 'map1': maps.map1, 'map2': maps.map2}
+
+
+def astar(screen, current_map):
+    """Time finding the path of every AI from its start to the flag."""
+    gs = new_gamestate(screen, current_map)
+
+    def find_all():
+        for ai in gs.ais:
+            ai.update_grid_pos()
+            ai.find_shortest_path()
+    return timed(find_all) / len(gs.ais), {'searches': len(gs.ais)}
+
+
+def tile_neighbours(screen):
+    """Time AI.get_tile_neighbours, over every tile of map1."""
+    gs = new_gamestate(screen, maps.map1)
+    ai = gs.ais[0]
+    tiles = [pymunk.Vec2d(x, y)
+             for x in range(maps.map1.width)
+             for y in range(maps.map1.height)]
+    return timed(lambda: [ai.get_tile_neighbours(tile) for tile in tiles],
+                 20) / len(tiles), {}
+
+
+def space_step(screen, tanks, bullets):
+    """Time one space.step with tanks tanks and bullets bullets flying."""
+    size = max(20, tanks // 2 + 2)
+    gs = new_gamestate(screen,
+                       generated_map(size, players=tanks))
+    rng = random.Random(0)
+    for _ in range(bullets):
+        gs.objects.append(gameobjects.Bullet(rng.uniform(1, size - 1),
+                                             rng.uniform(1, size - 1),
+                                             rng.uniform(0, 360),
+                                             pymunk.Vec2d(0, 0),
+                                             gs.space,
+                                             gs))
+    step = 1 / gs.settings.FRAMERATE
+    return timed(lambda: gs.space.step(step), 20), {
+        'shapes': len(gs.space.shapes)}
+
+
+def update_display(screen, density):
+    """Time drawing a 20x20 map (whole in the window) with boxes density."""
+    gs = new_gamestate(screen, mapgen.generate(20, 20, density, seed=0))
+    target = show(screen, gs)
+    return timed(lambda: handle_events.update_display(target, gs, {}, -5000),
+                 50), {'objects': len(gs.objects)}
+
+
+def sprites_load():
+    """Time loading every sprite category from the PNG files."""
+    def load():
+        manager = resources.AssetManager()
+        manager.load_all()
+    return timed(load), {}
+
+
+def sprites_construct(screen):
+    """Time creating a game's Sprites, and scaling every sprite once."""
+    gs = new_gamestate(screen, maps.map0)
+    resources.assets.load_all()
+    sprite_names = ['grass', 'rockbox', 'metalbox', 'woodbox',
+                    'woodbox_broken', 'flag', 'bullet']
+
+    def construct():
+        sprites = resources.Sprites(screen, gs)
+        sprites.rescale(0.5)
+        [sprites.scaled(getattr(sprites, name)) for name in sprite_names]
+        [sprites.scaled(sprite) for sprite in sprites.tanks + sprites.bases]
+    return timed(construct), {}
+
+
+def generate_fresh(screen, current_map):
+    """Time GameState.generate_fresh."""
+    gs = new_gamestate(screen, current_map)
+    return timed(gs.generate_fresh), {'objects': len(gs.objects)}
+
+
+def match(screen, ticks):
+    """Time whole game ticks of an AI only match on map0, drawn."""
+    gs = new_gamestate(screen, maps.map0)
+    target = show(screen, gs)
+
+    def play():
+        for _ in range(ticks):
+            gs.update_physics(0)
+            gs.tanks_try_grab_flag()
+            if gs.tanks_won():
+                gs.generate_fresh()
+                gs.add_collision_handlers()
+            gs.decide_all_bots()
+            handle_events.update_display(target, gs, {}, -5000)
+    seconds = timed(play, 3) / ticks
+    return seconds, {'ticks_per_second': round(1 / seconds)}
+
+
+def rollout(count, steps):
+    """Time a step of count games of the training environment, on map0."""
+    import env
+    envs = env.VecEnv(maps.map0, count)
+    envs.reset()
+    actions = [(env.FORWARD, env.LEFT, 1)] * count
+
+    def play():
+        for _ in range(steps):
+            envs.step(actions)
+    seconds = timed(play, 3) / steps
+    return seconds, {'steps_per_second': round(count / seconds)}
+
+
+def model_tick(screen, current_map, ticks):
+    """Time a tick of the forward model, every tank moving and shooting."""
+    import forwardmodel
+    gs = new_gamestate(screen, current_map)
+    model = forwardmodel.ForwardModel.from_game(gs)
+    actions = {team: (1, (-1) ** team, 1) for team in range(len(gs.tanks))}
+
+    def play():
+        rollout = model.copy()
+        for _ in range(ticks):
+            rollout.step(actions)
+    seconds = timed(play, 3) / ticks
+    return seconds, {'ticks_per_second': round(1 / seconds)}
+
+
+def cases(screen, quick):
+    """Return every benchmark case, by name, as a function to run it."""
+    large = [50, 100] if quick else [100, 200]
+    tank_counts = [4, 50] if quick else [4, 50, 200]
+    bullet_counts = [0, 100] if quick else [0, 100, 500]
+
+    suite = {}
+    for name, current_map in SHIPPED_MAPS.items():
+        suite[f'astar/{name}'] = (
+            lambda current_map=current_map: astar(screen, current_map))
+    for size in large:
+        suite[f'astar/generated-{size}'] = (
+            lambda size=size: astar(screen, generated_map(size)))
+    suite['ai/get_tile_neighbours'] = lambda: tile_neighbours(screen)
+    for tanks in tank_counts:
+        for bullets in bullet_counts:
+            suite[f'space_step/tanks-{tanks}-bullets-{bullets}'] = (
+                lambda tanks=tanks, bullets=bullets:
+                space_step(screen, tanks, bullets))
+    for density in [0.1, 0.5, 0.9]:
+        suite[f'update_display/density-{density}'] = (
+            lambda density=density: update_display(screen, density))
+    suite['sprites/load'] = sprites_load
+    suite['sprites/construct'] = lambda: sprites_construct(screen)
+    suite['generate_fresh/map0'] = lambda: generate_fresh(screen, maps.map0)
+    for size in large:
+        suite[f'generate_fresh/generated-{size}'] = (
+            lambda size=size: generate_fresh(screen, generated_map(size)))
+    suite['match/map0'] = lambda: match(screen, 100 if quick else 600)
+    suite['env/rollout-8'] = lambda: rollout(8, 50 if quick else 300)
+    suite['forwardmodel/map0'] = lambda: model_tick(screen, maps.map0, 600)
+    for size in large:
+        suite[f'forwardmodel/generated-{size}'] = (
+            lambda size=size: model_tick(screen, generated_map(size), 600))
+    return suite
+
+
+def compare(results, baseline, tolerance):
+    """Print how results compare with a baseline, return the regressions."""
+    regressions = []
+    print(f'\n{"case":<42}{"baseline":>12}{"now":>12}{"change":>9}')
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before, now = baseline[name]['seconds'], result['seconds']
+        change = now / before - 1
+        flag = ''
+        if change > tolerance:
+            regressions.append(name)
+            flag = '  SLOWER'
+        print(f'{name:<42}{before * 1000:>10.4f}ms{now * 1000:>10.4f}ms'
+              f'{change:>+9.1%}{flag}')
+    return regressions
+
+
+def main():
+    """Run the suite, save and compare the results as asked."""
+    parser = argparse.ArgumentParser(description='Benchmark the hot paths.')
+    parser.add_argument('--quick', action='store_true',
+                        help='smaller maps and fewer objects')
+    parser.add_argument('--only', default='',
+                        help='only run the cases whose name contains this')
+    parser.add_argument('--save', help='file to save the results to')
+    parser.add_argument('--compare', help='baseline results to compare to')
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help='how much slower than the baseline is a '
+                        'regression (0.15 is 15%%)')
+    args = parser.parse_args()
+
+    screen = init_display()
+    results = {}
+    for name, case in cases(screen, args.quick).items():
+        if args.only not in name:
+            continue
+        start = time.perf_counter()
+        seconds, extra = case()
+        results[name] = {'seconds': seconds, **extra}
+        print(f'{name:<42}{seconds * 1000:>10.4f}ms'
+              f'   ({time.perf_counter() - start:.1f} s)', flush=True)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'python': platform.python_version(),
+                       'pygame': pygame.version.ver,
+                       'pymunk': pymunk.version,
+                       'machine': platform.machine(),
+                       'results': results}, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f'\n{len(regressions)} regression(s) over '
+                  f'{args.tolerance:.0%}')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
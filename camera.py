@@ -0,0 +1,146 @@
+"""The camera, showing the part of the map in the window and drawing it."""
+import collections
+import pygame
+import pymunk
+from pymunk import Vec2d
+import gameobjects
+import resources
+
+
+class Camera:
+    """
+    Shows the part of the map around the first player's tank.
+
+    Dragging the mouse scrolls the camera freely instead, until the follow
+    key is pressed. Maps which fit the window are shown whole, and the
+    camera never moves.
+
+    The camera only draws what it sees: the chunks of the background in view
+    (drawn the first time they are seen, and kept while they are in use),
+    and the objects the game's spatial index (or for boxes, the physics
+    engine's) finds in view. Drawing costs
+    the same on any map, for a given window size.
+    """
+
+    # Width of a chunk of the background, in tiles, and how many are kept.
+    CHUNK_TILES = 16
+    MAX_CHUNKS = 64
+
+    # How far outside the view (in tiles) objects can be and still be seen.
+    MARGIN = 1
+
+    FOLLOW_KEY = pygame.K_c
+
+    def __init__(self, target, gs, ratio):
+        """
+        Initialize a camera.
+
+        Input:
+        target: Surface to draw on (see handle_events.render_target).
+        gs: The game state to show.
+        ratio: Ratio between display pixels and TILE_SIZE.
+        """
+        self.target = target
+        self.gs = gs
+        self.ratio = ratio
+        self.tile_size = gs.settings.TILE_SIZE * ratio
+
+        # Size of the view and position of its top left corner, in tiles.
+        target_width, target_height = target.get_size()
+        self.width = target_width / self.tile_size
+        self.height = target_height / self.tile_size
+        self.x = self.y = 0
+
+        # A map shown whole is one chunk, so it is drawn just like it is
+        # scaled, without seams between chunks.
+        current_map = gs.current_map
+        if (self.width >= current_map.width - 0.5
+                and self.height >= current_map.height - 0.5):
+            self._chunk_size = (current_map.width, current_map.height)
+        else:
+            self._chunk_size = (self.CHUNK_TILES, self.CHUNK_TILES)
+        self._chunks = collections.OrderedDict()
+
+        self.following = True
+        self.update([])
+
+    def look_at(self, x, y):
+        """Center the view on (x, y), keeping it inside the map."""
+        current_map = self.gs.current_map
+        x = min(max(x - self.width / 2, 0),
+                max(current_map.width - self.width, 0))
+        y = min(max(y - self.height / 2, 0),
+                max(current_map.height - self.height, 0))
+
+        # Keep the view on whole pixels, so sprites do not jitter.
+        self.x = round(x * self.tile_size) / self.tile_size
+        self.y = round(y * self.tile_size) / self.tile_size
+
+    def update(self, events):
+        """Scroll the view, following the player or the mouse."""
+        for event in events:
+            if event.type == pygame.KEYDOWN and event.key == self.FOLLOW_KEY:
+                self.following = not self.following
+
+            elif event.type == pygame.MOUSEMOTION and event.buttons[0]:
+                self.following = False
+                self.look_at(self.x + self.width / 2
+                             - event.rel[0] / self.tile_size,
+                             self.y + self.height / 2
+                             - event.rel[1] / self.tile_size)
+
+        if self.following:
+            if self.gs.players:
+                self.look_at(*self.gs.players[0].body.position)
+            else:
+                self.look_at(*self.gs.current_map.flag_position)
+
+    def to_display(self, position):
+        """Convert a position in the physics engine to the display."""
+        return (position - Vec2d(self.x, self.y)) * self.tile_size
+
+    def visible_objects(self):
+        """Return the game objects in view, in the order they are drawn."""
+        x0, y0 = self.x - self.MARGIN, self.y - self.MARGIN
+        x1 = self.x + self.width + self.MARGIN
+        y1 = self.y + self.height + self.MARGIN
+
+        # Boxes are drawn first, as they are the first game objects.
+        boxes = self.gs.space.bb_query(
+            pymunk.BB(x0, y0, x1, y1),
+            pymunk.ShapeFilter(mask=gameobjects.BOX))
+        return ([shape.parent for shape in boxes]
+                + self.gs.index.query_rect(x0, y0, x1, y1))
+
+    def _chunk(self, column, row):
+        """Return the background chunk at (column, row), drawing it once."""
+        key = (column, row)
+        if (chunk := self._chunks.get(key)) is not None:
+            self._chunks.move_to_end(key)
+            return chunk
+
+        width, height = self._chunk_size
+        map_rect = pygame.Rect(0, 0,
+                               self.gs.current_map.width,
+                               self.gs.current_map.height)
+        tiles = pygame.Rect(column * width, row * height,
+                            width, height).clip(map_rect)
+        chunk = resources.background(self.target, self.gs.sprites.grass,
+                                     self.gs, self.ratio, tiles)
+        self._chunks[key] = chunk
+        if len(self._chunks) > self.MAX_CHUNKS:
+            self._chunks.popitem(last=False)
+        return chunk
+
+    def draw_background(self):
+        """Draw the background chunks in view on the target."""
+        width, height = self._chunk_size
+        columns = range(int(self.x // width),
+                        int((self.x + self.width - 1e-6) // width) + 1)
+        rows = range(int(self.y // height),
+                     int((self.y + self.height - 1e-6) // height) + 1)
+        self.target.blits([(self._chunk(column, row),
+                            self.to_display(Vec2d(column * width,
+                                                  row * height)).int_tuple)
+                           for row in rows
+                           for column in columns], False)
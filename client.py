@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+A thin client of the game server (server.py).
+
+The client does not run the game: it draws the snapshots the server sends,
+and sends the keys held (arrows to drive, space to shoot) every frame. The
+camera follows the client's tank ('c' and dragging the mouse as in the
+game), and escape leaves the game.
+
+Usage:
+python3 client.py [--host 127.0.0.1] [--port 5555]
+"""
+import argparse
+import asyncio
+import math
+import pygame
+import camera
+import gameobjects
+import gamestate
+import handle_events
+import maps
+import netcode
+import resources
+
+# Seconds between hellos, until the server welcomes the client.
+HELLO_INTERVAL = 0.5
+
+# Order the entity kinds are drawn in, after the bases (drawn after boxes).
+_LAYERS = {netcode.WOODBOX: 0, netcode.METALBOX: 0, netcode.TANK: 2,
+           netcode.FLAG: 3, netcode.BULLET: 4, netcode.EXPLOSION: 4}
+
+
+class ClientProtocol(asyncio.DatagramProtocol):
+    """Keeps the welcome and the snapshots the server sends."""
+
+    def __init__(self):
+        """Initialize a protocol which has not been welcomed yet."""
+        self.welcomed = asyncio.get_running_loop().create_future()
+
+        # Entities of the snapshots which deltas can be against, by tick,
+        # and the tick of the last one.
+        self.snapshots = {}
+        self.tick = 0
+
+    def datagram_received(self, data, address):
+        """Keep a welcome, or a snapshot newer than the last one."""
+        if data[0] == netcode.WELCOME and not self.welcomed.done():
+            self.welcomed.set_result(netcode.read_welcome(data))
+
+        elif data[0] == netcode.SNAPSHOT:
+            tick, base_tick = netcode.snapshot_ticks(data)
+            # Snapshots come out of order, or against baselines lost.
+            if tick <= self.tick or (base_tick
+                                     and base_tick not in self.snapshots):
+                return
+            self.snapshots[tick] = netcode.read_snapshot(
+                data, self.snapshots.get(base_tick))
+            self.tick = tick
+
+            # The server sends deltas against the last snapshot acked, so
+            # snapshots before this baseline are never needed again.
+            for old in [old for old in self.snapshots if old < base_tick]:
+                del self.snapshots[old]
+
+    def entities(self):
+        """Return the entities of the last snapshot, by id."""
+        return self.snapshots.get(self.tick, {})
+
+
+class View:
+    """Draws the entities of snapshots, through a game state's camera."""
+
+    def __init__(self, screen, current_map, team):
+        """
+        Initialize a view of a map.
+
+        Input:
+        screen: The display.
+        current_map: The map the server plays.
+        team: The team of the client's tank, which the camera follows.
+        """
+        self.team = team
+        settings = resources.Constants()
+        settings.SOUND = False
+        # A game state which is never generated, for its sprites and
+        # camera.
+        self.gs = gamestate.GameState(screen, current_map=current_map,
+                                      settings=settings, players=[])
+        self.bases = [gameobjects.GameVisibleObject(x, y,
+                                                    self.gs.sprites.base(i))
+                      for i, (x, y, _)
+                      in enumerate(current_map.start_positions)]
+        self._objects = {}
+        self._tanks = {}
+        self.resize(screen)
+
+    def resize(self, screen):
+        """Draw on a screen, of a new size."""
+        self.target, ratio = handle_events.render_target(
+            screen, self.gs.current_map, self.gs.settings)
+        self.gs.sprites.rescale(ratio)
+        self.gs.camera = camera.Camera(self.target, self.gs, ratio)
+
+    def _tank_sprite(self, team, details):
+        """Return the sprite of a tank, with its damage and invincibility."""
+        if (sprite := self._tanks.get((team, details))) is None:
+            sprite = self.gs.sprites.tank(team).copy()
+            if (hp := details & 3) < 3:
+                overlay = self.gs.sprites.tank_overlays[hp - 1]
+                sprite.blit(overlay, overlay.get_rect())
+            if details & 4:
+                sprite.set_alpha(128)
+            self._tanks[(team, details)] = sprite
+        return sprite
+
+    def _sprite(self, record):
+        """Return the sprite of an entity record."""
+        sprites = self.gs.sprites
+        kind, a, b = record[1:4]
+        if kind == netcode.WOODBOX:
+            return sprites.woodbox if a > 1 else sprites.woodbox_broken
+        elif kind == netcode.METALBOX:
+            return sprites.metalbox
+        elif kind == netcode.BULLET:
+            return sprites.bullet
+        elif kind == netcode.FLAG:
+            return sprites.flag
+        elif kind == netcode.EXPLOSION:
+            return sprites.explosion_list[a]
+        return self._tank_sprite(a, b)
+
+    def _object(self, record):
+        """Return the object drawing an entity record, moved to it."""
+        if (obj := self._objects.get(record[0])) is None:
+            obj = self._objects[record[0]] = gameobjects.GameVisibleObject(
+                0, 0, None)
+        obj.x, obj.y = netcode.position(record)
+        obj.orientation = -math.degrees(netcode.angle(record))
+        obj.sprite = self._sprite(record)
+        return obj
+
+    def draw(self, entities, events):
+        """Draw the entities of a snapshot, and flip the display."""
+        records = sorted(entities.values(), key=lambda r: _LAYERS[r[1]])
+        # Forget the objects of entities gone, their ids are reused.
+        if len(self._objects) > len(entities):
+            self._objects = {entity_id: obj
+                             for entity_id, obj in self._objects.items()
+                             if entity_id in entities}
+
+        gs_camera = self.gs.camera
+        gs_camera.update(events)
+        if gs_camera.following:
+            for record in records:
+                if record[1] == netcode.TANK and record[2] == self.team:
+                    gs_camera.look_at(*netcode.position(record))
+
+        gs_camera.draw_background()
+        boxes = [record for record in records if _LAYERS[record[1]] == 0]
+        [self._object(record).update_screen(self.target, self.gs)
+         for record in boxes]
+        [base.update_screen(self.target, self.gs) for base in self.bases]
+        [self._object(record).update_screen(self.target, self.gs)
+         for record in records[len(boxes):]]
+        pygame.display.flip()
+
+
+def keys_input(ack):
+    """Return the input message of the keys held."""
+    keys = pygame.key.get_pressed()
+    return netcode.input_message(ack,
+                                 keys[pygame.K_UP] - keys[pygame.K_DOWN],
+                                 keys[pygame.K_RIGHT] - keys[pygame.K_LEFT],
+                                 keys[pygame.K_SPACE])
+
+
+async def play(host, port):
+    """Join the server at host:port, and play until the player leaves."""
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.create_datagram_endpoint(
+        ClientProtocol, remote_addr=(host, port))
+    try:
+        while not protocol.welcomed.done():
+            transport.sendto(netcode.hello())
+            await asyncio.wait([protocol.welcomed], timeout=HELLO_INTERVAL)
+        team, tick_rate, map_bytes = protocol.welcomed.result()
+        print(f'Joined {host}:{port} as team {team}')
+
+        pygame.init()
+        pygame.display.set_caption('Capture The Flag')
+        screen = pygame.display.set_mode((800, 800), pygame.RESIZABLE)
+        view = View(screen, maps.map_from_bytes(map_bytes), team)
+
+        period = 1 / tick_rate
+        while True:
+            events = pygame.event.get()
+            for event in events:
+                if event.type == pygame.VIDEORESIZE:
+                    screen = pygame.display.set_mode((event.w, event.h),
+                                                     pygame.RESIZABLE)
+                    view.resize(screen)
+            if any(event.type == pygame.QUIT
+                   or (event.type == pygame.KEYDOWN
+                       and event.key == pygame.K_ESCAPE)
+                   for event in events):
+                break
+
+            transport.sendto(keys_input(protocol.tick))
+            view.draw(protocol.entities(), events)
+            await asyncio.sleep(period)
+    finally:
+        transport.sendto(netcode.bye())
+        transport.close()
+        pygame.quit()
+
+
+def main():
+    """Join a server with the options given."""
+    parser = argparse.ArgumentParser(description='Join a game server.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5555)
+    args = parser.parse_args()
+    asyncio.run(play(args.host, args.port))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,294 @@
+"""
+A Gym-style environment, to train bots against the game without a window.
+
+VecEnv runs a batch of independent games on one map, each stepped without
+drawing, in which the first tank is controlled by the caller and the others
+by the game's AI:
+
+    envs = env.VecEnv(maps.map0, 8)
+    observations = envs.reset()
+    observations, rewards, terminated, truncated, infos = envs.step(actions)
+
+An action is three integers: how to move (STOP, FORWARD or BACKWARD), how to
+turn (STRAIGHT, LEFT or RIGHT) and whether to shoot (holding it guides the
+bullet, like the space bar). Observations are a dict of NumPy arrays, with
+the games along the first axis (see observe). A game which ends is started
+again at once, so observations always are of running games.
+
+The games can be split over worker processes (workers=...), each stepping
+its share at the same time as the others.
+"""
+import multiprocessing
+import numpy as np
+import gameobjects
+import gamestate
+import resources
+
+# Actions, by column of the action array.
+STOP, FORWARD, BACKWARD = 0, 1, 2
+STRAIGHT, LEFT, RIGHT = 0, 1, 2
+
+# Tank.acceleration and Tank.rotation of every action.
+_ACCELERATION = {STOP: 0, FORWARD: 1, BACKWARD: -1}
+_ROTATION = {STRAIGHT: 0, LEFT: -1, RIGHT: 1}
+
+# Steps in a game before it is truncated: a minute of play.
+MAX_STEPS = 3600
+
+# Bullets in an observation; more are left out, fewer padded with zeros.
+MAX_BULLETS = 32
+
+# Columns of the tanks in an observation.
+TANK_COLUMNS = ['x', 'y', 'angle', 'vx', 'vy', 'hp', 'flag', 'invincible']
+
+
+def observe(gs, rocks):
+    """
+    Return the observation of a game state, as a dict of arrays.
+
+    grid: Box type of every tile (as in maps), row by row, shape (H, W).
+    tanks: One row of TANK_COLUMNS per tank, the controlled one first.
+    bullets: x, y, vx, vy and 1 for each bullet, shape (MAX_BULLETS, 5).
+    flag: x, y and whether a tank carries it.
+    rocks: The map's rockboxes, as a grid (they never move).
+    """
+    grid = rocks.copy()
+    bullets = np.zeros((MAX_BULLETS, 5), np.float32)
+    bullet_count = 0
+    for obj in gs.objects:
+        if isinstance(obj, gameobjects.Box):
+            x, y = obj.body.position
+            grid[min(max(int(y), 0), grid.shape[0] - 1),
+                 min(max(int(x), 0), grid.shape[1] - 1)] = (
+                2 if obj.shape.collision_type == 2 else 3)
+        elif (isinstance(obj, gameobjects.Bullet)
+              and bullet_count < MAX_BULLETS):
+            bullets[bullet_count] = (*obj.body.position,
+                                     *obj.body.velocity, 1)
+            bullet_count += 1
+
+    tanks = np.array([(*tank.body.position,
+                       tank.body.angle % (2 * np.pi),
+                       *tank.body.velocity,
+                       tank.hp,
+                       tank.flag is not None,
+                       tank.inv_ticks > 0)
+                      for tank in gs.tanks], np.float32)
+    flag = np.array([gs.flag.x, gs.flag.y, gs.flag.is_on_tank], np.float32)
+    return {'grid': grid, 'tanks': tanks, 'bullets': bullets, 'flag': flag}
+
+
+class GameEnv:
+    """One game, stepped by the actions of its first tank."""
+
+    def __init__(self, screen, current_map, max_steps=MAX_STEPS,
+                 **settings_overrides):
+        """
+        Initialize a game, without starting it.
+
+        Input:
+        screen: Screen of the game state (see resources.init_headless).
+        current_map: Map to play on.
+        max_steps: Steps before a game is truncated.
+        settings_overrides: Settings to change, e.g. PHYSICS_SUBSTEPS=2.
+        """
+        settings = resources.Constants()
+        settings.DRAW = False
+        settings.SOUND = False
+        settings.USE_CLOCK = False
+        settings.NPLAYERS = 1
+        for name, value in settings_overrides.items():
+            setattr(settings, name, value)
+        self.gs = gamestate.GameState(screen, current_map=current_map,
+                                      settings=settings)
+        self.max_steps = max_steps
+        self.steps = 0
+        # The rockboxes of the map, which never move, as a grid.
+        self.rocks = (np.frombuffer(current_map.grid, np.uint8)
+                      .reshape(current_map.height, current_map.width)
+                      == 1).astype(np.uint8)
+
+    def reset(self):
+        """Start a new game, and return its first observation."""
+        self.gs.generate_fresh()
+        self.gs.add_collision_handlers()
+        self.steps = 0
+        return observe(self.gs, self.rocks)
+
+    def _control(self, action):
+        """Control the tank like the keys would (see Tank.control)."""
+        move, turn, shoot = (int(value) for value in action)
+        if bullet := self.gs.players[0].control(_ACCELERATION[move],
+                                                _ROTATION[turn],
+                                                shoot,
+                                                self.gs):
+            self.gs.objects.append(bullet)
+
+    def step(self, action):
+        """
+        Play one tick with an action.
+
+        Return the observation, the reward (1 if the tank won, -1 if another
+        did, else 0), whether the game ended, whether it was cut short, and
+        info on it.
+        """
+        gs = self.gs
+        self._control(action)
+        gs.update_physics(0)
+        gs.tanks_try_grab_flag()
+        winners = gs.tanks_won()
+        gs.decide_all_bots()
+        self.steps += 1
+
+        reward = 0.0
+        if winners:
+            reward = 1.0 if gs.players[0] in winners else -1.0
+        terminated = bool(winners)
+        truncated = not terminated and self.steps >= self.max_steps
+        info = {'steps': self.steps,
+                'winner': gs.tanks.index(winners[0]) if winners else None}
+        return (observe(gs, self.rocks), reward, terminated, truncated,
+                info)
+
+
+class _Batch:
+    """Games stepped one after the other, with results as arrays."""
+
+    def __init__(self, current_map, count, max_steps, settings_overrides):
+        """Initialize count games on a map."""
+        screen = resources.init_headless()
+        self.envs = [GameEnv(screen, current_map, max_steps,
+                             **settings_overrides)
+                     for _ in range(count)]
+
+    def reset(self):
+        """Start new games, return their stacked observations."""
+        return _stack([env.reset() for env in self.envs])
+
+    def step(self, actions):
+        """Step every game, starting the ones which end again."""
+        observations, rewards, terminated, truncated, infos = (
+            [], [], [], [], [])
+        for env, action in zip(self.envs, actions):
+            observation, reward, ended, cut, info = env.step(action)
+            if ended or cut:
+                observation = env.reset()
+            observations.append(observation)
+            rewards.append(reward)
+            terminated.append(ended)
+            truncated.append(cut)
+            infos.append(info)
+        return (_stack(observations),
+                np.array(rewards, np.float32),
+                np.array(terminated),
+                np.array(truncated),
+                infos)
+
+
+def _stack(observations):
+    """Stack observations along a new first axis."""
+    return {key: np.stack([observation[key] for observation in observations])
+            for key in observations[0]}
+
+
+def _worker(connection, current_map, count, max_steps, settings_overrides):
+    """Run a batch of games in a worker process, as asked by the pipe."""
+    batch = _Batch(current_map, count, max_steps, settings_overrides)
+    while True:
+        command, actions = connection.recv()
+        if command == 'reset':
+            connection.send(batch.reset())
+        elif command == 'step':
+            connection.send(batch.step(actions))
+        else:
+            connection.close()
+            return
+
+
+class VecEnv:
+    """A batch of games, stepped together (see the module's docstring)."""
+
+    def __init__(self, current_map, count, workers=0, max_steps=MAX_STEPS,
+                 **settings_overrides):
+        """
+        Initialize count games on a map.
+
+        Input:
+        current_map: Map to play on.
+        count: Number of games.
+        workers: Processes to step the games in, 0 to step them in this one.
+        max_steps: Steps before a game is truncated.
+        settings_overrides: Settings to change, e.g. PHYSICS_SUBSTEPS=2.
+        """
+        self.count = count
+        self.workers = min(workers, count)
+        self._batch = None
+        self._connections = []
+        self._processes = []
+        self._sizes = []
+        if not self.workers:
+            self._batch = _Batch(current_map, count, max_steps,
+                                 settings_overrides)
+            return
+
+        # Workers are spawned, as pygame does not survive being forked.
+        context = multiprocessing.get_context('spawn')
+        for i in range(self.workers):
+            size = count // self.workers + (i < count % self.workers)
+            connection, child = context.Pipe()
+            process = context.Process(target=_worker,
+                                      args=(child, current_map, size,
+                                            max_steps, settings_overrides),
+                                      daemon=True)
+            process.start()
+            child.close()
+            self._connections.append(connection)
+            self._processes.append(process)
+            self._sizes.append(size)
+
+    def reset(self):
+        """Start new games, return their observations."""
+        if self._batch is not None:
+            return self._batch.reset()
+        for connection in self._connections:
+            connection.send(('reset', None))
+        return _concatenate([connection.recv()
+                             for connection in self._connections])
+
+    def step(self, actions):
+        """
+        Step every game with its action, of shape (count, 3).
+
+        Return the observations, rewards, whether each game ended, whether
+        it was cut short, and info on each game. Games which end or are cut
+        short are started again, and observed after starting.
+        """
+        actions = np.asarray(actions)
+        if self._batch is not None:
+            return self._batch.step(actions)
+
+        start = 0
+        for connection, size in zip(self._connections, self._sizes):
+            connection.send(('step', actions[start:start + size]))
+            start += size
+        results = [connection.recv() for connection in self._connections]
+        return (_concatenate([result[0] for result in results]),
+                *(np.concatenate([result[i] for result in results])
+                  for i in range(1, 4)),
+                [info for result in results for info in result[4]])
+
+    def close(self):
+        """Stop the worker processes."""
+        for connection in self._connections:
+            connection.send(('close', None))
+        for process in self._processes:
+            process.join()
+        self._connections = []
+        self._processes = []
+
+
+def _concatenate(observations):
+    """Concatenate batches of observations along their first axis."""
+    return {key: np.concatenate([observation[key]
+                                 for observation in observations])
+            for key in observations[0]}
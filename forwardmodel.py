@@ -0,0 +1,429 @@
+"""
+A cheap, approximate model of the game on its tile grid, for AI lookahead.
+
+Cloning the pymunk space to try out a plan costs far more than a frame, so
+the model keeps only what decides a plan, as integers in arrays: tanks and
+bullets in fixed point (SCALE units per tile, ANGLES units per turn), box
+types and woodbox hp by tile, and the flag. Copying a model copies a few
+arrays, and the map and tank constants are shared between copies.
+
+    model = ForwardModel.from_game(gs)
+    scores = model.evaluate(tank, plans, score)
+
+It approximates the game as follows:
+- Tanks move along their heading, and turn at their top angular speed.
+  Rockboxes and other tanks block them, and they push woodboxes and
+  metalboxes a whole tile ahead, if it is free.
+- Bullets fly straight; guided bullets are not turned.
+- A bullet breaks on a rockbox, metalbox or the border, damages a woodbox
+  (which breaks at 0 hp) or a tank (which respawns at 0 hp, dropping the
+  flag, and is invincible for a while after).
+- The flag is grabbed, carried (at half the top speed) and brought home as
+  in the game; the model stops when a tank has won.
+"""
+from array import array
+import math
+import gameobjects
+
+# Fixed point units: positions in 1/SCALE tiles, angles in 1/ANGLES turns.
+SCALE = 1 << 16
+ANGLES = 1 << 12
+
+# Direction of every angle, as tanks move: (0, 1) rotated by the angle.
+_DX = [round(-math.sin(2 * math.pi * a / ANGLES) * SCALE)
+       for a in range(ANGLES)]
+_DY = [round(math.cos(2 * math.pi * a / ANGLES) * SCALE)
+       for a in range(ANGLES)]
+
+# Box types (as in maps).
+EMPTY, ROCKBOX, WOODBOX, METALBOX = 0, 1, 2, 3
+
+# Table turning a map's grid into its rockboxes (see bytes.translate).
+_ROCKBOXES = bytes(ROCKBOX if box == ROCKBOX else EMPTY for box in range(256))
+
+
+class ForwardModel:
+    """The game's state on its tile grid (see the module's docstring)."""
+
+    # How far (in fixed point) tanks are bucketed around them.
+    BUCKET_MARGIN = SCALE // 8
+
+    # Arrays which change as the model runs, copied with it.
+    _STATE = ['grid', 'box_hp',
+              'x', 'y', 'angle', 'speed', 'hp', 'cooldown', 'invincible',
+              'move', 'turn',
+              'bullet_x', 'bullet_y', 'bullet_dx', 'bullet_dy']
+
+    def __init__(self, width, height, framerate=60):
+        """
+        Initialize an empty model of a map, without tanks (see from_game).
+
+        Input:
+        width, height: Size of the map, in tiles.
+        framerate: Ticks in a second of the game.
+        """
+        self.width = width
+        self.height = height
+        self.framerate = framerate
+        self.ticks = 0
+        self.winner = -1
+
+        # Box type and woodbox hp of every tile, row by row.
+        self.grid = bytearray(width * height)
+        self.box_hp = bytearray(width * height)
+
+        # Tanks, by team: state, current action, and constants (shared).
+        self.x, self.y, self.angle, self.speed = (array('i') for _ in range(4))
+        self.hp, self.cooldown, self.invincible = (array('i')
+                                                   for _ in range(3))
+        self.move, self.turn = array('i'), array('i')
+        self.start_x, self.start_y, self.start_angle = (array('i')
+                                                        for _ in range(3))
+        self.max_speed, self.acceleration, self.turn_speed = (
+            array('i') for _ in range(3))
+        self.radius = SCALE * 2 // 5
+        self.max_hp = 3
+        self.ticks_invincible = 5 * framerate
+
+        # Bullets, in no particular order.
+        self.bullet_x, self.bullet_y = array('i'), array('i')
+        self.bullet_dx, self.bullet_dy = array('i'), array('i')
+        self.muzzle_speed = round(gameobjects.Bullet.MUZZLE_VELOCITY.length
+                                  * SCALE / framerate)
+        self.muzzle_offset = SCALE * 2 // 5
+
+        # Flag, and the team carrying it (-1 if none).
+        self.flag_x = self.flag_y = 0
+        self.carrier = -1
+        self.grab_distance = round(gameobjects.Tank.GRAB_DISTANCE * SCALE)
+        self.win_distance = round(gameobjects.Tank.WIN_DISTANCE * SCALE)
+
+        # Velocity kept every tick, after the space's damping.
+        self.damping = round(0.1 ** (1 / framerate) * SCALE)
+
+        # Tanks by tile they touch, made again every tick.
+        self._buckets = {}
+
+    @classmethod
+    def from_game(cls, gs):
+        """Return a model of the game state now."""
+        framerate = gs.settings.FRAMERATE
+        model = cls(gs.current_map.width, gs.current_map.height, framerate)
+        # Rockboxes never move, the other boxes are placed as they are now.
+        model.grid[:] = gs.current_map.grid.tobytes().translate(_ROCKBOXES)
+
+        for obj in gs.objects:
+            if isinstance(obj, gameobjects.Box):
+                x, y = obj.body.position
+                index = model._tile(round(x * SCALE), round(y * SCALE))
+                if index is None:
+                    continue
+                if obj.shape.collision_type == 2:
+                    model.grid[index] = WOODBOX
+                    model.box_hp[index] = obj.hp
+                else:
+                    model.grid[index] = METALBOX
+            elif isinstance(obj, gameobjects.Bullet):
+                x, y = obj.body.position
+                dx, dy = obj.body.velocity
+                model.bullet_x.append(round(x * SCALE))
+                model.bullet_y.append(round(y * SCALE))
+                model.bullet_dx.append(round(dx * SCALE / framerate))
+                model.bullet_dy.append(round(dy * SCALE / framerate))
+
+        for team, tank in enumerate(gs.tanks):
+            x, y = tank.body.position
+            angle = tank.body.angle
+            heading = (-math.sin(angle), math.cos(angle))
+            model.x.append(round(x * SCALE))
+            model.y.append(round(y * SCALE))
+            model.angle.append(_angle(angle))
+            model.speed.append(round(tank.body.velocity.dot(heading)
+                                     * SCALE / framerate))
+            model.hp.append(tank.hp)
+            model.cooldown.append(tank.cooldown_bullet)
+            model.invincible.append(tank.inv_ticks)
+            model.move.append(tank.acceleration)
+            model.turn.append(tank.rotation)
+            model.start_x.append(round(tank.start_position.x * SCALE))
+            model.start_y.append(round(tank.start_position.y * SCALE))
+            model.start_angle.append(_angle(tank.start_angle))
+            model.max_speed.append(round(tank.NORMAL_MAX_SPEED
+                                         * SCALE / framerate))
+            model.acceleration.append(round(tank.POS_ACC
+                                            * SCALE / framerate))
+            # Tanks turn at most as fast, in radians per second, as they
+            # move in tiles per second.
+            model.turn_speed.append(_angle(tank.NORMAL_MAX_SPEED / framerate))
+            if tank.flag is not None:
+                model.carrier = team
+        if gs.tanks:
+            model.radius = round(max(gs.tanks[0].points[2]) * SCALE)
+        model.flag_x = round(gs.flag.x * SCALE)
+        model.flag_y = round(gs.flag.y * SCALE)
+        return model
+
+    def copy(self):
+        """Return a copy of the model, sharing what never changes."""
+        model = object.__new__(ForwardModel)
+        model.__dict__.update(self.__dict__)
+        for name in self._STATE:
+            setattr(model, name, getattr(self, name)[:])
+        return model
+
+    def _tile(self, x, y):
+        """Return the index of the tile at (x, y), None if off the map."""
+        column, row = x // SCALE, y // SCALE
+        if 0 <= column < self.width and 0 <= row < self.height:
+            return row * self.width + column
+        return None
+
+    def _free(self, x, y, push, pushes):
+        """
+        Return whether a tank can drive on the point (x, y).
+
+        A woodbox or metalbox there can be pushed a tile further by push (a
+        step in tiles along one axis), if that tile is free: the push is
+        added to pushes, as the box's tile and the tile it goes to, but not
+        made.
+        """
+        index = self._tile(x, y)
+        if index is None:
+            return False
+        box = self.grid[index]
+        if box == EMPTY or index in pushes:
+            return True
+        if box == ROCKBOX:
+            return False
+
+        column, row = x // SCALE + push[0], y // SCALE + push[1]
+        if not (0 <= column < self.width and 0 <= row < self.height):
+            return False
+        target = row * self.width + column
+        if self.grid[target] != EMPTY:
+            return False
+        pushes[index] = target
+        return True
+
+    def _pushes(self, team, x, y, push):
+        """
+        Return the boxes a tank moving to (x, y) pushes, None if it is blocked.
+
+        The boxes are returned as by _free, so that nothing changes until
+        every corner and the other tanks are known not to block the move.
+        """
+        r = self.radius
+        pushes = {}
+        if not (self._free(x - r, y - r, push, pushes)
+                and self._free(x + r, y - r, push, pushes)
+                and self._free(x - r, y + r, push, pushes)
+                and self._free(x + r, y + r, push, pushes)):
+            return None
+        # A tank this close shares a tile with one of the corners.
+        reach = (2 * r) ** 2
+        buckets = self._buckets
+        near = {other
+                for key in {((x - r) // SCALE, (y - r) // SCALE),
+                            ((x + r) // SCALE, (y - r) // SCALE),
+                            ((x - r) // SCALE, (y + r) // SCALE),
+                            ((x + r) // SCALE, (y + r) // SCALE)}
+                if key in buckets
+                for other in buckets[key]}
+        if any(other != team
+               and (self.x[other] - x) ** 2 + (self.y[other] - y) ** 2
+               < reach
+               for other in near):
+            return None
+        return pushes
+
+    def _push(self, pushes):
+        """Move the boxes pushed (see _pushes) a tile further."""
+        for index, target in pushes.items():
+            self.grid[target], self.box_hp[target] = (self.grid[index],
+                                                      self.box_hp[index])
+            self.grid[index] = self.box_hp[index] = 0
+
+    def _bucket_tanks(self):
+        """
+        Bucket the tanks by every tile they touch, once a tick.
+
+        Tanks move much less than BUCKET_MARGIN in a tick, so a tank within
+        its radius of a point is always in the bucket of the point's tile.
+        """
+        self._buckets = buckets = {}
+        r = self.radius + self.BUCKET_MARGIN
+        for team in range(len(self.x)):
+            x, y = self.x[team], self.y[team]
+            for column in range((x - r) // SCALE, (x + r) // SCALE + 1):
+                for row in range((y - r) // SCALE, (y + r) // SCALE + 1):
+                    buckets.setdefault((column, row), []).append(team)
+
+    def _respawn(self, team):
+        """Respawn a tank at its start, dropping the flag."""
+        self.x[team] = self.start_x[team]
+        self.y[team] = self.start_y[team]
+        self.angle[team] = self.start_angle[team]
+        self.speed[team] = 0
+        self.hp[team] = self.max_hp
+        self.invincible[team] = self.ticks_invincible
+        if self.carrier == team:
+            self.carrier = -1
+
+    def _shoot(self, team):
+        """Fire a bullet from a tank, if it is ready to."""
+        if self.cooldown[team] >= 1:
+            return
+        self.cooldown[team] = self.framerate
+        angle = self.angle[team]
+        dx, dy = _DX[angle], _DY[angle]
+        speed = self.speed[team]
+        self.bullet_x.append(self.x[team] + dx * self.muzzle_offset // SCALE)
+        self.bullet_y.append(self.y[team] + dy * self.muzzle_offset // SCALE)
+        self.bullet_dx.append((self.muzzle_speed + speed) * dx // SCALE)
+        self.bullet_dy.append((self.muzzle_speed + speed) * dy // SCALE)
+
+    def _move_tanks(self):
+        """Turn and move every tank, as far as boxes and tanks let it."""
+        for team in range(len(self.x)):
+            if self.turn[team]:
+                self.angle[team] = ((self.angle[team]
+                                     + self.turn[team] * self.turn_speed[team])
+                                    % ANGLES)
+            move = self.move[team]
+            if not move:
+                self.speed[team] = 0
+                continue
+
+            top = self.max_speed[team]
+            if self.carrier == team:
+                top //= 2
+            speed = (self.speed[team] * self.damping // SCALE
+                     + move * self.acceleration[team])
+            speed = self.speed[team] = min(max(speed, -top), top)
+
+            # Slide along what blocks one of the axes.
+            angle = self.angle[team]
+            x, y = self.x[team], self.y[team]
+            new_x = x + speed * _DX[angle] // SCALE
+            new_y = y + speed * _DY[angle] // SCALE
+            pushes = self._pushes(team, new_x, y, (_sign(new_x - x), 0))
+            if pushes is not None:
+                self._push(pushes)
+                x = new_x
+            pushes = self._pushes(team, x, new_y, (0, _sign(new_y - y)))
+            if pushes is not None:
+                self._push(pushes)
+                y = new_y
+            self.x[team], self.y[team] = x, y
+
+    def _move_bullets(self):
+        """Move every bullet, and resolve what it hits."""
+        bullet_x, bullet_y = self.bullet_x, self.bullet_y
+        bullet_dx, bullet_dy = self.bullet_dx, self.bullet_dy
+        reach = self.radius ** 2
+        for i in range(len(bullet_x) - 1, -1, -1):
+            x = bullet_x[i] = bullet_x[i] + bullet_dx[i]
+            y = bullet_y[i] = bullet_y[i] + bullet_dy[i]
+
+            hit = True
+            index = self._tile(x, y)
+            if index is None:
+                pass
+            elif (box := self.grid[index]) == WOODBOX:
+                self.box_hp[index] -= 1
+                if not self.box_hp[index]:
+                    self.grid[index] = EMPTY
+            elif box == EMPTY:
+                hit = False
+                for team in self._buckets.get((x // SCALE, y // SCALE), ()):
+                    if (self.x[team] - x) ** 2 + (self.y[team] - y) ** 2 \
+                            < reach:
+                        hit = True
+                        if self.invincible[team] < 0:
+                            if self.hp[team] > 1:
+                                self.hp[team] -= 1
+                            else:
+                                self._respawn(team)
+                        break
+
+            # Remove the bullet, putting the last one in its place.
+            if hit:
+                for values in (bullet_x, bullet_y, bullet_dx, bullet_dy):
+                    values[i] = values[-1]
+                    values.pop()
+
+    def _update_flag(self):
+        """Move, grab and bring home the flag."""
+        if self.carrier == -1:
+            reach = self.grab_distance ** 2
+            for team in range(len(self.x)):
+                if ((self.x[team] - self.flag_x) ** 2
+                        + (self.y[team] - self.flag_y) ** 2 < reach):
+                    self.carrier = team
+                    break
+        if self.carrier != -1:
+            team = self.carrier
+            self.flag_x, self.flag_y = self.x[team], self.y[team]
+            if ((self.start_x[team] - self.flag_x) ** 2
+                    + (self.start_y[team] - self.flag_y) ** 2
+                    < self.win_distance ** 2):
+                self.winner = team
+
+    def step(self, actions=None):
+        """
+        Play one tick.
+
+        Input:
+        actions: Actions of tanks by team, as (move, turn, shoot) with move
+        and turn as Tank.acceleration and Tank.rotation. Tanks without one
+        keep moving and turning as they did, without shooting.
+        """
+        if self.winner != -1:
+            return
+        for team, (move, turn, shoot) in (actions or {}).items():
+            self.move[team] = move
+            self.turn[team] = turn
+            if shoot:
+                self._shoot(team)
+
+        self._bucket_tanks()
+        self._move_tanks()
+        self._move_bullets()
+        for team in range(len(self.x)):
+            self.cooldown[team] -= 1
+            if self.invincible[team] >= 0:
+                self.invincible[team] -= 1
+        self._update_flag()
+        self.ticks += 1
+
+    def rollout(self, team, plan):
+        """Return a copy of the model after a tank follows a plan."""
+        model = self.copy()
+        for action in plan:
+            model.step({team: action})
+        return model
+
+    def evaluate(self, team, plans, score):
+        """
+        Return the score of every plan of a tank.
+
+        Input:
+        team: Index of the tank (in gs.tanks).
+        plans: Plans, each a list of actions, one per tick.
+        score: Function of the model after a plan, and the team.
+        """
+        return [score(self.rollout(team, plan), team) for plan in plans]
+
+    def tank_position(self, team):
+        """Return the position of a tank, in tiles."""
+        return self.x[team] / SCALE, self.y[team] / SCALE
+
+
+def _angle(radians):
+    """Return an angle in radians, in ANGLES units."""
+    return round(radians / (2 * math.pi) * ANGLES) % ANGLES
+
+
+def _sign(value):
+    """Return the sign of a value, as -1, 0 or 1."""
+    return (value > 0) - (value < 0)
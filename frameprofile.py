@@ -0,0 +1,152 @@
+"""Times the stages of the game's frames, and keeps stats of recent ones."""
+from array import array
+import contextlib
+import time
+import pygame
+import resources
+
+# The stages of a game frame, in the order they run.
+STAGES = ['key_events',
+          'update_physics',
+          'tanks_try_grab_flag',
+          'decide_all_bots',
+          'update_display']
+
+
+class _Scope:
+    """Adds the time spent in a with block to a stage of the frame."""
+
+    def __init__(self, times, name):
+        """Initialize a scope adding to times[name]."""
+        self._times = times
+        self._name = name
+        self._start = 0
+
+    def __enter__(self):
+        """Start timing."""
+        self._start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        """Stop timing, and add the time to the stage."""
+        self._times[self._name] += time.perf_counter() - self._start
+
+
+class FrameProfile:
+    """
+    Times the stages of every frame, keeping the times of the last FRAMES.
+
+    A disabled profile times nothing: its stages are a shared do-nothing
+    context manager, so leaving the scopes in the game loop costs nothing.
+    """
+
+    FRAMES = 600
+    PERCENTILES = [50, 95, 99]
+
+    # How often (in frames) the overlay is drawn again.
+    OVERLAY_FRAMES = 30
+
+    KEY = pygame.K_F3
+
+    _UNTIMED = contextlib.nullcontext()
+
+    def __init__(self, stages=STAGES, enabled=False, frames=FRAMES):
+        """
+        Initialize a profile.
+
+        Input:
+        stages: Names of the stages of a frame.
+        enabled: Whether to time anything.
+        frames: How many of the last frames to keep.
+        """
+        self.stages = list(stages)
+        self.enabled = enabled
+        self.frames = frames
+
+        # Times of the frame running, and ring buffers of the last frames.
+        self._current = dict.fromkeys(self.stages, 0.0)
+        self._scopes = {name: _Scope(self._current, name)
+                        for name in self.stages}
+        self._times = {name: array('d', bytes(8 * frames))
+                       for name in self.stages}
+        self._next = 0
+        self.count = 0
+
+        self._overlay = None
+        self._overlay_count = 0
+
+    def stage(self, name):
+        """Return a context manager timing a with block as a stage."""
+        if not self.enabled:
+            return self._UNTIMED
+        return self._scopes[name]
+
+    def end_frame(self):
+        """
+        Keep the times of the frame that ended, and start a new one.
+
+        Return True every time the ring buffer is full of new frames.
+        """
+        if not self.enabled:
+            return False
+        for name in self.stages:
+            self._times[name][self._next] = self._current[name]
+            self._current[name] = 0.0
+        self._next = (self._next + 1) % self.frames
+        self.count += 1
+        return self._next == 0
+
+    def stats(self):
+        """Return the percentiles of every stage and whole frames, in s."""
+        size = min(self.count, self.frames)
+        columns = {name: self._times[name][:size] for name in self.stages}
+        columns['frame'] = [sum(frame) for frame in zip(*columns.values())]
+
+        stats = {}
+        for name, values in columns.items():
+            values = sorted(values)
+            stats[name] = [values[min(size - 1, size * p // 100)] if size
+                           else 0.0 for p in self.PERCENTILES]
+        return stats
+
+    def _rows(self):
+        """Return the cells of the report table, row by row."""
+        rows = [[f'{min(self.count, self.frames)} frames']
+                + [f'p{p}' for p in self.PERCENTILES]]
+        for name, values in self.stats().items():
+            rows.append([name] + [f'{value * 1000:.3f}' for value in values])
+        return rows
+
+    def report(self):
+        """Return a table of the percentiles of every stage, in ms."""
+        return '\n'.join(f'{row[0]:<20}' + ''.join(f'{cell:>9}'
+                                                    for cell in row[1:])
+                         for row in self._rows())
+
+    def write(self, path):
+        """Write the report to a file."""
+        with open(path, 'w') as f:
+            f.write(self.report() + '\n')
+
+    def overlay(self):
+        """Return a surface showing the report, updated now and then."""
+        if (self._overlay is None
+                or self.count - self._overlay_count >= self.OVERLAY_FRAMES):
+            cells = [[resources.render_text(cell, 24, 'White') for cell in row]
+                     for row in self._rows()]
+            widths = [max(row[i].get_width() for row in cells) + 12
+                      for i in range(len(cells[0]))]
+            height = cells[0][0].get_height()
+
+            self._overlay = pygame.Surface((sum(widths) + 8,
+                                            height * len(cells) + 8),
+                                           pygame.SRCALPHA)
+            self._overlay.fill((20, 20, 20, 200))
+            for y, row in enumerate(cells):
+                x = 4
+                for i, cell in enumerate(row):
+                    # Names are aligned left, numbers right.
+                    offset = 0 if i == 0 else widths[i] - cell.get_width()
+                    self._overlay.blit(cell, (x + offset, 4 + y * height))
+                    x += widths[i]
+            self._overlay_count = self.count
+        return self._overlay
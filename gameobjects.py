@@ -2,19 +2,39 @@
 import pygame
 import pymunk
 import math
-from pygame import mixer
+from metrics import counters
+import resources
+
+
+# Collision categories of the shapes, as pymunk.ShapeFilter bits.
+STATIC = 0b0001  # Border and rockboxes.
+BOX = 0b0010  # Woodboxes and metalboxes.
+TANK = 0b0100
+BULLET = 0b1000
+ALL = STATIC | BOX | TANK | BULLET
+
+# Filters keeping only the pairs of shapes that interact: nothing static
+# collides with anything static, and bullets go through each other.
+FILTERS = {STATIC: pymunk.ShapeFilter(categories=STATIC, mask=ALL ^ STATIC),
+           BOX: pymunk.ShapeFilter(categories=BOX, mask=ALL),
+           TANK: pymunk.ShapeFilter(categories=TANK, mask=ALL),
+           BULLET: pymunk.ShapeFilter(categories=BULLET, mask=ALL ^ BULLET)}
 
 
 def physics_to_display(x, gs):
     """Convert coordinates in the physics engine into display coordinates."""
-    return x * gs.settings.TILE_SIZE
+    if gs.camera is not None:
+        return gs.camera.to_display(x)
+    return x * (gs.settings.TILE_SIZE * gs.sprites.ratio)
 
 
 class GameObject:
     """
     Mostly handles visual aspects (pygame) of an object.
 
-    Subclasses need to implement two functions:
+    Subclasses need to implement three functions:
+    - position           that will return the position of the object in the
+      physics engine (in tiles)
     - screen_position    that will return the position of the object on the
       screen
     - screen_orientation that will return how much the object is rotated on the
@@ -33,13 +53,18 @@ class GameObject:
         """
         return
 
-    def post_update(self):
+    def post_update(self, gs):
         """
         Make updates that depend on other objects than itself.
 
-        NOTE: Should be implemented in a subclass.
+        Also keeps the object's place in the game's spatial index up to date,
+        so subclasses implementing it should call it last.
         """
-        return
+        self.update_index(gs)
+
+    def update_index(self, gs):
+        """Move the object to its position in the game's spatial index."""
+        gs.index.move(self, *self.position())
 
     def update_screen(self, screen, gs):
         """
@@ -47,12 +72,15 @@ class GameObject:
 
         NOTE: Should NOT need to be changed by a subclass.
         """
-        sprite = self.sprite
+        # Get the sprite pre-scaled to the display, keeping its transparency
+        sprite = gs.sprites.scaled(self.sprite)
+        sprite.set_alpha(self.sprite.get_alpha())
 
         # Get the position of the object (pygame coordinates)
         p = self.screen_position(gs)
         # Rotate the sprite using the rotation of the object
-        sprite = pygame.transform.rotate(sprite, self.screen_orientation())
+        if orientation := self.screen_orientation():
+            sprite = pygame.transform.rotate(sprite, orientation)
 
         # The position of the screen correspond to the center of the object,
         # but the function screen.blit expect to receive the top left corner
@@ -123,6 +151,7 @@ class GamePhysicsObject(GameObject):
         # Create a polygon shape using the corner of the rectangle
         self.shape = pymunk.Poly(self.body, points)
         self.shape.parent = self
+        self.shape.filter = FILTERS[BOX if movable else STATIC]
 
         # Set some value for friction and elasticity, which defines
         # interraction in case of a colision
@@ -132,6 +161,10 @@ class GamePhysicsObject(GameObject):
         # Add the object to the physic engine
         space.add(self.body, self.shape)
 
+    def position(self):
+        """Return the position of the body in the physics engine."""
+        return self.body.position
+
     def screen_position(self, gs):
         """
         Return the screen coordinates of the physics object.
@@ -173,6 +206,7 @@ class Bullet(GamePhysicsObject):
 
         # Add collision type to shape for collision handling.
         self.shape.collision_type = 1
+        self.shape.filter = FILTERS[BULLET]
         self.shape.parent = self
 
     def update(self, gs):
@@ -205,6 +239,10 @@ class Tank(GamePhysicsObject):
     # Constant values for the tank, acessed like: Tank.ACCELERATION
     # You can add more constants here if needed later
 
+    # How close to the flag a tank grabs it, and to its base it wins.
+    GRAB_DISTANCE = 0.5
+    WIN_DISTANCE = 0.2
+
     def __init__(self, x, y, orientation, sprite, space, gs):
         """Initialize an instance of a tank."""
         super().__init__(x, y, orientation, sprite, space, True, gs)
@@ -218,7 +256,11 @@ class Tank(GamePhysicsObject):
 
         # Set tanks hp
         self.hp = 3
-        self.defaultsprite = sprite.copy().convert_alpha()
+
+        # The sprite is shared with other game states, so the tank draws
+        # damage and transparency on its own copy.
+        self.defaultsprite = sprite
+        self.sprite = sprite.copy()
 
         # Define variable used to apply motion to the tanks.
 
@@ -250,6 +292,7 @@ class Tank(GamePhysicsObject):
         self.space = space
 
         self.shape.collision_type = 3
+        self.shape.filter = FILTERS[TANK]
         self.shape.parent = self
 
         # Respawn protection
@@ -282,6 +325,9 @@ class Tank(GamePhysicsObject):
             if self.hp > 1:
                 self.hp -= 1
                 ovl = sprites.tank_overlays[self.hp - 1]
+                # Draw on a copy, so sprites scaled from the old one are
+                # not reused for the damaged tank.
+                self.sprite = self.sprite.copy()
                 self.sprite.blit(ovl, ovl.get_rect())
             else:
                 self.respawn()
@@ -297,7 +343,7 @@ class Tank(GamePhysicsObject):
 
         # Make hp full again
         self.hp = 3
-        self.sprite = self.defaultsprite.copy().convert_alpha()
+        self.sprite = self.defaultsprite.copy()
 
         # Respawn protection
         self.inv_ticks = self.TICKS_INVINCIBLE
@@ -327,6 +373,36 @@ class Tank(GamePhysicsObject):
             self.guided_bullet.turn(3*math.pi/2)
         self.rotation = 1
 
+    def control(self, acceleration, rotation, shoot, gs):
+        """
+        Control the tank as if its keys were held, return any bullet shot.
+
+        acceleration and rotation take the values of the attributes of the
+        same name, and the tank only starts or stops moving or turning when
+        they change, as on a key press or release. Holding shoot fires when
+        the tank is ready, and guides the bullet.
+        """
+        if acceleration != self.acceleration:
+            if acceleration > 0:
+                self.accelerate()
+            elif acceleration < 0:
+                self.decelerate()
+            else:
+                self.stop_moving()
+
+        if rotation != self.rotation:
+            if rotation > 0:
+                self.turn_right()
+            elif rotation < 0:
+                self.turn_left()
+            else:
+                self.stop_turning()
+
+        if not shoot:
+            self.guided_bullet = None
+            return None
+        return self.shoot(gs)
+
     def update(self, gs):
         """
         Update the objects coordinates.
@@ -352,7 +428,7 @@ class Tank(GamePhysicsObject):
         self.body.angular_velocity = clamp(self.max_speed,
                                            self.body.angular_velocity)
 
-    def post_update(self):
+    def post_update(self, gs):
         """
         Update flag position or max speed.
 
@@ -382,6 +458,8 @@ class Tank(GamePhysicsObject):
             # Decrement ticks for respawn protection
             self.inv_ticks -= 1
 
+        super().post_update(gs)
+
     def try_grab_flag(self, flag, gs):
         """
         Attempt to make the tank grab the flag.
@@ -393,11 +471,10 @@ class Tank(GamePhysicsObject):
         if (not flag.is_on_tank):
             # Check if the tank is close to the flag
             flag_pos = pymunk.Vec2d(flag.x, flag.y)
-            if ((flag_pos - self.body.position).length < 0.5):
+            if ((flag_pos - self.body.position).length < self.GRAB_DISTANCE):
                 # Grab the flag !
                 if gs.settings.SOUND:
-                    pickupflag_sound = mixer.Sound('data/pickupflag.wav')
-                    pickupflag_sound.play()
+                    resources.sounds.play('pickupflag')
                 self.flag = flag
                 flag.is_on_tank = True
                 self.max_speed = self.FLAG_MAX_SPEED
@@ -412,7 +489,7 @@ class Tank(GamePhysicsObject):
 
         return self.flag is not None and (self.start_position
                                           - self.body.position
-                                          ).length < 0.2
+                                          ).length < self.WIN_DISTANCE
 
     def shoot(self, gs):
         """Shoot (return) a bullet."""
@@ -422,11 +499,11 @@ class Tank(GamePhysicsObject):
                 self.body.angle
             ) / 5
             self.cooldown_bullet = gs.settings.FRAMERATE
+            counters.bullets_fired += 1
 
             # Sound for bullet
             if gs.settings.SOUND:
-                bullet_sound_shoot = mixer.Sound('data/tankhit.wav')
-                bullet_sound_shoot.play()
+                resources.sounds.play('shoot')
 
             # Return instance of bullet
             self.guided_bullet = Bullet(self.body.position[0],
@@ -465,6 +542,15 @@ class Box(GamePhysicsObject):
         self.hp = hp
         self.shape.parent = self
 
+    def update_index(self, gs):
+        """
+        Leave boxes out of the game's spatial index.
+
+        There are too many boxes to move them all in it at every tick, so
+        they are found through the physics engine's own index instead.
+        """
+        return
+
 
 def get_box_with_type(x, y, boxtype, space, gs):
     """
@@ -515,6 +601,10 @@ class GameVisibleObject(GameObject):
         self.orientation = 0
         super().__init__(sprite)
 
+    def position(self):
+        """Return the position of the object in the physics engine."""
+        return pymunk.Vec2d(self.x, self.y)
+
     def screen_position(self, gs):
         """
         Return visual coordinates of the object.
@@ -554,6 +644,7 @@ class Explosion(GameVisibleObject):
 
         if self.timer < 1:
             gs.objects.remove(self)
+            gs.index.remove(self)
         elif self.timer < 0.125 * self.LIFETIME:
             self.sprite = gs.sprites.explosion_list[7]
         elif self.timer < 0.250 * self.LIFETIME:
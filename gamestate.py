@@ -1,9 +1,9 @@
 """Includes the class GameState which represents the state of the game."""
-from gameobjects import Explosion
+from gameobjects import Explosion, Tank
+from metrics import counters
 import objectcreation
-from resources import Sprites
-from ai import AI
-from pygame import mixer
+from resources import Sprites, sounds
+from spatialindex import GridIndex
 
 
 class GameState:
@@ -19,6 +19,9 @@ class GameState:
     - current map
     - list of all players
     - list of all ai bots
+    - spatial index of all game objects
+    - camera showing the game (if it is displayed)
+    - forward model of the game this tick (see forward_model)
 
     Also has method for generating fresh instance, using objectcreation module.
     """
@@ -43,14 +46,27 @@ class GameState:
         self.players = players
         self.ais = ais
         self.sprites = Sprites(screen, self)
+        self.index = None
+        self.camera = None
 
-    def generate_fresh(self, screen):
+        # The forward model of this tick, built when first asked for.
+        self._model = None
+
+    def generate_fresh(self):
         """Generate everything fresh, based on current_map and settings."""
         (self.flag,
          self.tanks,
          self.objects,
          self.space) = objectcreation.create_everything(self)
 
+        self.index = GridIndex(self.current_map.width,
+                               self.current_map.height)
+        [obj.update_index(self) for obj in self.objects]
+        self._model = None
+
+        # The AI is only needed (and imported) once there are bots
+        from ai import AI
+
         self.players = self.tanks[:self.settings.NPLAYERS]
         self.ais = [AI(tank,
                        self.objects,
@@ -65,7 +81,6 @@ class GameState:
             ai.tank.ANG_ACC *= 1.3
             ai.tank.NORMAL_MAX_SPEED *= 1.5
 
-        self.sprites = Sprites(screen, self)
         return self
 
     def decide_all_bots(self):
@@ -76,37 +91,71 @@ class GameState:
             if bullet := ai.maybe_shoot(self):
                 self.objects.append(bullet)
 
+    def forward_model(self):
+        """
+        Return a forward model of the game this tick, shared by the AIs.
+
+        It is only built the first time it is asked for in a tick. Models are
+        never changed by playing them out (see forwardmodel), so every AI can
+        use the same one.
+        """
+        if self._model is None:
+            import forwardmodel
+            self._model = forwardmodel.ForwardModel.from_game(self)
+        return self._model
+
+    def tanks_near_flag(self, distance):
+        """Return the tanks at most distance from the flag."""
+        return [obj for obj in self.index.query_radius(self.flag.x,
+                                                       self.flag.y,
+                                                       distance)
+                if isinstance(obj, Tank)]
+
     def tanks_try_grab_flag(self):
-        """Try to grab flag for every tank in gamestate."""
-        [tank.try_grab_flag(self.flag, self) for tank in self.tanks]
+        """Try to grab flag for every tank close enough to it."""
+        if not self.flag.is_on_tank:
+            [tank.try_grab_flag(self.flag, self)
+             for tank in self.tanks_near_flag(Tank.GRAB_DISTANCE)]
+
+    def tanks_won(self):
+        """
+        Return the tanks which have won.
+
+        Only the tank carrying the flag can have won, and the flag is where
+        it is.
+        """
+        if not self.flag.is_on_tank:
+            return []
+        return [tank for tank in self.tanks_near_flag(Tank.GRAB_DISTANCE)
+                if tank.has_won()]
 
     def add_collision_handlers(self):
         """Add collision handlers to the gamestate."""
-        if self.settings.SOUND:
-            collision_sound_wall = mixer.Sound('data/collisionobject.flac')
-            explosion_sound = mixer.Sound('data/explosion.wav')
-
         def _remove_object(obj):
             if obj in self.objects:
                 self.objects.remove(obj)
+                self.index.remove(obj)
+                counters.explosions += 1
                 self.objects.append(Explosion(obj.body.position,
                                               self))
                 if self.settings.SOUND:
-                    explosion_sound.play()
+                    sounds.play('explosion')
 
             self.space.remove(obj.shape, obj.shape.body)
             return True
 
         def _collision_bullet_border_rockbox_metalbox(arb, space, data):
             bullet = arb.shapes[0].parent
+            counters.collision_events += 1
             if self.settings.SOUND:
-                collision_sound_wall.play()
+                sounds.play('collision')
             _remove_object(bullet)
             return True
 
         def _collision_bullet_woodbox(arb, space, data):
             bullet = arb.shapes[0].parent
             woodbox = arb.shapes[1].parent
+            counters.collision_events += 1
             _remove_object(bullet)
             if woodbox.hp > 1:
                 woodbox.sprite = self.sprites.woodbox_broken
@@ -119,6 +168,7 @@ class GameState:
         def _collision_bullet_tank(arb, space, data):
             bullet = arb.shapes[0].parent
             tank = arb.shapes[1].parent
+            counters.collision_events += 1
             _remove_object(bullet)
             tank.take_damage(self.sprites)
             return True
@@ -146,6 +196,8 @@ class GameState:
         Also update the display of the game and control the frame rate.
         """
         # -- Update physics
+        counters.ticks += 1
+        self._model = None
         if skip_update == 0:
             # Loop over all the game objects and update their speed in function
             # of their acceleration.
@@ -154,9 +206,13 @@ class GameState:
         else:
             skip_update -= 1
 
-        # Check collisions and update the objects position
-        self.space.step(1 / self.settings.FRAMERATE)
+        # Check collisions and update the objects position, in as many
+        # smaller steps as configured (fast bullets tunnel less).
+        substeps = self.settings.PHYSICS_SUBSTEPS
+        dt = 1 / (self.settings.FRAMERATE * substeps)
+        for _ in range(substeps):
+            self.space.step(dt)
 
         # Update object that depends on an other object position
         # (for instance a flag)
-        [obj.post_update() for obj in self.objects]
+        [obj.post_update(self) for obj in self.objects]
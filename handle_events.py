@@ -1,6 +1,9 @@
 """All event handlers."""
+import functools
 import pygame
 from pymunk import Vec2d
+from metrics import counters
+import resources
 
 
 def key_events(events, gs):
@@ -83,77 +86,102 @@ def key_events(events, gs):
     return True
 
 
-def update_display(screen,
-                   background,
-                   gs,
-                   clock,
-                   scores,
-                   lesser_ratio,
-                   scores_millis):
+def render_target(screen, current_map, settings):
     """
-    Update the pygame display.
+    Return the part of the screen the map is drawn on, and its scale.
 
-    Blit everything happening to a surface, then blit that surface to
-    the pygame screen.
-
-    Also blit score overlay to screen if any tank recently has won.
+    The target is a subsurface of the screen, centered and scaled to fit it,
+    so it only has to be created again when the window size changes. Maps
+    whose tiles would be smaller than settings.MIN_TILE_PIXELS are shown at
+    that size instead, and only partly (see camera.Camera).
     """
     # Get screen size
     s_w, s_h = screen.get_size()
 
     # Get map size
-    map_w, map_h = gs.current_map.rect().size
+    map_w, map_h = current_map.rect().size
 
-    # Create surface for blitting everything on
-    temp_surf = pygame.Surface((map_w, map_h))
+    ratio = max(min(s_w/map_w, s_h/map_h),
+                settings.MIN_TILE_PIXELS / settings.TILE_SIZE)
+    rect = pygame.Rect(0, 0,
+                       min(s_w, int(map_w*ratio)),
+                       min(s_h, int(map_h*ratio)))
+    rect.center = (s_w // 2, s_h // 2)
 
-    # Display the background on the surface
-    temp_surf.blit(background, (0, 0))
+    # Blit black background once, the map covers everything else
+    screen.fill((0, 0, 0))
 
-    # Update the display of the game objects on the surface
-    [obj.update_screen(temp_surf, gs) for obj in gs.objects]
+    return screen.subsurface(rect), ratio
 
-    # Display scores on map
-    text_font = pygame.font.Font('data/Pixeltype.ttf',
-                                 int(gs.settings.TILE_SIZE/2))
 
-    [temp_surf.blit(text_font.render(f'{scores.get(key)}', False, "White"),
-                    (gs.settings.TILE_SIZE *
-                     (key + Vec2d(-0.4, -0.4))).int_tuple)
-     for key in scores.keys()]
+def update_display(target,
+                   gs,
+                   scores,
+                   scores_millis,
+                   overlay=None):
+    """
+    Update the pygame display.
 
-    # Blit black background
-    screen.fill((0, 0, 0))
+    Blit everything in view of the game's camera straight to the render
+    target (see render_target), using sprites pre-scaled to the display.
+
+    Also blit score overlay to screen if any tank recently has won, and the
+    surface overlay (if any) on top of everything.
+    """
+    counters.frames += 1
+
+    # Size of a tile on the display
+    tile_size = gs.settings.TILE_SIZE * gs.sprites.ratio
+
+    # Display the background on the target
+    gs.camera.draw_background()
+
+    # Update the display of the game objects in view on the target
+    [obj.update_screen(target, gs) for obj in gs.camera.visible_objects()]
+
+    # Display scores on map
+    [target.blit(resources.render_text(f'{scores.get(key)}',
+                                       int(tile_size/2),
+                                       "White"),
+                 gs.camera.to_display(key + Vec2d(-0.4, -0.4)).int_tuple)
+     for key in scores.keys()]
 
     # Blit score overlay (if necessary)
     curr_millis = pygame.time.get_ticks()
     millis_since_score = curr_millis - scores_millis
     if millis_since_score < 2000:
-        score_surf = scores_overlay(gs.settings.TILE_SIZE,
+        score_surf = scores_overlay(tile_size,
                                     scores,
-                                    (map_w, map_h))
-        temp_surf.blit(score_surf, (0, 0))
+                                    target.get_size(),
+                                    gs.camera.to_display(Vec2d(0, 0)))
+        target.blit(score_surf, (0, 0))
 
-    # Rescale temp_surf
-    scaled = pygame.transform.scale(temp_surf, (int(map_w*lesser_ratio),
-                                                int(map_h*lesser_ratio)))
-    # Blit scaled surface to screen
-    screen.blit(scaled, scaled.get_rect(center=(s_w / 2, s_h / 2)))
+    if overlay is not None:
+        target.blit(overlay, (0, 0))
 
     # Update the screen
     pygame.display.flip()
 
-    # Control the game framerate
-    if gs.settings.USE_CLOCK:
-        clock.tick(gs.settings.FRAMERATE)
 
+def scores_overlay(tile_size,
+                   scores,
+                   map_size,
+                   origin=(0, 0)) -> pygame.Surface:
+    """
+    Return a surface displaying the game score.
 
-def scores_overlay(tile_size, scores, map_size) -> pygame.Surface:
-    """Return a surface displaying the game score."""
+    origin is where the top left corner of the map is on the surface. The
+    surface is only rebuilt when the scores (or sizes, or origin) change.
+    """
+    return _scores_overlay(tile_size,
+                           tuple(scores.items()),
+                           tuple(map_size),
+                           tuple(origin))
 
-    # Create bigger font
-    font = pygame.font.Font('data/Pixeltype.ttf', int(tile_size))
 
+@functools.lru_cache(maxsize=1)
+def _scores_overlay(tile_size, scores, map_size, origin) -> pygame.Surface:
+    """Build the scores overlay from a tuple of (coord, score) pairs."""
     # Create (transparent) surface with same dimensions as screen
     surf = pygame.Surface(map_size, pygame.SRCALPHA)
 
@@ -161,11 +189,11 @@ def scores_overlay(tile_size, scores, map_size) -> pygame.Surface:
     surf.fill((20, 20, 20, 200))
 
     # For every score, blit on the surface
-    for coord, score in scores.items():
-        curr_surf = font.render(str(score),
-                                False,
-                                'Yellow')
-        surf_coords = (coord*tile_size).int_tuple
+    for coord, score in scores:
+        curr_surf = resources.render_text(str(score),
+                                          int(tile_size),
+                                          'Yellow')
+        surf_coords = (coord*tile_size + origin).int_tuple
 
         # Blit score in middle of base coordinate
         surf.blit(curr_surf, curr_surf.get_rect(center=surf_coords))
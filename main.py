@@ -3,27 +3,87 @@
 
 # -- Import libraries
 import asyncio
+import contextlib
 import sys
+import time
 from enum import Enum
-import pygame
-import handle_events
-from pygame import mixer
 
-# -- Import from the ctf framework.
-import menus
-import maps
-from resources import Sprites
-import resources
-import gamestate
+# Time the process started, for the startup profile.
+PROCESS_START = time.perf_counter()
+
+
+class StartupProfile:
+    """Records how long each phase of starting the game takes."""
+
+    def __init__(self, enabled):
+        """Initialize a profile, which only records anything if enabled."""
+        self.enabled = enabled
+        self.phases = {}
+
+        # Time spent waiting for the player in the menus, which is not part
+        # of starting the game.
+        self.waiting = 0
+
+    @contextlib.contextmanager
+    def wait(self):
+        """Count the time spent in a with block as waiting for the player."""
+        start = time.perf_counter()
+        yield
+        self.waiting += time.perf_counter() - start
+
+    def record(self, name, start):
+        """
+        Record that a phase started at start ended now.
+
+        Only the first time a phase ends is recorded. Return True if it was.
+        """
+        if not self.enabled or name in self.phases:
+            return False
+        self.phases[name] = time.perf_counter() - start
+        return True
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Record the time spent in a with block as a phase."""
+        start = time.perf_counter()
+        yield
+        self.record(name, start)
+
+    def report(self) -> str:
+        """Return a table of the recorded phases."""
+        since_start = time.perf_counter() - PROCESS_START
+        lines = [f'{name:<24}{seconds * 1000:9.2f} ms'
+                 for name, seconds in self.phases.items()]
+        lines.append(f'{"startup, without menus":<24}'
+                     f'{(since_start - self.waiting) * 1000:9.2f} ms')
+        lines.append(f'{"waiting in menus":<24}{self.waiting * 1000:9.2f} ms')
+        lines.append(f'{"since process start":<24}'
+                     f'{since_start * 1000:9.2f} ms')
+        return '\n'.join(lines)
 
 
 async def main():
     """Main program loop."""
+    profile = StartupProfile("--startup-profile" in sys.argv)
+
+    # -- Import the game framework, only once the game is started
+    with profile.phase('imports'):
+        import pygame
+        import camera
+        import handle_events
+        import menus
+        import maps
+        import assetcache
+        import frameprofile
+        import resources
+        import gamestate
+
     # -- Create a clock instance
     clock = pygame.time.Clock()
 
     # -- Initialize the display.
-    pygame.init()
+    with profile.phase('pygame.init'):
+        pygame.init()
 
     # -- Set the caption of window
     pygame.display.set_caption('Capture The Flag')
@@ -35,20 +95,75 @@ async def main():
     if "--map" in sys.argv:
         # Get file name from options
         file_path = sys.argv[sys.argv.index("--map") + 1]
-        # Generate map from text file
-        selected_map = maps.map_from_txt(file_path)
+        # Generate map from text or binary file
+        selected_map = maps.load_map(file_path)
     # multiplayer
     if "--mp" in sys.argv:
         selected_settings.NPLAYERS = 2
     # no clock
     if "--noclock" in sys.argv:
         selected_settings.USE_CLOCK = False
-    if True:
+    # no sound
+    if "--nosound" in sys.argv:
         selected_settings.SOUND = False
+    # frame profile, written to a file
+    frame_profile_path = None
+    if "--frame-profile" in sys.argv:
+        frame_profile_path = sys.argv[sys.argv.index("--frame-profile") + 1]
+
+    # Time the stages of game frames (from the start if writing them to a
+    # file, else once the overlay is first shown)
+    frames = frameprofile.FrameProfile(
+        enabled=frame_profile_path is not None)
+    show_frame_profile = False
+    # profile a window of ticks, written to files
+    capture = None
+    if "--profile" in sys.argv:
+        import profilecapture
+        window = profilecapture.DEFAULT_WINDOW
+        if "--profile-window" in sys.argv:
+            window = sys.argv[sys.argv.index("--profile-window") + 1]
+        interval = profilecapture.DEFAULT_INTERVAL
+        if "--profile-interval" in sys.argv:
+            # Given in milliseconds, 0 to only run cProfile
+            interval = float(
+                sys.argv[sys.argv.index("--profile-interval") + 1]) / 1000
+        capture = profilecapture.ProfileCapture(
+            sys.argv[sys.argv.index("--profile") + 1], window, interval)
+    # metrics, written to files now and then
+    metrics_writer = None
+    if "--metrics" in sys.argv:
+        import metrics
+        metrics_interval = 10.0
+        if "--metrics-interval" in sys.argv:
+            metrics_interval = float(
+                sys.argv[sys.argv.index("--metrics-interval") + 1])
+        metrics_writer = metrics.MetricsWriter(
+            sys.argv[sys.argv.index("--metrics") + 1], metrics_interval)
+    # memory tracked round by round, reported to a file
+    memory = None
+    if "--memory-report" in sys.argv:
+        import memtrack
+        memory = memtrack.MemoryTracker()
 
     # Set display to (800, 800)
     DEF_SCREEN_SIZE = (800, 800)
-    screen = pygame.display.set_modemenus.set_display(DEF_SCREEN_SIZE)
+    with profile.phase('display'):
+        screen = menus.set_display(DEF_SCREEN_SIZE)
+
+    with profile.phase('asset load'):
+        # Use the pre-decoded sprites, if they are built and up to date
+        resources.assets.cache = assetcache.load()
+
+        # Sprites are otherwise loaded when first used
+        if profile.enabled:
+            resources.assets.load_all()
+
+    # Decode the sound effects now, rather than when first played during a
+    # physics step
+    if selected_settings.SOUND:
+        with profile.phase('sound load'):
+            resources.sounds.load_all()
 
     # -- Create a gamestate
     gs = gamestate.GameState(screen,
@@ -69,6 +184,9 @@ async def main():
 
     skip_update = 0
 
+    # Count the games played, as round numbers start again every game
+    games = 0
+
     # Game and menu state class
     Menu = Enum('Menu', ['OFF', 'HOMESCREEN', 'SETTINGS', 'GAME'])
     draw = Menu.HOMESCREEN
@@ -78,20 +196,18 @@ async def main():
         # - Handle state change
         if draw != old_draw:
             # This code only runs once, just as draw changes
-            if draw == Menu.HOMESCREEN:
-                sprites = Sprites(screen, gs)
+            # Make sure a menu being entered is drawn
+            menus.invalidate()
 
-                # Set background
-                background = sprites.background
-
-            elif draw == Menu.GAME:
-                # Get current map size
-                map_w, map_h = gs.current_map.rect().size
-                w, h = screen.get_size()
-                lesser_ratio = min(h/map_h, w/map_w)
+            # Stop profiling when leaving a game inside the profile window,
+            # rather than profile the menus and the next game
+            if old_draw == Menu.GAME and capture is not None:
+                capture.stop()
 
+            if draw == Menu.GAME:
                 # Populate gamestate
-                gs.generate_fresh(screen)
+                with profile.phase('first generate_fresh'):
+                    gs.generate_fresh()
 
                 # Add collision handlers
                 gs.add_collision_handlers()
@@ -99,30 +215,43 @@ async def main():
                 # Initialise all player scores to zero
                 scores = {tank.start_position: 0 for tank in gs.tanks}
 
-                sprites = Sprites(screen, gs)
-
-                # Set background
-                background = sprites.background
+                # Count the games, and the rounds and ticks of this game
+                games += 1
+                round_number = 1
+                game_ticks = 0
+                if memory is not None:
+                    memory.snapshot(games, round_number)
+
+                # Get the part of the screen the map is drawn on, and
+                # pre-scale sprites and background to it
+                target, ratio = handle_events.render_target(screen,
+                                                            gs.current_map,
+                                                            gs.settings)
+                gs.sprites.rescale(ratio)
+                gs.camera = camera.Camera(target, gs, ratio)
 
         # - Keep track of state change
         old_draw = draw
 
-        # Get event list
-        events = pygame.event.get()
+        # Get event list (sleeping until there are any in the menus)
+        if draw == Menu.GAME:
+            events = pygame.event.get()
+        else:
+            with profile.wait():
+                events = menus.wait_events(clock, gs.settings.FRAMERATE)
 
         for event in events:
             if event.type == pygame.VIDEORESIZE:
-                map_w, map_h = gs.current_map.rect().size
-                w, h = event.w, event.h
                 screen = menus.set_display((event.w, event.h))
-                sprites = Sprites(screen, gs)
-                background = sprites.background
-                lesser_ratio = min(h/map_h, w/map_w)
+                if draw == Menu.GAME:
+                    target, ratio = handle_events.render_target(
+                        screen, gs.current_map, gs.settings)
+                    gs.sprites.rescale(ratio)
+                    gs.camera = camera.Camera(target, gs, ratio)
 
         # --- Homescreen
         if draw == Menu.HOMESCREEN:
             draw = menus.home_screen(screen,
-                                     clock,
                                      gs,
                                      events,
                                      Menu)
@@ -130,63 +259,119 @@ async def main():
         # --- Settings screen
         elif draw == Menu.SETTINGS:
             draw, gs = menus.settings(screen,
-                                      clock,
                                       gs,
                                       events,
-                                      Menu,
-                                      sprites)
+                                      Menu)
 
         # --- Game
         elif draw == Menu.GAME:
+            frame_start = time.perf_counter()
+
+            # Profile the window of ticks asked for
+            game_ticks += 1
+            if capture is not None:
+                capture.tick(game_ticks, round_number)
+            if metrics_writer is not None:
+                metrics_writer.maybe_write(gs)
+
+            # Start counting sound effects played this frame
+            resources.sounds.new_frame()
 
             # Handle key input and return to HOMESCREEN if ESC is pressed
-            if not handle_events.key_events(events, gs):
-                draw = Menu.HOMESCREEN
+            with frames.stage('key_events'):
+                if not handle_events.key_events(events, gs):
+                    draw = Menu.HOMESCREEN
+
+            # Toggle the frame profile overlay
+            for event in events:
+                if (event.type == pygame.KEYDOWN
+                        and event.key == frames.KEY):
+                    show_frame_profile = not show_frame_profile
+                    frames.enabled = True
 
             # Close program if window is quit
             if pygame.QUIT in [event.type for event in events]:
                 draw = Menu.OFF
 
             # Update all physics
-            gs.update_physics(skip_update)
+            with frames.stage('update_physics'):
+                gs.update_physics(skip_update)
 
             # Try to grab flag for every tank
-            gs.tanks_try_grab_flag()
+            with frames.stage('tanks_try_grab_flag'):
+                gs.tanks_try_grab_flag()
 
             # Check if any tanks have won
-            for tank in gs.tanks:
-                if tank.has_won():
-
-                    # Increase score for tank won
-                    scores[tank.start_position] += 1
+            for tank in gs.tanks_won():
+                # Increase score for tank won
+                scores[tank.start_position] += 1
 
-                    # Return to homescreen if any score is 5
-                    if scores[tank.start_position] == 5:
-                        draw = Menu.HOMESCREEN
+                # Return to homescreen if any score is 5
+                if scores[tank.start_position] == 5:
+                    draw = Menu.HOMESCREEN
 
-                    # Generate fresh instances of everything
-                    gs.generate_fresh(screen)
+                # Generate fresh instances of everything
+                gs.generate_fresh()
 
-                    # Create new collision handlers
-                    gs.add_collision_handlers()
+                # Create new collision handlers
+                gs.add_collision_handlers()
 
-                    # Remember millis when game was reset
-                    # (Start displaying scores overlay)
-                    scores_millis = pygame.time.get_ticks()
+                # Remember millis when game was reset
+                # (Start displaying scores overlay)
+                scores_millis = pygame.time.get_ticks()
+                round_number += 1
+                if memory is not None:
+                    memory.snapshot(games, round_number)
 
             # Make all bots decide + maybe_shoot
-            gs.decide_all_bots()
+            with frames.stage('decide_all_bots'):
+                gs.decide_all_bots()
 
             # Update display
             if gs.settings.DRAW:
-                handle_events.update_display(screen,
-                                             background,
-                                             gs,
-                                             clock,
-                                             scores,
-                                             lesser_ratio,
-                                             scores_millis)
+                with frames.stage('update_display'):
+                    gs.camera.update(events)
+                    handle_events.update_display(
+                        target,
+                        gs,
+                        scores,
+                        scores_millis,
+                        frames.overlay() if show_frame_profile else None)
+
+                # Report startup times, once the first frame is drawn (and
+                # before waiting for the next one)
+                if profile.record('first frame', frame_start):
+                    print(profile.report())
+
+                # Control the game framerate
+                if gs.settings.USE_CLOCK:
+                    clock.tick(gs.settings.FRAMERATE)
+
+            # Write the frame profile every time it is full of new frames
+            if frames.end_frame() and frame_profile_path is not None:
+                frames.write(frame_profile_path)
+
         await asyncio.sleep(0)
 
+    # Report what loading the sprites cost
+    if "--asset-times" in sys.argv:
+        print(resources.assets.report())
+
+    if frame_profile_path is not None:
+        frames.write(frame_profile_path)
+
+    # Write the profile, if the game ended inside its window
+    if capture is not None:
+        capture.stop()
+
+    # Write the last metrics
+    if metrics_writer is not None:
+        metrics_writer.write(gs)
+
+    # Report how memory changed from round to round
+    if memory is not None:
+        memory.write(sys.argv[sys.argv.index("--memory-report") + 1])
+
 
-asyncio.run(main())
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Precomputes facts about a map's passable tiles, for the AI.
+
+Compiling a map finds the connected components of the tiles tanks can drive
+through (everything but rockboxes), the distance (in tiles) from every start
+position and from the flag to every tile, and the chokepoints: tiles which
+split a component in two when blocked. Compiled maps are kept by map content
+hash, and saved next to maps loaded from a file.
+"""
+from array import array
+from collections import deque
+import json
+import os
+import struct
+import sys
+
+# Box types tanks can drive through (grass, woodbox and metalbox).
+PASSABLE = {0, 2, 3}
+
+# Sidecar file layout: magic, version, length of the JSON index, the index,
+# then every array (components, distance fields, chokepoints) as int32.
+MAGIC = b'CTFCOMPL'
+VERSION = 1
+_HEADER = struct.Struct('<8sII')
+
+
+class CompiledMap:
+    """Connected components, distance fields and chokepoints of a map."""
+
+    def __init__(self, width, height, components, fields, chokepoints):
+        """
+        Initialize a compiled map.
+
+        Input:
+        width, height: Size of the map.
+        components: Component of every tile, row by row (-1 if impassable).
+        fields: Distance from a tile to every tile, by (x, y) of the tile
+        (-1 if unreachable).
+        chokepoints: Indices of the chokepoint tiles.
+        """
+        self.width = width
+        self.height = height
+        self.components = components
+        self.fields = fields
+        self.chokepoints = chokepoints
+        self._chokepoint_set = set(chokepoints)
+
+    def component_at(self, x, y):
+        """Return the component of the tile at (x, y), -1 if impassable."""
+        return self.components[int(y) * self.width + int(x)]
+
+    def reachable(self, start, goal):
+        """Return whether the tile goal can be reached from the tile start."""
+        component = self.component_at(*start)
+        return component != -1 and component == self.component_at(*goal)
+
+    def distances_to(self, tile):
+        """
+        Return the distance field of a start position or flag tile.
+
+        Return None for any other tile.
+        """
+        return self.fields.get((int(tile[0]), int(tile[1])))
+
+    def distance(self, tile, goal):
+        """Return the distance from tile to goal, or None if not known."""
+        if (field := self.distances_to(goal)) is None:
+            return None
+        distance = field[int(tile[1]) * self.width + int(tile[0])]
+        return None if distance == -1 else distance
+
+    def is_chokepoint(self, x, y):
+        """Return whether blocking the tile at (x, y) splits its component."""
+        return int(y) * self.width + int(x) in self._chokepoint_set
+
+
+def _neighbours(index, passable, width, height):
+    """Yield the passable tiles bordering the tile at index."""
+    x, y = index % width, index // width
+    if x > 0 and passable[index - 1]:
+        yield index - 1
+    if x < width - 1 and passable[index + 1]:
+        yield index + 1
+    if y > 0 and passable[index - width]:
+        yield index - width
+    if y < height - 1 and passable[index + width]:
+        yield index + width
+
+
+def _components(passable, width, height):
+    """Label every passable tile with its connected component."""
+    components = array('i', [-1]) * (width * height)
+    label = 0
+    for start in range(width * height):
+        if not passable[start] or components[start] != -1:
+            continue
+        # Flood fill a whole run of a row at a time, continuing from the
+        # first tile of every unlabelled run above and below it.
+        stack = [start]
+        while stack:
+            tile = stack.pop()
+            if components[tile] != -1:
+                continue
+            row = tile - tile % width
+            left = right = tile
+            while (left > row and passable[left - 1]
+                   and components[left - 1] == -1):
+                left -= 1
+            while (right < row + width - 1 and passable[right + 1]
+                   and components[right + 1] == -1):
+                right += 1
+            components[left:right + 1] = array('i', [label]) * (right
+                                                                - left + 1)
+            for offset in (-width, width):
+                if not 0 <= row + offset < width * height:
+                    continue
+                in_run = False
+                for neighbour in range(left + offset, right + offset + 1):
+                    if passable[neighbour] and components[neighbour] == -1:
+                        if not in_run:
+                            stack.append(neighbour)
+                        in_run = True
+                    else:
+                        in_run = False
+        label += 1
+    return components
+
+
+def _distances(start, passable, width, height):
+    """Return the distance from the tile start to every tile (BFS)."""
+    distances = array('i', [-1]) * (width * height)
+    if not passable[start]:
+        return distances
+    distances[start] = 0
+    queue = deque([start])
+    while queue:
+        tile = queue.popleft()
+        for neighbour in _neighbours(tile, passable, width, height):
+            if distances[neighbour] == -1:
+                distances[neighbour] = distances[tile] + 1
+                queue.append(neighbour)
+    return distances
+
+
+def _chokepoints(passable, width, height):
+    """Return the articulation points of the passable tiles (Tarjan)."""
+    discovered = array('i', [-1]) * (width * height)
+    low = array('i', [0]) * (width * height)
+    points = set()
+    time = 0
+    for root in range(width * height):
+        if not passable[root] or discovered[root] != -1:
+            continue
+        discovered[root] = low[root] = time
+        time += 1
+        root_children = 0
+        # Depth first search without recursion, as maps can be large.
+        stack = [(root, -1, _neighbours(root, passable, width, height))]
+        while stack:
+            tile, parent, neighbours = stack[-1]
+            for neighbour in neighbours:
+                if discovered[neighbour] == -1:
+                    discovered[neighbour] = low[neighbour] = time
+                    time += 1
+                    stack.append((neighbour, tile, _neighbours(
+                        neighbour, passable, width, height)))
+                    break
+                elif neighbour != parent:
+                    low[tile] = min(low[tile], discovered[neighbour])
+            else:
+                stack.pop()
+                if parent == -1:
+                    continue
+                low[parent] = min(low[parent], low[tile])
+                if parent == root:
+                    root_children += 1
+                elif low[tile] >= discovered[parent]:
+                    points.add(parent)
+        if root_children > 1:
+            points.add(root)
+    return array('i', sorted(points))
+
+
+# Translation table from box type to whether it is passable.
+_PASSABLE_TABLE = bytes(box in PASSABLE for box in range(256))
+
+
+def _passable(current_map):
+    """Return one byte per tile of a map, true if tanks can drive through."""
+    return current_map.grid.tobytes().translate(_PASSABLE_TABLE)
+
+
+def components(current_map):
+    """Return the connected component of every tile of a map, row by row."""
+    return _components(_passable(current_map),
+                       current_map.width,
+                       current_map.height)
+
+
+def compile_map(current_map):
+    """Compute and return the CompiledMap of a map."""
+    width, height = current_map.width, current_map.height
+    passable = _passable(current_map)
+
+    tiles = [(int(x), int(y)) for x, y, _ in current_map.start_positions]
+    tiles.append(tuple(map(int, current_map.flag_position)))
+    fields = {(x, y): _distances(y * width + x, passable, width, height)
+              for x, y in tiles}
+
+    return CompiledMap(width,
+                       height,
+                       _components(passable, width, height),
+                       fields,
+                       _chokepoints(passable, width, height))
+
+
+def _sidecar_path(current_map):
+    """Return the file next to a map the compiled map is saved in."""
+    if current_map.file_path is None:
+        return None
+    return f'{current_map.file_path}.{current_map.digest()[:12]}.compiled'
+
+
+def save(compiled_map, path):
+    """Write a compiled map to a file."""
+    index = json.dumps({'width': compiled_map.width,
+                        'height': compiled_map.height,
+                        'fields': list(compiled_map.fields),
+                        'chokepoints': len(compiled_map.chokepoints)}).encode()
+    # Write a temporary file and move it in place, so that an interrupted
+    # save never leaves a partial sidecar behind.
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, len(index)))
+            f.write(index)
+            for values in [compiled_map.components,
+                           *compiled_map.fields.values(),
+                           compiled_map.chokepoints]:
+                f.write(values.tobytes())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def load(path, width=None, height=None):
+    """
+    Read a compiled map from a file, or return None if it is unusable.
+
+    It is unusable if it is not a compiled map, is truncated, or is not of
+    a width x height map (when they are given).
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+
+    try:
+        magic, version, index_size = _HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            return None
+        index = json.loads(data[_HEADER.size:_HEADER.size + index_size])
+        size = index['width'] * index['height']
+        tiles = [tuple(tile) for tile in index['fields']]
+        n_chokepoints = index['chokepoints']
+    except (struct.error, ValueError, KeyError, TypeError):
+        return None
+    if ((width is not None and index['width'] != width)
+            or (height is not None and index['height'] != height)):
+        return None
+
+    offset = _HEADER.size + index_size
+    itemsize = array('i').itemsize
+    if len(data) != offset + (size * (1 + len(tiles))
+                              + n_chokepoints) * itemsize:
+        return None
+
+    def read(count):
+        nonlocal offset
+        values = array('i')
+        values.frombytes(data[offset:offset + count * values.itemsize])
+        offset += count * values.itemsize
+        return values
+
+    components = read(size)
+    fields = {tile: read(size) for tile in tiles}
+    return CompiledMap(index['width'],
+                       index['height'],
+                       components,
+                       fields,
+                       read(n_chokepoints))
+
+
+# Compiled maps, by map content hash.
+_compiled = {}
+
+
+def compiled(current_map, save_sidecar=True):
+    """
+    Return the compiled map of a map, compiling it only if needed.
+
+    Maps loaded from a file have their compiled map saved next to it (if
+    save_sidecar is true), and loaded from there in later sessions.
+    """
+    digest = current_map.digest()
+    if (result := _compiled.get(digest)) is not None:
+        return result
+
+    path = _sidecar_path(current_map)
+    if path is None or (result := load(path, current_map.width,
+                                       current_map.height)) is None:
+        result = compile_map(current_map)
+        if path is not None and save_sidecar:
+            try:
+                save(result, path)
+            except OSError:
+                # Not being able to save only costs compiling it again.
+                pass
+
+    _compiled[digest] = result
+    return result
+
+
+if __name__ == '__main__':
+    # Compile a map file: python mapcompile.py <map>
+    import maps
+
+    current_map = maps.load_map(sys.argv[1])
+    result = compiled(current_map)
+    flag = tuple(map(int, current_map.flag_position))
+    print(f'{len(set(result.components) - {-1})} components, '
+          f'{len(result.chokepoints)} chokepoints')
+    for x, y, _ in current_map.start_positions:
+        distance = result.distance((x, y), flag)
+        print(f'start ({x}, {y}): '
+              + ('cannot reach the flag' if distance is None
+                 else f'{distance} tiles from the flag'))
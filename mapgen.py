@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Generates random maps of any size, for playing and for benchmarks.
+
+Boxes are scattered with a given density, start positions are spread around
+the edge of the map facing the flag in the middle, and rockboxes are cleared
+wherever needed so that every start position can reach the flag. Layouts are
+point symmetric by default, so that no start position is favoured (start
+positions are only symmetric when their number is even).
+"""
+import argparse
+import math
+import random
+import maps
+import mapcompile
+
+# Map sizes (width and height) benchmarks sweep over.
+SWEEP_SIZES = [10, 20, 50, 100, 200, 500, 1000]
+
+# Weights of the box types (rockbox, woodbox, metalbox) placed on the map.
+BOX_WEIGHTS = {1: 5, 2: 3, 3: 2}
+
+
+def _ring(width, height):
+    """Return the tiles along the edge of the map, clockwise from (0, 0)."""
+    return ([(x, 0) for x in range(width)]
+            + [(width - 1, y) for y in range(1, height)]
+            + [(x, height - 1) for x in range(width - 2, -1, -1)]
+            + [(0, y) for y in range(height - 2, 0, -1)])
+
+
+def _start_tiles(width, height, players):
+    """Return players tiles evenly spread around the edge of the map."""
+    ring = _ring(width, height)
+    return [ring[round(i * len(ring) / players) % len(ring)]
+            for i in range(players)]
+
+
+def _carve(grid, width, height, start, goal, symmetric):
+    """Remove the rockboxes on an L-shaped path from start to goal."""
+    (x0, y0), (x1, y1) = start, goal
+    path = ([(x, y0) for x in range(min(x0, x1), max(x0, x1) + 1)]
+            + [(x1, y) for y in range(min(y0, y1), max(y0, y1) + 1)])
+    for x, y in path:
+        for tile in ([(x, y), (width - 1 - x, height - 1 - y)] if symmetric
+                     else [(x, y)]):
+            index = tile[1] * width + tile[0]
+            if grid[index] == 1:
+                grid[index] = 0
+
+
+def generate(width,
+             height,
+             density=0.3,
+             players=4,
+             seed=None,
+             symmetric=True):
+    """
+    Return a random map.
+
+    Input:
+    width, height: Size of the map.
+    density: Share of the tiles with a box on them (0 to 1).
+    players: Number of start positions.
+    seed: Seed of the random generator, the same seed gives the same map.
+    symmetric: Whether the map looks the same rotated half a turn.
+    """
+    if width < 3 or height < 3:
+        raise ValueError('Maps must be at least 3x3 tiles.')
+    rng = random.Random(seed)
+
+    # A tile gets the first box type whose threshold its roll is below.
+    thresholds = []
+    total = sum(BOX_WEIGHTS.values())
+    for box_type, weight in BOX_WEIGHTS.items():
+        previous = thresholds[-1][0] if thresholds else 0
+        thresholds.append((previous + density * weight / total, box_type))
+
+    grid = bytearray(width * height)
+    size = width * height
+    for index in range(size):
+        mirror = size - 1 - index
+        if symmetric and mirror < index:
+            grid[index] = grid[mirror]
+        elif (roll := rng.random()) < density:
+            grid[index] = next(box_type for threshold, box_type in thresholds
+                               if roll < threshold)
+
+    starts = _start_tiles(width, height, players)
+    flag = (width // 2, height // 2)
+
+    # Keep the start positions and the flag, and the tiles around them, free.
+    for x, y in starts + [flag]:
+        for dx, dy in [(0, 0), (-1, 0), (1, 0), (0, -1), (0, 1)]:
+            if 0 <= x + dx < width and 0 <= y + dy < height:
+                grid[(y + dy) * width + x + dx] = 0
+                if symmetric:
+                    grid[size - 1 - (y + dy) * width - x - dx] = 0
+
+    # Make sure every start position can reach the flag.
+    labels = mapcompile.components(maps.Map(width, height, grid, [], flag))
+    for x, y in starts:
+        if labels[y * width + x] != labels[flag[1] * width + flag[0]]:
+            _carve(grid, width, height, (x, y), flag, symmetric)
+            labels = mapcompile.components(maps.Map(width, height, grid,
+                                                    [], flag))
+
+    # Face the tanks towards the flag.
+    start_positions = [[x + 0.5, y + 0.5,
+                        round(math.degrees(math.atan2(x - flag[0],
+                                                      flag[1] - y)))]
+                       for x, y in starts]
+
+    return maps.Map(width,
+                    height,
+                    bytes(grid),
+                    start_positions,
+                    [flag[0] + 0.5, flag[1] + 0.5])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a random map.')
+    parser.add_argument('width', type=int)
+    parser.add_argument('height', type=int)
+    parser.add_argument('output', help='file to write the map to')
+    parser.add_argument('--density', type=float, default=0.3)
+    parser.add_argument('--players', type=int, default=4)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--asymmetric', action='store_true')
+    parser.add_argument('--binary', action='store_true',
+                        help='write the binary format instead of text')
+    args = parser.parse_args()
+
+    generated = generate(args.width,
+                         args.height,
+                         args.density,
+                         args.players,
+                         args.seed,
+                         not args.asymmetric)
+    if args.binary:
+        maps.map_to_bin(generated, args.output)
+    else:
+        maps.map_to_txt(generated, args.output)
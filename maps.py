@@ -1,7 +1,20 @@
 """Defines all the maps and their functions."""
 from resources import Constants
 import pygame
+import hashlib
 import json
+import mmap
+import struct
+import sys
+
+
+# Binary map format: a header with the magic bytes, format version, size,
+# number of start positions and flag position, then every start position
+# as (x, y, orientation), then one byte per tile, row by row.
+MAGIC = b'CTFMAP\0\0'
+VERSION = 1
+_HEADER = struct.Struct('<8sHIIHdd')
+_START = struct.Struct('<ddd')
 
 
 class Map:
@@ -13,16 +26,43 @@ class Map:
 
         Input:
         width, height: Size of the map.
-        boxes: An array with the boxes type.
+        boxes: An array with the boxes type, either as a list of rows or as
+        a buffer with one byte per tile, row by row (which is not copied).
         start_positions: Start positions of tanks.
         flag_position: Flag position.
         """
         self.width = width
         self.height = height
-        self.boxes = boxes
+        if isinstance(boxes, list):
+            boxes = bytes(box for row in boxes for box in row)
+        self.grid = memoryview(boxes).cast('B')
         self.start_positions = start_positions
         self.flag_position = flag_position
 
+        # Path of the file the map was loaded from, if any.
+        self.file_path = None
+
+        self._digest = None
+
+    def __reduce__(self):
+        """Pickle the map with a copy of its grid (which is a memoryview)."""
+        return (Map, (self.width, self.height, bytes(self.grid),
+                      self.start_positions, self.flag_position))
+
+    def digest(self):
+        """Return a hash of the map's content, identifying the map."""
+        if self._digest is None:
+            # Positions as floats, as they are stored in binary maps
+            content = json.dumps([self.width,
+                                  self.height,
+                                  [list(map(float, start_position))
+                                   for start_position in self.start_positions],
+                                  list(map(float, self.flag_position))])
+            digest = hashlib.sha1(content.encode())
+            digest.update(self.grid)
+            self._digest = digest.hexdigest()
+        return self._digest
+
     def rect(self):
         """Return a Rect with the maps size in pixels."""
         return pygame.Rect(0, 0,
@@ -30,8 +70,20 @@ class Map:
                            Constants.TILE_SIZE*self.height)
 
     def boxAt(self, x, y):
-        """Return the type of the box at coordinates (x, y)."""
-        return self.boxes[y][x]
+        """
+        Return the type of the box at coordinates (x, y).
+
+        Raise IndexError if (x, y) is outside the map.
+        """
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            raise IndexError(f'({x}, {y}) is outside the {self.width}x'
+                             f'{self.height} map')
+        return self.grid[y * self.width + x]
+
+    def rows(self):
+        """Return the box types as a list of rows."""
+        return [list(self.grid[y * self.width:(y + 1) * self.width])
+                for y in range(self.height)]
 
 
 def map_from_txt(file_path):
@@ -39,11 +91,91 @@ def map_from_txt(file_path):
     with open(file_path) as f:
         map_args = json.load(f)
         width, height, boxes, start_positions, flag_position = map_args
-        return Map(width,
-                   height,
-                   boxes,
-                   start_positions,
-                   flag_position)
+        current_map = Map(width,
+                          height,
+                          boxes,
+                          start_positions,
+                          flag_position)
+        current_map.file_path = file_path
+        return current_map
+
+
+def map_to_txt(current_map, file_path):
+    """Write a map to a file, in the format read by map_from_txt."""
+    with open(file_path, 'w') as f:
+        json.dump([current_map.width,
+                   current_map.height,
+                   current_map.rows(),
+                   current_map.start_positions,
+                   current_map.flag_position], f)
+
+
+def map_from_bin(file_path):
+    """
+    Take a file path to a binary map file, and return instance of Map.
+
+    The file is memory-mapped and the map's grid is a view on it, so even
+    very large maps load without parsing or copying the tiles.
+    """
+    with open(file_path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    current_map = map_from_bytes(mapped, f'"{file_path}"')
+    current_map.file_path = file_path
+    return current_map
+
+
+def map_from_bytes(data, name='data'):
+    """Return the map in a buffer in the binary format, viewing its grid."""
+    if len(data) < _HEADER.size:
+        raise ValueError(f'{name} is too short to be a map file')
+    (magic, version, width, height,
+     n_starts, flag_x, flag_y) = _HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f'{name} is not a version {VERSION} map file')
+
+    # The grid would silently be cut short by slicing, so check it is whole
+    offset = _HEADER.size + n_starts * _START.size
+    if len(data) < offset + width * height:
+        raise ValueError(f'{name} is truncated: {len(data)} bytes, '
+                         f'{offset + width * height} expected')
+
+    start_positions = [list(_START.unpack_from(data, _HEADER.size
+                                               + i * _START.size))
+                       for i in range(n_starts)]
+    grid = memoryview(data)[offset:offset + width * height]
+
+    return Map(width,
+               height,
+               grid,
+               start_positions,
+               [flag_x, flag_y])
+
+
+def map_to_bytes(current_map):
+    """Return a map in the binary format (see map_from_bin)."""
+    return b''.join([_HEADER.pack(MAGIC,
+                                  VERSION,
+                                  current_map.width,
+                                  current_map.height,
+                                  len(current_map.start_positions),
+                                  *current_map.flag_position),
+                     *(_START.pack(*start_position)
+                       for start_position in current_map.start_positions),
+                     current_map.grid])
+
+
+def map_to_bin(current_map, file_path):
+    """Write a map to a file, in the format read by map_from_bin."""
+    with open(file_path, 'wb') as f:
+        f.write(map_to_bytes(current_map))
+
+
+def load_map(file_path):
+    """Return the map in a file, in either the binary or the text format."""
+    with open(file_path, 'rb') as f:
+        is_binary = f.read(len(MAGIC)) == MAGIC
+    return map_from_bin(file_path) if is_binary else map_from_txt(file_path)
 
 
 map0 = Map(9, 9,
@@ -100,3 +232,13 @@ map2 = Map(10, 5,
             [9.5, 2.5, 90]],
 
            [5, 2.5])
+
+
+if __name__ == '__main__':
+    # Convert a map file: python maps.py <input> <output>, where an output
+    # ending in .txt or .json is written as text and anything else as binary.
+    in_path, out_path = sys.argv[1:3]
+    if out_path.endswith(('.txt', '.json')):
+        map_to_txt(load_map(in_path), out_path)
+    else:
+        map_to_bin(load_map(in_path), out_path)
@@ -0,0 +1,135 @@
+"""
+Tracks memory from round to round, for the --memory-report option.
+
+Every round the game replaces its pymunk space and all its objects, so over a
+long match memory should stay flat. The tracker takes a tracemalloc snapshot
+at the start of every round, counts the pymunk bodies and shapes and the
+pygame surfaces still alive, and reports how they changed: the allocation
+sites which grew the most since the second round, and whether memory or any of
+the counts keeps growing.
+"""
+import gc
+import tracemalloc
+import pygame
+import pymunk
+
+
+def live_objects():
+    """Return how many pymunk bodies and shapes and pygame surfaces live."""
+    objects = gc.get_objects()
+    bodies = sum(isinstance(obj, pymunk.Body) for obj in objects)
+    shapes = sum(isinstance(obj, pymunk.Shape) for obj in objects)
+
+    # Surfaces are not tracked by the garbage collector, so they are found
+    # through the objects which are.
+    surfaces = {id(obj)
+                for obj in gc.get_referents(*objects)
+                if isinstance(obj, pygame.Surface)}
+    return bodies, shapes, len(surfaces)
+
+
+def slope(values):
+    """Return the least squares slope of values, per step."""
+    count = len(values)
+    if count < 2:
+        return 0.0
+    mean_x = (count - 1) / 2
+    mean_y = sum(values) / count
+    return (sum((x - mean_x) * (y - mean_y) for x, y in enumerate(values))
+            / sum((x - mean_x) ** 2 for x in range(count)))
+
+
+class MemoryTracker:
+    """Snapshots memory at round boundaries, and reports on its growth."""
+
+    # How many allocation sites the report lists.
+    TOP = 10
+
+    # Rounds left out of the trend, while caches fill up.
+    WARMUP_ROUNDS = 1
+
+    # Growth per round over which memory, or a count, is said to grow.
+    GROWTH_BYTES = 64 * 1024
+    GROWTH_OBJECTS = 0.5
+
+    COLUMNS = ['game', 'round', 'traced KiB', 'peak KiB',
+               'bodies', 'shapes', 'surfaces']
+
+    # Columns identifying a snapshot, rather than measured.
+    KEYS = 2
+
+    def __init__(self, frames=1):
+        """
+        Initialize a tracker, and start tracing allocations.
+
+        Input:
+        frames: Frames of the stack kept for every allocation.
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self.rows = []
+        self._first = None
+        self._last = None
+
+    def snapshot(self, game, round_number):
+        """Take a snapshot at the start of a round of a game."""
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+        self.rows.append([game, round_number, current // 1024, peak // 1024,
+                          *live_objects()])
+
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>')
+        ])
+        if len(self.rows) == self.WARMUP_ROUNDS + 1:
+            self._first = snapshot
+        self._last = snapshot
+
+    def growing(self):
+        """Return the columns which grow from round to round, with slopes."""
+        rows = self.rows[self.WARMUP_ROUNDS:]
+        if len(rows) < 3:
+            return {}
+        growing = {}
+        for i, name in enumerate(self.COLUMNS[self.KEYS:], self.KEYS):
+            if name == 'peak KiB':
+                continue
+            rate = slope([row[i] for row in rows])
+            threshold = (self.GROWTH_BYTES / 1024 if name == 'traced KiB'
+                         else self.GROWTH_OBJECTS)
+            if rate > threshold:
+                growing[name] = rate
+        return growing
+
+    def report(self):
+        """Return a table of the rounds, the top growths and the verdict."""
+        lines = [''.join(f'{name:>12}' for name in self.COLUMNS)]
+        lines += [''.join(f'{value:>12}' for value in row)
+                  for row in self.rows]
+
+        if self._first is not None and self._last is not self._first:
+            game, round_number = self.rows[self.WARMUP_ROUNDS][:self.KEYS]
+            lines.append(f'\nTop {self.TOP} allocation sites, growth since '
+                         f'round {round_number} of game {game}:')
+            for stat in self._last.compare_to(self._first,
+                                              'lineno')[:self.TOP]:
+                lines.append(f'{stat.size_diff / 1024:+10.1f} KiB '
+                             f'{stat.count_diff:+8} blocks  '
+                             f'{stat.traceback[0]}')
+
+        if len(self.rows) < self.WARMUP_ROUNDS + 3:
+            lines.append('\nToo few rounds to tell whether memory grows.')
+        elif growing := self.growing():
+            lines.append('\nGROWING, per round: ' + ', '.join(
+                f'{name} {rate:+.1f}' for name, rate in growing.items()))
+        else:
+            lines.append('\nMemory is flat.')
+        return '\n'.join(lines)
+
+    def write(self, path):
+        """Write the report to a file."""
+        with open(path, 'w') as f:
+            f.write(self.report() + '\n')
@@ -1,46 +1,80 @@
 """Handles all the menus in the game."""
+import functools
+import os
+import sys
 import pygame
 import gamestate
 import maps
 import resources
 
+# Longest time (in ms) to sleep waiting for events in the menus.
+WAIT_TIMEOUT = 250
+
+# Background colour of the menus.
+MENU_COLOUR = (94, 129, 162)
+
+# Whether the current menu is on the display and up to date.
+_shown = False
+
+
+def wait_events(clock, framerate):
+    """
+    Return the events for a menu frame, sleeping until there are any.
+
+    In the browser (pygbag) the loop may not block, so the menus are
+    ticked at the framerate there instead.
+    """
+    if sys.platform == 'emscripten':
+        clock.tick(framerate)
+        return pygame.event.get()
+
+    event = pygame.event.wait(WAIT_TIMEOUT)
+    if event.type == pygame.NOEVENT:
+        return []
+    return [event] + pygame.event.get()
 
-def home_screen(screen, clock, gs, events, Menu):
-    """Display all home screen buttons. Return a draw enumerator."""
-    # Get current display size
-    s_width, s_height = screen.get_size()
 
-    text_font = pygame.font.Font('data/Pixeltype.ttf', 50)
+def invalidate():
+    """Make the next menu frame redraw the whole menu."""
+    global _shown
+    _shown = False
 
-    msg_ctf_surf = text_font.render('Capture the Flag',
-                                    False,
-                                    'Black').convert_alpha()
 
-    msg_ctf_rect = msg_ctf_surf.get_rect(midtop=(s_width / 2,
-                                                 s_height / 16))
+def _redraw(screen, layout, events):
+    """Draw a menu layout, if anything may have changed since last time."""
+    global _shown
+    if _shown and not events:
+        return
+
+    screen.fill(MENU_COLOUR)  # Set blue blackground
+    screen.blits(list(layout.values()))
+    pygame.display.flip()
+    _shown = True
 
-    msg_play_surf = text_font.render('Play',
-                                     False,
-                                     'Black').convert_alpha()
 
-    msg_play_rect = msg_play_surf.get_rect(midtop=(s_width / 2,
-                                                   s_height / 8))
+def _button(text, **position):
+    """Return a (surface, rect) pair for a label positioned as given."""
+    surf = resources.render_text(text, 50, 'Black')
+    return surf, surf.get_rect(**position)
 
-    msg_settings_surf = text_font.render('Settings',
-                                         False,
-                                         'Black').convert_alpha()
 
-    msg_settings_rect = msg_settings_surf.get_rect(midtop=(s_width / 2,
-                                                           s_height * 3 / 16
-                                                           ))
+@functools.lru_cache(maxsize=1)
+def _home_layout(size):
+    """Return the home screen labels, by name, laid out for a screen size."""
+    s_width, s_height = size
+    return {
+        'ctf': _button('Capture the Flag',
+                       midtop=(s_width / 2, s_height / 16)),
+        'play': _button('Play', midtop=(s_width / 2, s_height / 8)),
+        'settings': _button('Settings',
+                            midtop=(s_width / 2, s_height * 3 / 16)),
+        'exit': _button('Exit', midtop=(s_width / 2, s_height / 4)),
+    }
 
-    msg_exit_surf = text_font.render('Exit',
-                                     False,
-                                     'Black').convert_alpha()
 
-    msg_exit_rect = msg_exit_surf.get_rect(midtop=(s_width / 2,
-                                                   s_height / 4
-                                                   ))
+def home_screen(screen, gs, events, Menu):
+    """Display all home screen buttons. Return a draw enumerator."""
+    layout = _home_layout(screen.get_size())
 
     for event in events:
 
@@ -60,156 +94,98 @@ def home_screen(screen, clock, gs, events, Menu):
         # Handle all button clicks on main menu
         elif event.type == pygame.MOUSEBUTTONDOWN:
             # Start game loop
-            if msg_play_rect.collidepoint(event.pos):
+            if layout['play'][1].collidepoint(event.pos):
                 return Menu.GAME
-            elif msg_settings_rect.collidepoint(event.pos):
+            elif layout['settings'][1].collidepoint(event.pos):
                 return Menu.SETTINGS
-            elif msg_exit_rect.collidepoint(event.pos):
+            elif layout['exit'][1].collidepoint(event.pos):
                 return Menu.OFF
 
-    screen.fill((94, 129, 162))  # Set blue blackground
-    screen.blit(msg_ctf_surf, msg_ctf_rect)
-    screen.blit(msg_play_surf, msg_play_rect)
-    screen.blit(msg_settings_surf, msg_settings_rect)
-    screen.blit(msg_exit_surf, msg_exit_rect)
-    pygame.display.update()
-    clock.tick(gs.settings.FRAMERATE)
+    _redraw(screen, layout, events)
     return Menu.HOMESCREEN
 
 
-def settings(screen, clock, gs, events, Menu, sprites):
-    """
-    Display the settings screen.
+# Maps that can be chosen in the settings menu.
+MAPS = {'map1': maps.map0, 'map2': maps.map1, 'map3': maps.map2}
 
-    Return a draw and gamestate tuple.
-    """
-    # Get current display size
-    s_width, s_height = screen.get_size()
+# The map loaded from a file (with --map), if any, also a choice.
+_loaded_map = None
 
-    text_font = pygame.font.Font('data/Pixeltype.ttf', 50)
 
-    msg_settings_surf = text_font.render('Settings',
-                                         False,
-                                         'Black').convert_alpha()
-    msg_settings_rect = msg_settings_surf.get_rect(midtop=(s_width / 2,
-                                                   s_height / 10))
+def _map_choices(loaded_map):
+    """Return the maps to choose from, by name."""
+    if loaded_map is None:
+        return MAPS
+    return {**MAPS, 'map4': loaded_map}
 
-    msg_players_surf = text_font.render('Players',
-                                        False,
-                                        'Black').convert_alpha()
-    msg_players_rect = msg_players_surf.get_rect(midtop=(s_width / 2,
-                                                 s_height*4 / 20))
 
-    msg_p1_surf = text_font.render('1', False, 'Black').convert_alpha()
-    msg_p1_rect = msg_p1_surf.get_rect(midtop=(s_width * 15/32, s_height / 4))
+@functools.lru_cache(maxsize=1)
+def _settings_layout(size, save_previews, loaded_map):
+    """Return the settings labels, by name, laid out for a screen size."""
+    s_width, s_height = size
+    layout = {
+        'settings': _button('Settings',
+                            midtop=(s_width / 2, s_height / 10)),
+        'players': _button('Players',
+                           midtop=(s_width / 2, s_height * 4 / 20)),
+        'p1': _button('1', midtop=(s_width * 15/32, s_height / 4)),
+        'p2': _button('2', midtop=(s_width * 17/32, s_height / 4)),
+        'maps': _button('Maps', midtop=(s_width / 2, s_height * 5/16)),
+        'back': _button('Back', midtop=(s_width / 2, s_height * 5/8)),
+    }
 
-    msg_p2_surf = text_font.render('2', False, 'Black').convert_alpha()
-    msg_p2_rect = msg_p2_surf.get_rect(midtop=(s_width * 17/32, s_height / 4))
+    # Map labels, with (cached) scaled map previews below them. Previews
+    # of a map loaded from a file are saved next to it.
+    screen = pygame.display.get_surface()
+    choices = _map_choices(loaded_map)
+    for i, (name, mapn) in enumerate(choices.items()):
+        x = s_width * (i + 1) / (len(choices) + 1)
+        layout[name] = _button(f'Map {i + 1}', midtop=(x, s_height * 3 / 8))
+        preview = map_preview(mapn, (100, 100), screen, save_previews)
+        layout[name + '_preview'] = (preview, preview.get_rect(
+            midtop=(x, s_height * 7 / 16)))
 
-    msg_maps_surf = text_font.render('Maps', False, 'Black').convert_alpha()
-    msg_maps_rect = msg_maps_surf.get_rect(midtop=(s_width / 2,
-                                                   s_height * 5/16))
+    return layout
 
-    msg_map1_surf = text_font.render('Map 1', False, 'Black').convert_alpha()
-    msg_map1_rect = msg_map1_surf.get_rect(midtop=(s_width * 1 / 4,
-                                                   s_height * 3 / 8))
 
-    msg_map2_surf = text_font.render('Map 2', False, 'Black').convert_alpha()
-    msg_map2_rect = msg_map2_surf.get_rect(midtop=(s_width / 2,
-                                           s_height * 3 / 8))
-
-    msg_map3_surf = text_font.render('Map 3', False, 'Black').convert_alpha()
-    msg_map3_rect = msg_map3_surf.get_rect(midtop=(s_width * 3 / 4,
-                                                   s_height * 3 / 8))
+def settings(screen, gs, events, Menu):
+    """
+    Display the settings screen.
 
-    # Back message
-    msg_back_surf = text_font.render('Back', False, 'Black').convert_alpha()
-    msg_back_rect = msg_back_surf.get_rect(midtop=(s_width / 2,
-                                                   s_height * 5/8))
+    Return a draw and gamestate tuple.
+    """
+    global _loaded_map
+    if gs.current_map.file_path is not None:
+        _loaded_map = gs.current_map
+    choices = _map_choices(_loaded_map)
+    layout = _settings_layout(screen.get_size(), gs.settings.SAVE_PREVIEWS,
+                              _loaded_map)
 
     for event in events:
-        new_draw = Menu.SETTINGS
-        new_gs = gs
-
         if event.type == pygame.QUIT:
-            new_draw = Menu.OFF
+            return (Menu.OFF, gs)
 
         elif event.type == pygame.KEYDOWN:
             if event.key == pygame.K_ESCAPE:
-                new_draw = Menu.HOMESCREEN
+                return (Menu.HOMESCREEN, gs)
 
         elif event.type == pygame.MOUSEBUTTONDOWN:
             # Players
-            if msg_p1_rect.collidepoint(event.pos):
-                new_gs.settings.NPLAYERS = 1
-            elif msg_p2_rect.collidepoint(event.pos):
-                new_gs.settings.NPLAYERS = 2
-
-            # Maps
-            elif msg_map1_rect.collidepoint(event.pos):
-                new_gs.current_map = maps.map0
-            elif msg_map2_rect.collidepoint(event.pos):
-                new_gs.current_map = maps.map1
-            elif msg_map3_rect.collidepoint(event.pos):
-                new_gs.current_map = maps.map2
+            if layout['p1'][1].collidepoint(event.pos):
+                gs.settings.NPLAYERS = 1
+            elif layout['p2'][1].collidepoint(event.pos):
+                gs.settings.NPLAYERS = 2
 
             # Back
-            elif msg_back_rect.collidepoint(event.pos):
-                new_draw = Menu.HOMESCREEN
-
-            return (new_draw, new_gs)
-
-    screen.fill((94, 129, 162))
-
-    map_lst = [maps.map0, maps.map1, maps.map2]
-
-    # List of blank map previews.
-    preview_lst = [draw_over(pygame.Surface(mapn.rect().size),
-                             pygame.transform.scale(gs.sprites.background,
-                                                    (mapn.rect().size[0] * 10,
-                                                     mapn.rect().size[1] * 10)))
-                   for mapn in map_lst]
-
-    # List of simple gamestates for map previews.
-    gs_lst = [gamestate.GameState(screen,
-                                  current_map=mapn,
-                                  settings=resources.Constants())
-              .generate_fresh(preview)
-              for mapn, preview in zip(map_lst, preview_lst)]
-
-    # List of filled and scaled map previews.
-    scaled_lst = [pygame.transform.scale(
-        list(map(lambda obj: obj.update_screen(preview, gs), gs.objects))[-1],
-        (100, 100))
-                  for preview, gs in zip(preview_lst, gs_lst)]
-
-    # List of map rects
-    map_rects = [scaled_lst[0].get_rect(midtop=(s_width * 1 / 4,
-                                               s_height * 7 / 16)), 
-                 scaled_lst[1].get_rect(midtop=(s_width / 2,
-                                               s_height * 7 / 16)),
-                 scaled_lst[2].get_rect(midtop=(s_width * 3 / 4,
-                                               s_height * 7 / 16))]
-
-    # Blit every scaled map preview onto screen
-    [screen.blit(scaled, rect) for scaled, rect in zip(scaled_lst, map_rects)]
-
-    screen.blit(msg_settings_surf, msg_settings_rect)
-    screen.blit(msg_players_surf, msg_players_rect)
-    screen.blit(msg_p1_surf, msg_p1_rect)
-    screen.blit(msg_p2_surf, msg_p2_rect)
-
-    screen.blit(msg_maps_surf, msg_maps_rect)
-    screen.blit(msg_map1_surf, msg_map1_rect)
-    screen.blit(msg_map2_surf, msg_map2_rect)
-    screen.blit(msg_map3_surf, msg_map3_rect)
-
-    screen.blit(msg_maps_surf, msg_maps_rect)
-    screen.blit(msg_back_surf, msg_back_rect)
+            elif layout['back'][1].collidepoint(event.pos):
+                return (Menu.HOMESCREEN, gs)
 
-    pygame.display.flip()
-    clock.tick(gs.settings.FRAMERATE)
+            # Maps
+            for name, mapn in choices.items():
+                if layout[name][1].collidepoint(event.pos):
+                    gs.current_map = mapn
 
+    _redraw(screen, layout, events)
     return (Menu.SETTINGS, gs)
 
 
@@ -218,8 +194,89 @@ def set_display(size: tuple):
     return pygame.display.set_mode(size, pygame.RESIZABLE)
 
 
-def draw_over(surface1, surface2):
-    """Return a new surface with surface1 drawn over surface2."""
-    temp = surface1.copy()
-    temp.blit(surface2, (0, 0))
-    return temp
+# Map previews, keyed by map content hash and preview size.
+_previews = {}
+
+# Largest map (in tiles) whose preview is a whole game drawn at full size,
+# then scaled. Larger maps are drawn a pixel per tile instead, as a full
+# size surface of them takes hundreds of megabytes.
+FULL_PREVIEW_TILES = 32 * 32
+
+# Colour of every box type (grass, rockbox, woodbox, metalbox) in previews
+# drawn a pixel per tile, and of the flag.
+TILE_COLOURS = [(70, 99, 37), (86, 86, 86), (140, 95, 50), (160, 157, 157)]
+FLAG_COLOUR = (240, 210, 40)
+
+
+def map_preview(current_map, size, screen, save=True):
+    """
+    Return a preview of a map, scaled to size.
+
+    The preview is only drawn the first time it is asked for. Previews of
+    maps loaded from a file are also saved next to it (if save is true), and
+    loaded from there in later sessions.
+    """
+    key = (current_map.digest(), tuple(size))
+    if (preview := _previews.get(key)) is not None:
+        return preview
+
+    path = None
+    if current_map.file_path is not None:
+        path = '{}.{}.{}x{}.png'.format(current_map.file_path,
+                                        current_map.digest()[:12],
+                                        *size)
+
+    if path is not None and os.path.exists(path):
+        preview = pygame.image.load(path).convert()
+    elif current_map.width * current_map.height <= FULL_PREVIEW_TILES:
+        preview = pygame.transform.scale(_draw_map(current_map, screen),
+                                         size)
+    else:
+        preview = _draw_tiles(current_map, size)
+        if path is not None and save:
+            try:
+                pygame.image.save(preview, path)
+            except (pygame.error, OSError):
+                # Not being able to save only costs a redraw next session.
+                pass
+
+    _previews[key] = preview
+    return preview
+
+
+def _draw_map(current_map, screen):
+    """Return a surface with a fresh game on current_map drawn on it."""
+    gs = gamestate.GameState(screen,
+                             current_map=current_map,
+                             settings=resources.Constants())
+    surface = pygame.Surface(current_map.rect().size)
+    gs.generate_fresh()
+    surface.blit(resources.background(surface, gs.sprites.grass, gs), (0, 0))
+    [obj.update_screen(surface, gs) for obj in gs.objects]
+    return surface
+
+
+def _draw_tiles(current_map, size):
+    """
+    Return a preview of a map of size, drawn a pixel per tile then scaled.
+
+    The start positions and the flag are marked on it with dots, as the
+    bases and the flag would be too small to see.
+    """
+    # A palette surface, whose pixels are the box types
+    tiles = pygame.image.frombytes(current_map.grid.tobytes(),
+                                   (current_map.width, current_map.height),
+                                   'P')
+    tiles.set_palette(TILE_COLOURS + [(0, 0, 0)] * (256 - len(TILE_COLOURS)))
+    preview = pygame.transform.scale(tiles.convert(), size)
+
+    scale_x = size[0] / current_map.width
+    scale_y = size[1] / current_map.height
+    radius = max(2, round(min(scale_x, scale_y) / 2))
+    for team, (x, y, _) in enumerate(current_map.start_positions):
+        pygame.draw.circle(preview, resources.team_colour(team),
+                           (x * scale_x, y * scale_y), radius)
+    x, y = current_map.flag_position
+    pygame.draw.circle(preview, FLAG_COLOUR, (x * scale_x, y * scale_y),
+                       radius)
+    return preview
@@ -0,0 +1,98 @@
+"""
+Counts what happens in the game, and exports the counts for --metrics.
+
+The game hooks in through the attributes of counters, which it increments
+(counters.ticks += 1): there is no logging, nor any call, on the hot paths.
+A MetricsWriter then writes the counts now and then, both as a line of JSON
+appended to <path>.jsonl (for trends over a long match) and as a Prometheus
+text file, <path>.prom, replaced every time (for node_exporter's textfile
+collector).
+"""
+import json
+import os
+import time
+
+
+class Counters:
+    """The counts of the game, kept since it started."""
+
+    # Name, Prometheus type and help of every metric.
+    METRICS = [('ticks', 'counter', 'Game ticks run.'),
+               ('frames', 'counter', 'Frames drawn.'),
+               ('bullets_fired', 'counter', 'Bullets fired by any tank.'),
+               ('objects_alive', 'gauge', 'Game objects in the game now.'),
+               ('explosions', 'counter', 'Objects destroyed in explosions.'),
+               ('replans', 'counter', 'Paths searched by the AI.'),
+               ('raycasts', 'counter', 'Segment queries made by the AI.'),
+               ('collision_events', 'counter', 'Bullet collisions handled.')]
+
+    __slots__ = [name for name, _, _ in METRICS]
+
+    def __init__(self):
+        """Initialize counts of zero."""
+        self.reset()
+
+    def reset(self):
+        """Set every count back to zero."""
+        for name in self.__slots__:
+            setattr(self, name, 0)
+
+    def as_dict(self):
+        """Return every count, by name."""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+# The counts of the game, shared by every module.
+counters = Counters()
+
+
+class MetricsWriter:
+    """Writes the counters every interval seconds, and on exit."""
+
+    PREFIX = 'ctf_'
+
+    def __init__(self, path, interval=10.0, counters=counters):
+        """
+        Initialize a writer.
+
+        Input:
+        path: Path of the files to write, without .jsonl or .prom.
+        interval: Seconds between writes.
+        counters: The counters to write.
+        """
+        self.path = path
+        self.interval = interval
+        self.counters = counters
+        self._start = time.monotonic()
+        self._next = self._start + interval
+
+    def maybe_write(self, gs):
+        """Write the counters, if interval seconds passed since last time."""
+        if time.monotonic() >= self._next:
+            self.write(gs)
+
+    def write(self, gs):
+        """Write the counters now, with the objects alive in gs."""
+        now = time.monotonic()
+        self._next = now + self.interval
+        if gs.objects is not None:
+            self.counters.objects_alive = len(gs.objects)
+        values = self.counters.as_dict()
+
+        with open(f'{self.path}.jsonl', 'a') as f:
+            f.write(json.dumps({'time': time.time(),
+                                'uptime': round(now - self._start, 3),
+                                **values}) + '\n')
+
+        lines = []
+        for name, kind, help_text in Counters.METRICS:
+            metric = self.PREFIX + name + ('_total' if kind == 'counter'
+                                           else '')
+            lines += [f'# HELP {metric} {help_text}',
+                      f'# TYPE {metric} {kind}',
+                      f'{metric} {values[name]}']
+        # Write to a temporary file first, so that the file is never read
+        # half written.
+        with open(f'{self.path}.prom.tmp', 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(f'{self.path}.prom.tmp', f'{self.path}.prom')
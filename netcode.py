@@ -0,0 +1,124 @@
+"""
+The messages of the network game (server.py and client.py), as datagrams.
+
+Clients say hello, are welcomed with their team and the map, then send their
+input every tick, with the last snapshot they got. The server sends every
+client a snapshot of the game every tick, as a delta against that last
+snapshot: only the entities which changed since (added or moved, turned or
+damaged), and the ids of the ones which are gone. A client which never got
+a snapshot, or lost too many, gets them all.
+
+Entities are quantized: positions to 1/POSITION_SCALE tiles (so maps can be
+up to 1024 tiles wide), angles to 1/256 turn.
+"""
+import math
+import struct
+
+# Message types, the first byte of every datagram.
+HELLO, WELCOME, INPUT, SNAPSHOT, BYE = range(1, 6)
+
+# Entity kinds.
+WOODBOX, METALBOX, BULLET, FLAG, EXPLOSION, TANK = range(6)
+
+POSITION_SCALE = 64
+
+# Welcome: type, team, tick rate, then the map (see maps.map_to_bytes).
+_WELCOME = struct.Struct('<BBH')
+# Input: type, last snapshot got, acceleration, rotation, shoot.
+_INPUT = struct.Struct('<BIbbB')
+# Snapshot: type, tick, tick of the baseline (0 for none), changed
+# entities, removed entities.
+_SNAPSHOT = struct.Struct('<BIIHH')
+# Entity: id, kind, two details (woodbox hp, tank team and hp, explosion
+# frame...), x, y, angle.
+ENTITY = struct.Struct('<HBBBHHB')
+_ID = struct.Struct('<H')
+
+
+def entity(entity_id, kind, a, b, x, y, angle):
+    """Return an entity record, quantized, as sent in snapshots."""
+    return (entity_id, kind, a, b,
+            min(max(round(x * POSITION_SCALE), 0), 0xFFFF),
+            min(max(round(y * POSITION_SCALE), 0), 0xFFFF),
+            round(angle / (2 * math.pi) * 256) % 256)
+
+
+def position(record):
+    """Return the position of an entity record, in tiles."""
+    return record[4] / POSITION_SCALE, record[5] / POSITION_SCALE
+
+
+def angle(record):
+    """Return the angle of an entity record, in radians."""
+    return record[6] * 2 * math.pi / 256
+
+
+def hello():
+    """Return the message asking to join a game."""
+    return bytes([HELLO])
+
+
+def bye():
+    """Return the message leaving a game."""
+    return bytes([BYE])
+
+
+def welcome(team, tick_rate, map_bytes):
+    """Return the message welcoming a client in the game."""
+    return _WELCOME.pack(WELCOME, team, tick_rate) + map_bytes
+
+
+def read_welcome(data):
+    """Return the team, tick rate and map bytes of a welcome message."""
+    _, team, tick_rate = _WELCOME.unpack_from(data)
+    return team, tick_rate, data[_WELCOME.size:]
+
+
+def input_message(ack, acceleration, rotation, shoot):
+    """Return an input message (see gameobjects.Tank.control)."""
+    return _INPUT.pack(INPUT, ack, acceleration, rotation, shoot)
+
+
+def read_input(data):
+    """Return the ack, acceleration, rotation and shoot of an input."""
+    return _INPUT.unpack_from(data)[1:]
+
+
+def snapshot(tick, entities, base_tick=0, base=None):
+    """
+    Return the snapshot of a tick, as a delta against a baseline.
+
+    Input:
+    tick: Tick of the snapshot.
+    entities: Entity records of the tick, by id.
+    base_tick, base: Tick and entities of the baseline, none for all.
+    """
+    if base is None:
+        base_tick, base = 0, {}
+    changed = [record for entity_id, record in entities.items()
+               if base.get(entity_id) != record]
+    removed = [entity_id for entity_id in base if entity_id not in entities]
+    return b''.join([_SNAPSHOT.pack(SNAPSHOT, tick, base_tick,
+                                    len(changed), len(removed)),
+                     *(ENTITY.pack(*record) for record in changed),
+                     *(_ID.pack(entity_id) for entity_id in removed)])
+
+
+def snapshot_ticks(data):
+    """Return the tick of a snapshot message, and of its baseline."""
+    return _SNAPSHOT.unpack_from(data)[1:3]
+
+
+def read_snapshot(data, base=None):
+    """Return the entities of a snapshot, by id, given its baseline's."""
+    _, _, _, n_changed, n_removed = _SNAPSHOT.unpack_from(data)
+    entities = dict(base or {})
+    offset = _SNAPSHOT.size
+    for record in ENTITY.iter_unpack(
+            data[offset:offset + n_changed * ENTITY.size]):
+        entities[record[0]] = record
+    offset += n_changed * ENTITY.size
+    for (entity_id,) in _ID.iter_unpack(
+            data[offset:offset + n_removed * _ID.size]):
+        entities.pop(entity_id, None)
+    return entities
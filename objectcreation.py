@@ -1,38 +1,63 @@
 """Creates instances of game objects, populates list of game objects."""
+import sys
 import gameobjects
 import pymunk
 
 
 def create_everything(gs):
     """Create initial gameobjectslist, and pymunk space."""
-    space = pymunk.Space()
+    # pymunk only has a threaded solver on Linux (and macOS).
+    threaded = gs.settings.PHYSICS_THREADS > 1 and sys.platform == 'linux'
+    space = pymunk.Space(threaded=threaded)
+    if threaded:
+        space.threads = gs.settings.PHYSICS_THREADS
     space.gravity = (0.0,  0.0)  # Can be used for wind later...
     space.damping = 0.1  # Adds friction to the ground for all objects.
 
     _create_border(space, gs.current_map)
+    _create_rockboxes(space, gs.current_map)
 
+    # Rockboxes are part of the static layer (see _create_rockboxes), and
+    # drawn with the background.
     boxes = [gameobjects.get_box_with_type(x, y, box_type, space, gs)
              for x in range(gs.current_map.width)
              for y in range(gs.current_map.height)
-             if (box_type := gs.current_map.boxAt(x, y)) != 0]
+             if (box_type := gs.current_map.boxAt(x, y)) not in {0, 1}]
 
-    bases = [gameobjects.GameVisibleObject(x, y, sprite)
-             for ((x, y, _), sprite)
-             in zip(gs.current_map.start_positions, gs.sprites.bases)]
+    bases = [gameobjects.GameVisibleObject(x, y, gs.sprites.base(team))
+             for team, (x, y, _)
+             in enumerate(gs.current_map.start_positions)]
 
-    tanks = [gameobjects.Tank(x, y, orientation, sprite, space, gs)
-             for ((x, y, orientation), sprite)
-             in zip(gs.current_map.start_positions, gs.sprites.tanks)]
+    tanks = [gameobjects.Tank(x, y, orientation, gs.sprites.tank(team),
+                              space, gs)
+             for team, (x, y, orientation)
+             in enumerate(gs.current_map.start_positions)]
 
     flag = gameobjects.Flag(gs)
 
+    if gs.settings.SPATIAL_HASH:
+        use_spatial_hash(space, gs)
+
     return (flag, tanks, boxes + bases + tanks + [flag], space)
 
 
+def use_spatial_hash(space, gs):
+    """
+    Switch a space to a spatial hash, sized for the game's objects.
+
+    Cells are as wide as the largest sprite (a tile, in physics coordinates
+    TILE_SIZE pixels wide), and there are ten times more cells than shapes.
+    """
+    sprites = [gs.sprites.woodbox, gs.sprites.metalbox, *gs.sprites.tanks]
+    dim = max(max(sprite.get_size()) for sprite in sprites)
+    space.use_spatial_hash(dim / gs.settings.TILE_SIZE,
+                           10 * len(space.shapes))
+
+
 def _create_border(space, current_map):
     """Create borders and add them to space."""
     static_body = space.static_body
-    space.add(*[
+    segments = [
         pymunk.Segment(static_body, (0, 0), (0, current_map.height), 0),
         pymunk.Segment(static_body, (0, 0), (current_map.width, 0), 0),
         pymunk.Segment(static_body,
@@ -41,4 +66,56 @@ def _create_border(space, current_map):
         pymunk.Segment(static_body,
                        (current_map.width, current_map.height),
                        (0, current_map.height), 0)
-    ])
+    ]
+    for segment in segments:
+        segment.filter = gameobjects.FILTERS[gameobjects.STATIC]
+    space.add(*segments)
+
+
+def rockbox_rects(current_map):
+    """
+    Return the rockboxes of a map merged into as few rectangles as possible.
+
+    Rectangles are (x, y, width, height) in tiles, found by greedy meshing:
+    every rectangle is grown as wide as possible, then as tall as possible.
+    """
+    width, height = current_map.width, current_map.height
+    taken = bytearray(width * height)
+    rects = []
+    for y in range(height):
+        for x in range(width):
+            if taken[y * width + x] or current_map.boxAt(x, y) != 1:
+                continue
+
+            w = 1
+            while (x + w < width and not taken[y * width + x + w]
+                   and current_map.boxAt(x + w, y) == 1):
+                w += 1
+
+            h = 1
+            while y + h < height and all(
+                    not taken[(y + h) * width + i]
+                    and current_map.boxAt(i, y + h) == 1
+                    for i in range(x, x + w)):
+                h += 1
+
+            for j in range(y, y + h):
+                taken[j * width + x:j * width + x + w] = b'\x01' * w
+            rects.append((x, y, w, h))
+    return rects
+
+
+def _create_rockboxes(space, current_map):
+    """Add the rockboxes, merged into rectangles, to the static body."""
+    static_body = space.static_body
+    shapes = [pymunk.Poly(static_body, [(x, y),
+                                        (x, y + h),
+                                        (x + w, y + h),
+                                        (x + w, y)])
+              for x, y, w, h in rockbox_rects(current_map)]
+    # Same collision type as a rockbox Box (bullets are removed on impact).
+    for shape in shapes:
+        shape.collision_type = 0
+        shape.filter = gameobjects.FILTERS[gameobjects.STATIC]
+    if shapes:
+        space.add(*shapes)
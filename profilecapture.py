@@ -0,0 +1,125 @@
+"""
+Profiles a window of game ticks, for the --profile option of the game.
+
+The window is either a range of rounds (rounds:2-4, the default, leaves out
+the menus, startup and the first round) or a range of ticks (ticks:600-1200,
+to catch a hot phase such as a bullet storm). Over the window, cProfile
+records every call, and a sampler thread records the stack of the game every
+few milliseconds. The first is written as a .pstats file (for pstats or
+snakeviz), the second as collapsed stacks (for flamegraph.pl or speedscope).
+"""
+import cProfile
+import collections
+import os
+import sys
+import threading
+
+DEFAULT_WINDOW = 'rounds:2-4'
+DEFAULT_INTERVAL = 0.005
+
+
+def parse_window(window):
+    """Return the unit, first and last of a window like rounds:2-4."""
+    try:
+        unit, span = window.split(':')
+        first, last = (int(value) for value in span.split('-'))
+        if unit not in {'rounds', 'ticks'} or not 0 < first <= last:
+            raise ValueError
+    except ValueError:
+        raise ValueError('The profile window must look like rounds:2-4 or '
+                         f'ticks:600-1200, not {window!r}') from None
+    return unit, first, last
+
+
+class Sampler(threading.Thread):
+    """Counts the stacks a thread is seen in, every interval seconds."""
+
+    def __init__(self, thread_id, interval):
+        """Initialize a sampler of the thread with identifier thread_id."""
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        """Sample stacks until stopped."""
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f'{code.co_name} '
+                             f'({os.path.basename(code.co_filename)}'
+                             f':{code.co_firstlineno})')
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+    def stop(self):
+        """Stop sampling, and wait for the thread to end."""
+        self._stopped.set()
+        self.join()
+
+    def write(self, path):
+        """Write the stacks as collapsed stacks, one per line with a count."""
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+
+
+class ProfileCapture:
+    """Profiles the ticks of the game in a window, then writes the results."""
+
+    def __init__(self,
+                 path,
+                 window=DEFAULT_WINDOW,
+                 interval=DEFAULT_INTERVAL):
+        """
+        Initialize a capture.
+
+        Input:
+        path: Path of the files to write, without .pstats or .collapsed.
+        window: Rounds or ticks to profile (see parse_window).
+        interval: Seconds between samples, 0 to only run cProfile.
+        """
+        self.path = path
+        self.unit, self.first, self.last = parse_window(window)
+        # Threads are not available in the browser.
+        self.interval = 0 if sys.platform == 'emscripten' else interval
+        self.done = False
+        self._profile = None
+        self._sampler = None
+
+    def tick(self, tick, round_number):
+        """Start or stop profiling, as a tick of a round starts."""
+        position = tick if self.unit == 'ticks' else round_number
+        if self._profile is None:
+            if not self.done and self.first <= position <= self.last:
+                self.start()
+        elif position > self.last:
+            self.stop()
+
+    def start(self):
+        """Start profiling."""
+        if self.interval:
+            self._sampler = Sampler(threading.get_ident(), self.interval)
+            self._sampler.start()
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+
+    def stop(self):
+        """Stop profiling if it started, and write the results."""
+        if self._profile is None:
+            return
+        self._profile.disable()
+        self._profile.dump_stats(f'{self.path}.pstats')
+        self._profile = None
+        if self._sampler is not None:
+            self._sampler.stop()
+            self._sampler.write(f'{self.path}.collapsed')
+            self._sampler = None
+        self.done = True
+        print(f'Wrote the profile of {self.unit} {self.first} to {self.last} '
+              f'to {self.path}.pstats'
+              + (f' and {self.path}.collapsed' if self.interval else ''))
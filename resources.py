@@ -1,74 +1,351 @@
 """Defines all common resources and constants used in the game."""
 from dataclasses import dataclass
+import collections
+import functools
 import pygame
+import math
 import os
+import sys
+import time
+import weakref
+
+
+def _load_images(file_names):
+    """Load a list of images from the data directory."""
+    return [_load_image(file_name) for file_name in file_names]
+
+
+# How to load every sprite category, by name.
+CATEGORIES = {
+    'explosion_list': lambda: [
+        pygame.transform.scale(image, (80, 80))
+        for image in _load_images(['regularExplosion00.png',
+                                   'regularExplosion01.png',
+                                   'regularExplosion02.png',
+                                   'regularExplosion03.png',
+                                   'regularExplosion04.png',
+                                   'regularExplosion05.png',
+                                   'regularExplosion06.png',
+                                   'regularExplosion07.png'])],
+    'grass': lambda: _load_image('grass.png'),
+    'rockbox': lambda: _load_image('rockbox.png'),
+    'metalbox': lambda: _load_image('metalbox.png'),
+    'woodbox': lambda: _load_image('woodbox.png'),
+    'woodbox_broken': lambda: _load_image('woodbox_broken.png'),
+    'flag': lambda: _load_image('flag.png'),
+    'bullet': lambda: pygame.transform.scale(
+        pygame.transform.rotate(_load_image('bullet.png'), -90),
+        (10, 10)
+    ),
+    'tanks': lambda: _load_images(['tank_orange.png',
+                                   'tank_blue.png',
+                                   'tank_white.png',
+                                   'tank_yellow.png',
+                                   'tank_red.png',
+                                   'tank_gray.png']),
+    'tank_overlays': lambda: _load_images(['hp1_overlay.png',
+                                           'hp2_overlay.png']),
+    'bases': lambda: _load_images(['base_orange.png',
+                                   'base_blue.png',
+                                   'base_white.png',
+                                   'base_yellow.png',
+                                   'base_red.png',
+                                   'base_gray.png']),
+}
+
+
+class AssetManager:
+    """
+    Loads every sprite category once per process, the first time it is used.
+
+    The loaded surfaces are shared by everything using them, so they must
+    be copied before being drawn on.
+    """
+
+    def __init__(self):
+        """Initialize an empty asset manager."""
+        self._loaded = {}
+
+        # Seconds spent loading each category.
+        self.load_times = {}
+
+        # Categories already decoded (see assetcache), used instead of the
+        # image files when present.
+        self.cache = {}
+
+    def get(self, category):
+        """Return a sprite category, loading it if it is not loaded yet."""
+        if category not in self._loaded:
+            start = time.perf_counter()
+            if category in self.cache:
+                self._loaded[category] = self.cache[category]
+            else:
+                self._loaded[category] = CATEGORIES[category]()
+            self.load_times[category] = time.perf_counter() - start
+        return self._loaded[category]
+
+    def load_all(self):
+        """Load every sprite category now, instead of on first use."""
+        [self.get(category) for category in CATEGORIES]
+
+    def report(self) -> str:
+        """Return a table of how long each loaded category took to load."""
+        lines = [f'{category:<16}{seconds * 1000:8.2f} ms'
+                 for category, seconds in self.load_times.items()]
+        lines.append(f'{"total":<16}'
+                     f'{sum(self.load_times.values()) * 1000:8.2f} ms')
+        return '\n'.join(lines)
+
+
+# The asset manager shared by the whole process.
+assets = AssetManager()
+
+
+# Index of the white sprite of the tanks and bases categories, which is
+# tinted for the teams past the ones with a sprite of their own.
+WHITE = 2
+
+
+def team_colour(team):
+    """Return a colour for a team, far from the colours of the teams before."""
+    colour = pygame.Color(0)
+    # Hues spread by the golden ratio never repeat, and stay far apart.
+    colour.hsva = ((team * 0.618033988749895) % 1 * 360, 80, 100, 100)
+    return tuple(colour)
+
+
+@functools.lru_cache(maxsize=None)
+def tinted(category, colour):
+    """Return the white sprite of a category tinted with a colour."""
+    sprite = assets.get(category)[WHITE].copy()
+    sprite.fill(colour, special_flags=pygame.BLEND_RGB_MULT)
+    return sprite
+
+
+def _category(name):
+    """Return a property giving a shared sprite category from assets."""
+    return property(lambda self: assets.get(name))
 
 
 class Sprites:
-    """Stores all sprites."""
+    """Gives access to all sprites, and their versions scaled to display."""
+
+    explosion_list = _category('explosion_list')
+    grass = _category('grass')
+    rockbox = _category('rockbox')
+    metalbox = _category('metalbox')
+    woodbox = _category('woodbox')
+    woodbox_broken = _category('woodbox_broken')
+    flag = _category('flag')
+    bullet = _category('bullet')
+    tanks = _category('tanks')
+    tank_overlays = _category('tank_overlays')
+    bases = _category('bases')
 
     def __init__(self, screen, gs):
-        """Load all sprites."""
-        self.explosion_list = [pygame.transform.scale(_load_image(image),
-                                                      (80, 80))
-                               for image in ['regularExplosion00.png',
-                                             'regularExplosion01.png',
-                                             'regularExplosion02.png',
-                                             'regularExplosion03.png',
-                                             'regularExplosion04.png',
-                                             'regularExplosion05.png',
-                                             'regularExplosion06.png',
-                                             'regularExplosion07.png']]
-
-        self.grass = _load_image('grass.png')
-        self.rockbox = _load_image('rockbox.png')
-        self.metalbox = _load_image('metalbox.png')
-        self.woodbox = _load_image('woodbox.png')
-        self.woodbox_broken = _load_image('woodbox_broken.png')
-        self.flag = _load_image('flag.png')
-        self.bullet = pygame.transform.scale(
-            pygame.transform.rotate(_load_image('bullet.png'), -90),
-            (10, 10)
-        )
-
-        self.tanks = [_load_image(image)
-                      for image in ['tank_orange.png',
-                                    'tank_blue.png',
-                                    'tank_white.png',
-                                    'tank_yellow.png',
-                                    'tank_red.png',
-                                    'tank_gray.png']]
-
-        self.tank_overlays = [_load_image(image)
-                              for image in ['hp1_overlay.png',
-                                            'hp2_overlay.png']]
-
-        self.bases = [_load_image(image)
-                      for image in ['base_orange.png',
-                                    'base_blue.png',
-                                    'base_white.png',
-                                    'base_yellow.png',
-                                    'base_red.png',
-                                    'base_gray.png']]
-
-        self.background = background(screen, self.grass, gs)
-
-
-def background(screen, grass, gs):
-    """Return a sprite of the background."""
-    background = pygame.Surface(screen.get_size())
+        """Initialize sprites for a screen and gamestate."""
+        self._screen = screen
+        self._gs = gs
+
+        # Ratio between display pixels and TILE_SIZE, and the sprites
+        # scaled to it (dropped together with their source sprite).
+        self.ratio = 1
+        self._scaled = weakref.WeakKeyDictionary()
+
+    def tank(self, team):
+        """Return the tank sprite of a team, tinted if it has none."""
+        if team < len(self.tanks):
+            return self.tanks[team]
+        return tinted('tanks', team_colour(team))
+
+    def base(self, team):
+        """Return the base sprite of a team, tinted if it has none."""
+        if team < len(self.bases):
+            return self.bases[team]
+        return tinted('bases', team_colour(team))
+
+    @functools.cached_property
+    def background(self):
+        """Background sprite the size of the screen, at native scale."""
+        return background(self._screen, self.grass, self._gs)
+
+    def rescale(self, ratio):
+        """Set the display ratio, forgetting sprites scaled to the old one."""
+        if ratio != self.ratio:
+            self.ratio = ratio
+            self._scaled.clear()
+
+    def scaled(self, sprite):
+        """Return sprite scaled to the display ratio, scaling it only once."""
+        if self.ratio == 1:
+            return sprite
+
+        if (scaled := self._scaled.get(sprite)) is None:
+            width, height = sprite.get_size()
+            scaled = pygame.transform.scale(sprite,
+                                            (math.ceil(width * self.ratio),
+                                             math.ceil(height * self.ratio)))
+            self._scaled[sprite] = scaled
+        return scaled
+
+
+def background(screen, grass, gs, ratio=1, tiles=None):
+    """
+    Return a sprite of the background, scaled to the display ratio.
+
+    The background is the static layer of the map: grass, and the rockboxes
+    on top of it, which never move. Only the tiles in the pygame.Rect tiles
+    are drawn if it is given (in a sprite just big enough for them), the
+    whole map otherwise (in a sprite the size of screen).
+    """
+    tile_size = gs.settings.TILE_SIZE * ratio
+    if tiles is None:
+        tiles = pygame.Rect(0, 0, gs.current_map.width, gs.current_map.height)
+        background = pygame.Surface(screen.get_size())
+    else:
+        background = pygame.Surface((math.ceil(tiles.width * tile_size),
+                                     math.ceil(tiles.height * tile_size)))
+    rockbox = assets.get('rockbox')
+    if ratio != 1:
+        grass = pygame.transform.scale(grass, (math.ceil(tile_size),
+                                               math.ceil(tile_size)))
+        rockbox = pygame.transform.scale(rockbox, (math.ceil(tile_size),
+                                                   math.ceil(tile_size)))
     # Copy the grass tile all over the level area.
     # The call to the function "blit" will copy the image
     # contained in "images.grass" into the "background"
     # image at the coordinates given as the second argument.
     [background.blit(grass,
-                     (x*gs.settings.TILE_SIZE,
-                      y*gs.settings.TILE_SIZE))
-     for x in range(gs.current_map.width)
-     for y in range(gs.current_map.height)]
+                     (int((x - tiles.x)*tile_size),
+                      int((y - tiles.y)*tile_size)))
+     for x in range(tiles.left, tiles.right)
+     for y in range(tiles.top, tiles.bottom)]
+
+    # Draw the rockboxes over the grass.
+    [background.blit(rockbox,
+                     (int((x - tiles.x)*tile_size),
+                      int((y - tiles.y)*tile_size)))
+     for x in range(tiles.left, tiles.right)
+     for y in range(tiles.top, tiles.bottom)
+     if gs.current_map.boxAt(x, y) == 1]
     return background
 
 
+# Sound effects, by name, as (file, file used in the browser by pygbag).
+_SOUNDS = {
+    'collision': ('collisionobject.flac', 'collisionobject-pygbag.ogg'),
+    'explosion': ('explosion.wav', 'explosion-pygbag.ogg'),
+    'pickupflag': ('pickupflag.wav', 'pickupflag-pygbag.ogg'),
+    'shoot': ('tankhit.wav', 'tankhit-pygbag.ogg'),
+}
+
+
+class SoundBank:
+    """
+    Plays sound effects, decoding each one only once per process.
+
+    Effects are decoded by load_all, before the game starts, rather than
+    when first played (which is often in a collision handler, during a
+    physics step). They are played on a fixed pool of reserved mixer
+    channels, stopping the effect which started first when all are busy,
+    and the same effect is played at most MAX_PER_FRAME times per frame, so
+    a volley of hits does not saturate the mixer.
+    """
+
+    CHANNELS = 8
+    MAX_PER_FRAME = 2
+
+    def __init__(self):
+        """Initialize an empty sound bank."""
+        self._sounds = {}
+        self._channels = None
+        # Effects played so far, and how many had when each channel's
+        # effect started.
+        self._plays = 0
+        self._started = []
+        self._played = collections.Counter()
+
+    def load_all(self):
+        """Decode every sound effect, if the mixer is initialized."""
+        if pygame.mixer.get_init():
+            [self._sound(name) for name in _SOUNDS]
+
+    def _sound(self, name):
+        """Return the sound for an effect, decoding it if needed."""
+        if name not in self._sounds:
+            file_name, pygbag_file_name = _SOUNDS[name]
+            if sys.platform == 'emscripten':
+                file_name = pygbag_file_name
+            main_dir = os.path.split(os.path.abspath(__file__))[0]
+            self._sounds[name] = pygame.mixer.Sound(
+                os.path.join(main_dir, 'data', file_name))
+        return self._sounds[name]
+
+    def _channel(self):
+        """Return the index of a free channel, or of the oldest effect's."""
+        if self._channels is None:
+            count = pygame.mixer.set_reserved(self.CHANNELS)
+            self._channels = [pygame.mixer.Channel(i) for i in range(count)]
+            self._started = [0] * count
+
+        for i, channel in enumerate(self._channels):
+            if not channel.get_busy():
+                return i
+
+        return min(range(len(self._channels)), key=self._started.__getitem__)
+
+    def play(self, name):
+        """Play a sound effect, unless it was played enough this frame."""
+        if (not pygame.mixer.get_init()
+                or self._played[name] >= self.MAX_PER_FRAME):
+            return
+
+        self._played[name] += 1
+        self._plays += 1
+        i = self._channel()
+        self._started[i] = self._plays
+        self._channels[i].play(self._sound(name))
+
+    def new_frame(self):
+        """Start counting the sound effects played in a new frame."""
+        self._played.clear()
+
+
+# The sound bank shared by the whole process.
+sounds = SoundBank()
+
+
+@functools.lru_cache(maxsize=None)
+def font(size: int, file_name: str = 'Pixeltype.ttf') -> pygame.font.Font:
+    """Return a font from the data directory, loading each size only once."""
+    main_dir = os.path.split(os.path.abspath(__file__))[0]
+    return pygame.font.Font(os.path.join(main_dir, 'data', file_name), size)
+
+
+@functools.lru_cache(maxsize=256)
+def render_text(text: str,
+                size: int,
+                colour,
+                antialias: bool = False) -> pygame.surface.Surface:
+    """
+    Return text rendered with the game font.
+
+    Rendered surfaces are shared between callers (least recently used ones
+    are evicted), so they must not be drawn on.
+    """
+    return font(size).render(text, antialias, colour).convert_alpha()
+
+
+def init_headless():
+    """Return a screen for game states, without opening a window."""
+    if pygame.display.get_surface() is None:
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+        pygame.display.init()
+        pygame.display.set_mode((1, 1))
+    return pygame.display.get_surface()
+
+
 def _load_image(file_name: str) -> pygame.surface.Surface:
     """Load an image from the data directory."""
     main_dir = os.path.split(os.path.abspath(__file__))[0]
@@ -91,3 +368,13 @@ class Constants:
     NPLAYERS: int = 1
     SOUND: bool = True
     TILE_SIZE: int = 40
+    SAVE_PREVIEWS: bool = True
+    # Smallest size of a tile on the display, in pixels. Maps which do not
+    # fit the window at this size scroll with a camera instead.
+    MIN_TILE_PIXELS: int = 20
+    # Use pymunk's spatial hash instead of its bounding box tree.
+    SPATIAL_HASH: bool = False
+    # Threads solving physics (pymunk's threaded space, Linux only, at most
+    # 2), and physics steps per tick.
+    PHYSICS_THREADS: int = 1
+    PHYSICS_SUBSTEPS: int = 1
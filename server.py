@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Runs the game as an authoritative server, for clients over UDP.
+
+The server alone runs the game, at a fixed tick rate. Its first --players
+tanks are played by clients (client.py), which send their keys every tick,
+and the others by the AI. Every tick, every client gets a snapshot of the
+game as a delta against the last one it got (see netcode). Datagrams are
+sent whole, so this is meant for localhost and small maps (up to about
+6000 entities, and 250x250 tiles).
+
+Usage:
+python3 server.py [--map FILE] [--players 8] [--port 5555]
+                  [--tick-rate 60] [--stats SECONDS]
+"""
+import argparse
+import asyncio
+import math
+import sys
+import time
+import gameobjects
+import gamestate
+import maps
+import netcode
+import resources
+
+# Snapshots kept, for deltas against the last one a client got.
+HISTORY = 128
+
+
+class Client:
+    """A client playing a team, and what it last sent and got."""
+
+    def __init__(self, address, team):
+        """Initialize a client at an address, playing a team."""
+        self.address = address
+        self.team = team
+        self.ack = 0
+        self.acceleration = self.rotation = self.shoot = 0
+        self.bytes_sent = 0
+        self.snapshots_sent = 0
+
+
+class GameServer(asyncio.DatagramProtocol):
+    """Runs a game at a fixed tick rate, and streams it to its clients."""
+
+    def __init__(self, gs):
+        """
+        Initialize a server of a fresh game state.
+
+        Input:
+        gs: The game state, whose first NPLAYERS tanks are the clients', and
+        which is played at FRAMERATE ticks a second (see new_gamestate).
+        """
+        self.gs = gs
+        self.tick_rate = gs.settings.FRAMERATE
+        self.tick = 0
+        self.rounds = 1
+        self.clients = {}
+        self.transport = None
+        self._map_bytes = maps.map_to_bytes(gs.current_map)
+
+        # Entities of the last ticks, by tick, and the id of every object,
+        # ids of objects gone being used again.
+        self.history = {}
+        self._ids = {}
+        self._free_ids = []
+        self._next_id = 1
+        # The last state of every object, and its entity record.
+        self._records = {}
+
+        # Seconds every tick took, since the stats were last reported.
+        self.tick_times = []
+
+    def connection_made(self, transport):
+        """Keep the transport to send with."""
+        self.transport = transport
+
+    def datagram_received(self, data, address):
+        """Handle a message from a client."""
+        if not data:
+            return
+        client = self.clients.get(address)
+        if data[0] == netcode.HELLO:
+            if client is None:
+                taken = {client.team for client in self.clients.values()}
+                free = [team for team in range(self.gs.settings.NPLAYERS)
+                        if team not in taken]
+                if not free:
+                    return
+                client = self.clients[address] = Client(address, free[0])
+            # Welcome again clients which did not get it.
+            self.transport.sendto(netcode.welcome(client.team,
+                                                  self.tick_rate,
+                                                  self._map_bytes),
+                                  address)
+
+        elif data[0] == netcode.INPUT and client is not None:
+            (ack, client.acceleration,
+             client.rotation, client.shoot) = netcode.read_input(data)
+            client.ack = max(client.ack, ack)
+
+        elif data[0] == netcode.BYE and client is not None:
+            del self.clients[address]
+            client.acceleration = client.rotation = client.shoot = 0
+            self._control(client)
+
+    def _control(self, client):
+        """Control the tank of a client with its last input."""
+        tank = self.gs.tanks[client.team]
+        if bullet := tank.control(client.acceleration, client.rotation,
+                                  client.shoot, self.gs):
+            self.gs.objects.append(bullet)
+
+    def _id(self, obj):
+        """Return the id of an object, giving it one if it has none."""
+        if (object_id := self._ids.get(obj)) is None:
+            if self._free_ids:
+                object_id = self._free_ids.pop()
+            else:
+                object_id = self._next_id
+                self._next_id += 1
+            self._ids[obj] = object_id
+        return object_id
+
+    def entities(self):
+        """Return the entity records of the game now, by id."""
+        gs = self.gs
+        teams = {tank: team for team, tank in enumerate(gs.tanks)}
+        entities = {}
+        for obj in gs.objects:
+            if isinstance(obj, gameobjects.Box):
+                if obj.shape.collision_type == 2:
+                    kind, a, b = netcode.WOODBOX, obj.hp, 0
+                else:
+                    kind, a, b = netcode.METALBOX, 0, 0
+            elif isinstance(obj, gameobjects.Tank):
+                kind, a = netcode.TANK, teams[obj]
+                b = obj.hp | (4 if obj.inv_ticks >= 0 else 0)
+            elif isinstance(obj, gameobjects.Bullet):
+                kind, a, b = netcode.BULLET, 0, 0
+            elif isinstance(obj, gameobjects.Flag):
+                kind, a, b = netcode.FLAG, 0, 0
+            elif isinstance(obj, gameobjects.Explosion):
+                kind, b = netcode.EXPLOSION, 0
+                a = gs.sprites.explosion_list.index(obj.sprite)
+            else:
+                # Bases never move, clients draw them from the map.
+                continue
+
+            if isinstance(obj, gameobjects.GamePhysicsObject):
+                state = (a, b, obj.body.position, obj.body.angle)
+            else:
+                state = (a, b, obj.x, obj.y, obj.orientation)
+
+            # Most objects do not change, quantize only those which do.
+            last_state, record = self._records.get(obj, (None, None))
+            if state != last_state:
+                if isinstance(obj, gameobjects.GamePhysicsObject):
+                    (x, y), angle = obj.body.position, obj.body.angle
+                else:
+                    x, y = obj.x, obj.y
+                    angle = -math.radians(obj.orientation)
+                record = netcode.entity(self._id(obj), kind, a, b,
+                                        x, y, angle)
+                self._records[obj] = (state, record)
+            entities[record[0]] = record
+
+        # Free the ids of the objects gone.
+        if len(self._ids) > len(entities):
+            for obj in [obj for obj, object_id in self._ids.items()
+                        if object_id not in entities]:
+                self._free_ids.append(self._ids.pop(obj))
+                del self._records[obj]
+        return entities
+
+    def step(self):
+        """Play a tick of the game, and send its snapshot to every client."""
+        start = time.perf_counter()
+        gs = self.gs
+        for client in self.clients.values():
+            self._control(client)
+
+        gs.update_physics(0)
+        gs.tanks_try_grab_flag()
+        if winners := gs.tanks_won():
+            print(f'Team {gs.tanks.index(winners[0])} won round '
+                  f'{self.rounds}')
+            self.rounds += 1
+            gs.generate_fresh()
+            gs.add_collision_handlers()
+        gs.decide_all_bots()
+
+        self.tick += 1
+        entities = self.history[self.tick] = self.entities()
+        self.history.pop(self.tick - HISTORY, None)
+        for client in self.clients.values():
+            base = self.history.get(client.ack)
+            message = netcode.snapshot(self.tick, entities,
+                                       client.ack if base else 0, base)
+            self.transport.sendto(message, client.address)
+            client.bytes_sent += len(message)
+            client.snapshots_sent += 1
+        self.tick_times.append(time.perf_counter() - start)
+
+    async def run(self, duration=None):
+        """Play ticks at the tick rate, for duration seconds or forever."""
+        loop = asyncio.get_running_loop()
+        period = 1 / self.tick_rate
+        next_tick = loop.time()
+        end = None if duration is None else next_tick + duration
+        while end is None or next_tick < end:
+            self.step()
+            next_tick += period
+            delay = next_tick - loop.time()
+            # Fall behind rather than run ticks in bursts to catch up.
+            if delay < -period:
+                next_tick = loop.time()
+            await asyncio.sleep(max(delay, 0))
+
+    def report(self, seconds):
+        """Return the tick times and bandwidth over seconds, and reset."""
+        times = sorted(self.tick_times)
+        lines = [f'{len(self.clients)} clients, {len(times)} ticks']
+        if times:
+            lines.append('tick ms: p50 {:.3f}  p99 {:.3f}  max {:.3f}'.format(
+                times[len(times) // 2] * 1000,
+                times[min(len(times) - 1, len(times) * 99 // 100)] * 1000,
+                times[-1] * 1000))
+        for client in self.clients.values():
+            size = client.bytes_sent / max(client.snapshots_sent, 1)
+            lines.append(f'team {client.team}: '
+                         f'{client.bytes_sent / seconds / 1024:.1f} KiB/s, '
+                         f'{size:.0f} B/snapshot')
+            client.bytes_sent = client.snapshots_sent = 0
+        self.tick_times = []
+        return '\n'.join(lines)
+
+
+def new_gamestate(current_map, players, tick_rate=60):
+    """
+    Return a fresh game state for a server, with players client tanks.
+
+    The game runs at tick_rate ticks a second: its physics steps, bullet
+    cooldowns and other durations in ticks are all set from it.
+    """
+    if players > len(current_map.start_positions):
+        raise SystemExit(f'The map only has {len(current_map.start_positions)}'
+                         f' start positions, for {players} players')
+    settings = resources.Constants()
+    settings.DRAW = False
+    settings.SOUND = False
+    settings.USE_CLOCK = False
+    settings.NPLAYERS = players
+    settings.FRAMERATE = tick_rate
+    gs = gamestate.GameState(resources.init_headless(),
+                             current_map=current_map,
+                             settings=settings)
+    gs.generate_fresh()
+    gs.add_collision_handlers()
+    return gs
+
+
+async def serve(server, port, stats):
+    """Run a server on a port, reporting stats every stats seconds."""
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: server, local_addr=('127.0.0.1', port))
+    print(f'Serving on 127.0.0.1:{port}, at {server.tick_rate} ticks/s')
+    try:
+        if not stats:
+            await server.run()
+        while True:
+            await server.run(stats)
+            print(server.report(stats), flush=True)
+    finally:
+        transport.close()
+
+
+def main():
+    """Run a server with the options given."""
+    parser = argparse.ArgumentParser(description='Run a game server.')
+    parser.add_argument('--map', help='map file (default map1)')
+    parser.add_argument('--players', type=int, default=2,
+                        help='tanks played by clients, the others by the AI')
+    parser.add_argument('--port', type=int, default=5555)
+    parser.add_argument('--tick-rate', type=int, default=60,
+                        help='ticks a second, the game playing at the same '
+                        'speed at any rate')
+    parser.add_argument('--stats', type=float, default=0,
+                        help='report tick times and bandwidth every '
+                        'this many seconds')
+    args = parser.parse_args()
+
+    current_map = maps.load_map(args.map) if args.map else maps.map1
+    server = GameServer(new_gamestate(current_map, args.players,
+                                      args.tick_rate))
+    try:
+        asyncio.run(serve(server, args.port, args.stats))
+    except KeyboardInterrupt:
+        sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""A uniform grid of the game objects, to find the ones in an area quickly."""
+import math
+
+
+class GridIndex:
+    """
+    Game objects, bucketed by the cell of the grid their position is in.
+
+    Positions are in tiles (physics coordinates) and cells are CELL_SIZE
+    tiles wide, so moving an object only touches the index when it changes
+    cell. Queries return objects in the order they were first added, which
+    is the order they are drawn in.
+    """
+
+    CELL_SIZE = 4
+
+    def __init__(self, width, height, cell_size=CELL_SIZE):
+        """
+        Initialize an empty index.
+
+        Input:
+        width, height: Size of the map, in tiles.
+        cell_size: Width of a cell, in tiles.
+        """
+        self.cell_size = cell_size
+        self.columns = math.ceil(width / cell_size)
+        self.rows = math.ceil(height / cell_size)
+
+        # Objects in every cell, and the cell, order and position of every
+        # object.
+        self._cells = [set() for _ in range(self.columns * self.rows)]
+        self._entries = {}
+        self._added = 0
+
+    def __len__(self):
+        """Return the number of objects in the index."""
+        return len(self._entries)
+
+    def __contains__(self, obj):
+        """Return whether an object is in the index."""
+        return obj in self._entries
+
+    def _column(self, x):
+        """Return the column of the cell at x, objects off the map included."""
+        return min(max(int(x // self.cell_size), 0), self.columns - 1)
+
+    def _row(self, y):
+        """Return the row of the cell at y, objects off the map included."""
+        return min(max(int(y // self.cell_size), 0), self.rows - 1)
+
+    def move(self, obj, x, y):
+        """Set the position of an object, adding it if it is not indexed."""
+        cell = self._row(y) * self.columns + self._column(x)
+        if (entry := self._entries.get(obj)) is None:
+            self._entries[obj] = [cell, self._added, x, y]
+            self._added += 1
+            self._cells[cell].add(obj)
+            return
+
+        entry[2] = x
+        entry[3] = y
+        if entry[0] != cell:
+            self._cells[entry[0]].discard(obj)
+            self._cells[cell].add(obj)
+            entry[0] = cell
+
+    def remove(self, obj):
+        """Remove an object from the index, if it is there."""
+        if (entry := self._entries.pop(obj, None)) is not None:
+            self._cells[entry[0]].discard(obj)
+
+    def query_rect(self, x0, y0, x1, y1):
+        """Return the objects positioned in the rectangle (x0, y0, x1, y1)."""
+        entries = self._entries
+        found = []
+        for row in range(self._row(y0), self._row(y1) + 1):
+            start = row * self.columns
+            for cell in range(start + self._column(x0),
+                              start + self._column(x1) + 1):
+                for obj in self._cells[cell]:
+                    _, _, x, y = entries[obj]
+                    if x0 <= x <= x1 and y0 <= y <= y1:
+                        found.append(obj)
+        found.sort(key=lambda obj: entries[obj][1])
+        return found
+
+    def query_radius(self, x, y, radius):
+        """Return the objects positioned at most radius from (x, y)."""
+        entries = self._entries
+        return [obj for obj in self.query_rect(x - radius, y - radius,
+                                               x + radius, y + radius)
+                if (entries[obj][2] - x) ** 2 + (entries[obj][3] - y) ** 2
+                <= radius ** 2]
@@ -0,0 +1,66 @@
+"""Tests of the AI's decision to shoot woodboxes."""
+import math
+import pytest
+import gamestate
+import maps
+import resources
+
+
+def game(boxes):
+    """
+    Return a game on a map of rows, whose one tank is an AI.
+
+    The tank starts at the left of the middle row, driving right to the flag
+    at its end.
+    """
+    width = len(boxes[0])
+    current_map = maps.Map(width, len(boxes), boxes,
+                           [[1.5, 1.5, 270]], [width - 0.5, 1.5])
+    settings = resources.Constants()
+    settings.NPLAYERS = 0
+    settings.SOUND = False
+    gs = gamestate.GameState(resources.init_headless(),
+                             current_map=current_map,
+                             settings=settings)
+    gs.generate_fresh()
+    gs.add_collision_handlers()
+    gs.tanks[0].body.angle = math.radians(270)
+    gs.tanks[0].accelerate()
+    return gs
+
+
+def box_at(gs, x, y):
+    """Return the box on the tile (x, y) of a game."""
+    return next(obj for obj in gs.objects
+                if getattr(obj, 'hp', None) == 2
+                and obj.body.position == (x + 0.5, y + 0.5))
+
+
+@pytest.mark.parametrize('tile', [(3, 0), (0, 1), (4, 2)])
+def test_box_out_of_the_way(tile):
+    """A woodbox the tank drives past is not worth shooting."""
+    gs = game([[0, 0, 0, 2, 0, 0, 0, 0],
+               [2, 0, 0, 0, 0, 0, 0, 0],
+               [0, 0, 0, 0, 2, 0, 0, 0]])
+    assert gs.ais[0].worth_shooting(box_at(gs, *tile), gs) is False
+
+
+def test_box_in_the_way():
+    """A woodbox which cannot be pushed out of the way is worth shooting."""
+    gs = game([[1, 1, 1, 1, 1, 1, 1, 1],
+               [0, 0, 0, 2, 2, 0, 0, 0],
+               [1, 1, 1, 1, 1, 1, 1, 1]])
+    assert gs.ais[0].worth_shooting(box_at(gs, 3, 1), gs) is True
+
+
+def test_forward_model_once_a_tick():
+    """The AIs share one forward model a tick, remade after physics."""
+    gs = game([[0, 0, 0, 2, 0, 0, 0, 0],
+               [0, 0, 0, 0, 0, 0, 0, 0],
+               [0, 0, 0, 0, 0, 0, 0, 0]])
+    model = gs.forward_model()
+    assert gs.forward_model() is model
+    gs.ais[0].worth_shooting(box_at(gs, 3, 0), gs)
+    assert gs.forward_model() is model
+    gs.update_physics(0)
+    assert gs.forward_model() is not model
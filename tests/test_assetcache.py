@@ -0,0 +1,38 @@
+"""Tests of the pre-decoded sprite cache."""
+import pytest
+import assetcache
+import resources
+
+
+@pytest.fixture(scope='module')
+def cache_bytes(tmp_path_factory):
+    """Return the bytes of a freshly built cache."""
+    resources.init_headless()
+    path = tmp_path_factory.mktemp('cache') / 'assets.cache'
+    assetcache.build(path)
+    # The cache is moved in place once written, leaving no temporary file
+    assert [p.name for p in path.parent.iterdir()] == ['assets.cache']
+    return path.read_bytes()
+
+
+def test_round_trip(cache_bytes, tmp_path):
+    """A built cache loads every sprite category."""
+    path = tmp_path / 'assets.cache'
+    path.write_bytes(cache_bytes)
+    categories = assetcache.load(path)
+    assert set(categories) == set(resources.CATEGORIES)
+
+
+@pytest.mark.parametrize('length', [0, 10, 100, 'half', -1])
+def test_truncated(cache_bytes, tmp_path, length):
+    """A truncated cache is ignored, rather than failing to load."""
+    if length == 'half':
+        length = len(cache_bytes) // 2
+    path = tmp_path / 'assets.cache'
+    path.write_bytes(cache_bytes[:length])
+    assert assetcache.load(path) == {}
+
+
+def test_missing(tmp_path):
+    """A missing cache is ignored."""
+    assert assetcache.load(tmp_path / 'assets.cache') == {}
@@ -0,0 +1,114 @@
+"""Tests of the forward model's boxes, tanks and bullets."""
+from forwardmodel import (ANGLES, EMPTY, METALBOX, ROCKBOX, SCALE, WOODBOX,
+                          ForwardModel)
+
+# Headings, in ANGLES units, of tanks moving right and down.
+RIGHT, DOWN = ANGLES * 3 // 4, 0
+
+
+def add_tank(model, x, y, angle=RIGHT, speed=0):
+    """Add a tank at (x, y) tiles to a model, and return its team."""
+    for name, value in [('x', round(x * SCALE)), ('y', round(y * SCALE)),
+                        ('angle', angle), ('speed', speed), ('hp', 3),
+                        ('cooldown', 0), ('invincible', -1), ('move', 0),
+                        ('turn', 0), ('start_x', round(x * SCALE)),
+                        ('start_y', round(y * SCALE)), ('start_angle', angle),
+                        ('max_speed', SCALE // 10),
+                        ('acceleration', SCALE // 50),
+                        ('turn_speed', ANGLES // 100)]:
+        getattr(model, name).append(value)
+    return len(model.x) - 1
+
+
+def boxes(model, **tiles):
+    """Put boxes on a model, as name=(type, x, y) with woodboxes at 2 hp."""
+    for box, x, y in tiles.values():
+        model.grid[y * model.width + x] = box
+        model.box_hp[y * model.width + x] = 2 if box == WOODBOX else 0
+
+
+def test_push():
+    """A tank moving into a box pushes it a tile ahead, hp and all."""
+    model = ForwardModel(5, 3)
+    boxes(model, wood=(WOODBOX, 2, 0))
+    model.box_hp[2] = 1
+    team = add_tank(model, 1.55, 0.5)
+    model._bucket_tanks()
+    pushes = model._pushes(team, round(1.7 * SCALE), round(0.5 * SCALE),
+                           (1, 0))
+    assert pushes == {2: 3}
+    # Nothing moved until the push is made
+    assert model.grid[2] == WOODBOX
+    model._push(pushes)
+    assert (model.grid[2], model.grid[3]) == (EMPTY, WOODBOX)
+    assert model.box_hp[3] == 1
+
+
+def test_blocked_move_leaves_grid():
+    """A move blocked at one corner pushes no box at the others."""
+    model = ForwardModel(5, 3)
+    boxes(model, wood=(WOODBOX, 2, 0), rock=(ROCKBOX, 2, 1))
+    team = add_tank(model, 1.55, 0.7)
+    model._bucket_tanks()
+    grid = bytes(model.grid)
+    assert model._pushes(team, round(1.95 * SCALE), round(0.7 * SCALE),
+                         (1, 0)) is None
+    assert bytes(model.grid) == grid
+
+    # Driving into it for a while changes nothing either
+    model.move[team] = 1
+    for _ in range(30):
+        model.step()
+    assert bytes(model.grid) == grid
+    assert model.x[team] < 2 * SCALE - model.radius
+
+
+def test_push_into_box_blocked():
+    """A box cannot be pushed onto another box, or off the map."""
+    model = ForwardModel(4, 1)
+    boxes(model, metal=(METALBOX, 2, 0), wood=(WOODBOX, 3, 0))
+    team = add_tank(model, 1.55, 0.5)
+    model._bucket_tanks()
+    grid = bytes(model.grid)
+    assert model._pushes(team, round(1.7 * SCALE), round(0.5 * SCALE),
+                         (1, 0)) is None
+    model.grid[2] = EMPTY
+    grid = bytes(model.grid)
+    assert model._pushes(team, round(2.7 * SCALE), round(0.5 * SCALE),
+                         (1, 0)) is None
+    assert bytes(model.grid) == grid
+
+
+def test_tanks_block():
+    """A tank does not drive into another, nor push a box doing so."""
+    model = ForwardModel(6, 1)
+    boxes(model, wood=(WOODBOX, 4, 0))
+    team = add_tank(model, 1.5, 0.5)
+    other = add_tank(model, 2.4, 0.5)
+    model._bucket_tanks()
+    assert model._pushes(team, round(1.7 * SCALE), round(0.5 * SCALE),
+                         (1, 0)) is None
+    assert model._pushes(other, round(3.7 * SCALE), round(0.5 * SCALE),
+                         (1, 0)) == {4: 5}
+
+
+def test_bullets_break_woodbox():
+    """Two bullets break a woodbox, and the way is then free."""
+    model = ForwardModel(6, 1)
+    boxes(model, wood=(WOODBOX, 4, 0))
+    team = add_tank(model, 1.5, 0.5)
+    for _ in range(model.framerate * 2):
+        model.step({team: (0, 0, 1)})
+    assert model.grid[4] == EMPTY
+    assert not model.bullet_x
+
+
+def test_copy_is_independent():
+    """Stepping a copy leaves the model it was copied from alone."""
+    model = ForwardModel(5, 3)
+    boxes(model, wood=(WOODBOX, 3, 1))
+    team = add_tank(model, 1.5, 1.5)
+    rollout = model.rollout(team, [(1, 0, 1)] * 60)
+    assert rollout.x[team] > model.x[team]
+    assert (model.grid[8], model.box_hp[8]) == (WOODBOX, 2)
+    assert (model.ticks, len(model.bullet_x)) == (0, 0)
@@ -0,0 +1,111 @@
+"""Tests of the compiled maps' reachability, distances and chokepoints."""
+import os
+import maps
+import mapcompile
+
+# A 5x3 map: rockboxes (1) wall off the right column, and the middle row
+# is joined to the left column by a single tile at (1, 1).
+ROWS = [[0, 1, 0, 1, 0],
+        [0, 2, 0, 1, 0],
+        [0, 1, 3, 1, 0]]
+
+
+def walled_map():
+    """Return the map of ROWS, with a start at each side of the wall."""
+    return maps.Map(5, 3, ROWS, [[0.5, 0.5, 0], [4.5, 0.5, 0]], [2.5, 0.5])
+
+
+def test_reachable():
+    """Tiles are reachable only inside their component."""
+    compiled = mapcompile.compile_map(walled_map())
+    assert compiled.reachable((0, 0), (2, 2))
+    assert not compiled.reachable((0, 0), (4, 2))
+    assert compiled.reachable((4, 0), (4, 2))
+    # Rockboxes are in no component
+    assert compiled.component_at(1, 0) == -1
+    assert not compiled.reachable((1, 0), (1, 0))
+
+
+def test_distance_field():
+    """Distances to the flag follow the passable tiles, or are unknown."""
+    compiled = mapcompile.compile_map(walled_map())
+    flag = (2, 0)
+    assert compiled.distance((2, 0), flag) == 0
+    assert compiled.distance((2, 2), flag) == 2
+    # Around through the woodbox at (1, 1)
+    assert compiled.distance((0, 0), flag) == 4
+    assert compiled.distance((4, 0), flag) is None
+    # Only start positions and the flag have fields
+    assert compiled.distances_to((3, 1)) is None
+
+
+def test_chokepoints():
+    """Tiles which split their component are chokepoints."""
+    compiled = mapcompile.compile_map(walled_map())
+    assert compiled.is_chokepoint(1, 1)
+    assert compiled.is_chokepoint(2, 1)
+    assert compiled.is_chokepoint(4, 1)
+    assert not compiled.is_chokepoint(0, 0)
+
+
+def test_components_match_flood_fill():
+    """The run-based labelling agrees with a plain BFS on a generated map."""
+    import mapgen
+    current_map = mapgen.generate(40, 40, players=4, seed=3)
+    compiled = mapcompile.compile_map(current_map)
+    passable = mapcompile._passable(current_map)
+    for x, y, _ in current_map.start_positions:
+        start = int(y) * current_map.width + int(x)
+        distances = mapcompile._distances(start, passable, current_map.width,
+                                          current_map.height)
+        for tile, distance in enumerate(distances):
+            same = (compiled.components[tile] == compiled.components[start])
+            assert same == (distance != -1)
+
+
+def test_sidecar_round_trip(tmp_path):
+    """A compiled map saved to a file loads back the same."""
+    compiled = mapcompile.compile_map(walled_map())
+    path = tmp_path / 'map.compiled'
+    mapcompile.save(compiled, path)
+    loaded = mapcompile.load(path)
+    assert list(loaded.components) == list(compiled.components)
+    assert list(loaded.chokepoints) == list(compiled.chokepoints)
+    assert loaded.fields.keys() == compiled.fields.keys()
+    for tile, field in compiled.fields.items():
+        assert list(loaded.fields[tile]) == list(field)
+
+
+def test_sidecar_truncated(tmp_path):
+    """A truncated or empty sidecar is unusable, rather than short."""
+    path = tmp_path / 'map.compiled'
+    mapcompile.save(mapcompile.compile_map(walled_map()), path)
+    data = path.read_bytes()
+    for length in [0, 5, 20, len(data) // 2, len(data) - 1]:
+        path.write_bytes(data[:length])
+        assert mapcompile.load(path) is None
+
+
+def test_sidecar_of_another_map(tmp_path):
+    """A sidecar of a map of another size is unusable."""
+    path = tmp_path / 'map.compiled'
+    mapcompile.save(mapcompile.compile_map(walled_map()), path)
+    assert mapcompile.load(path, 5, 3) is not None
+    assert mapcompile.load(path, 3, 5) is None
+
+
+def test_compiled_recompiles_bad_sidecar(tmp_path):
+    """compiled() compiles a map again over a truncated sidecar."""
+    current_map = walled_map()
+    current_map.file_path = str(tmp_path / 'walled.txt')
+    path = mapcompile._sidecar_path(current_map)
+    with open(path, 'wb') as f:
+        f.write(mapcompile.MAGIC)
+    mapcompile._compiled.pop(current_map.digest(), None)
+
+    compiled = mapcompile.compiled(current_map)
+    assert len(compiled.components) == 15
+    # and saved it over the bad one, leaving no temporary file
+    assert mapcompile.load(path, 5, 3) is not None
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        os.path.basename(path)]
@@ -0,0 +1,56 @@
+"""Tests of the binary map format."""
+import pytest
+import maps
+
+
+def test_bin_round_trip(tmp_path):
+    """A map written to a binary file reads back the same."""
+    file_path = tmp_path / 'map.bin'
+    maps.map_to_bin(maps.map1, file_path)
+    current_map = maps.map_from_bin(file_path)
+    assert current_map.digest() == maps.map1.digest()
+    assert current_map.rows() == maps.map1.rows()
+    assert current_map.file_path == file_path
+
+
+def test_bytes_round_trip():
+    """A map read from bytes has the same tiles and positions."""
+    current_map = maps.map_from_bytes(maps.map_to_bytes(maps.map0))
+    assert (current_map.width, current_map.height) == (maps.map0.width,
+                                                       maps.map0.height)
+    assert current_map.rows() == maps.map0.rows()
+    assert current_map.flag_position == list(map(float,
+                                                  maps.map0.flag_position))
+
+
+@pytest.mark.parametrize('cut', [1, 10, 200])
+def test_truncated_grid(cut):
+    """A buffer cut short in its grid is refused."""
+    data = maps.map_to_bytes(maps.map1)
+    with pytest.raises(ValueError, match='truncated'):
+        maps.map_from_bytes(data[:-cut])
+
+
+def test_truncated_header(tmp_path):
+    """A file shorter than the header is refused."""
+    file_path = tmp_path / 'map.bin'
+    file_path.write_bytes(maps.MAGIC)
+    with pytest.raises(ValueError):
+        maps.map_from_bin(file_path)
+
+
+def test_not_a_map():
+    """A buffer without the magic bytes is refused."""
+    data = bytearray(maps.map_to_bytes(maps.map0))
+    data[0:8] = b'NOTAMAP\0'
+    with pytest.raises(ValueError, match='not a version'):
+        maps.map_from_bytes(bytes(data))
+
+
+@pytest.mark.parametrize('x, y', [(-1, 0), (0, -1), (5, 0), (0, 3)])
+def test_box_at_outside(x, y):
+    """Tiles outside the map are refused, not read from another row."""
+    current_map = maps.Map(5, 3, [[0] * 5, [1] * 5, [2] * 5], [], [0, 0])
+    assert current_map.boxAt(4, 1) == 1
+    with pytest.raises(IndexError):
+        current_map.boxAt(x, y)
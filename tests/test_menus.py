@@ -0,0 +1,29 @@
+"""Tests of the map previews of the settings menu."""
+import mapgen
+import menus
+import resources
+
+
+def test_large_map_preview():
+    """Large maps are previewed a pixel per tile, in the tile colours."""
+    screen = resources.init_headless()
+    current_map = mapgen.generate(200, 200, players=4, seed=0)
+    preview = menus.map_preview(current_map, (100, 100), screen, save=False)
+    assert preview.get_size() == (100, 100)
+    # Away from the markers, every pixel is a tile colour
+    markers = [(x, y) for x, y, _ in current_map.start_positions]
+    markers.append(tuple(current_map.flag_position))
+    for px in range(0, 100, 7):
+        for py in range(0, 100, 7):
+            if all((x / 2 - px) ** 2 + (y / 2 - py) ** 2 > 16
+                   for x, y in markers):
+                colour = tuple(preview.get_at((px, py)))[:3]
+                assert colour in menus.TILE_COLOURS
+
+
+def test_small_map_preview():
+    """Small maps are previewed as a whole game, drawn and scaled."""
+    screen = resources.init_headless()
+    preview = menus.map_preview(mapgen.generate(10, 10, seed=0), (50, 50),
+                                screen, save=False)
+    assert preview.get_size() == (50, 50)
@@ -0,0 +1,71 @@
+"""Tests of the network messages, and of the server's snapshots."""
+import math
+import maps
+import netcode
+import server
+
+
+def records():
+    """Return some entity records, by id."""
+    return {1: netcode.entity(1, netcode.TANK, 0, 3, 1.5, 2.25, math.pi),
+            2: netcode.entity(2, netcode.WOODBOX, 2, 0, 4.5, 0.5, 0),
+            3: netcode.entity(3, netcode.BULLET, 0, 0, 7.1, 3.9, 1.0)}
+
+
+def test_full_snapshot():
+    """A snapshot without a baseline holds every entity."""
+    entities = records()
+    data = netcode.snapshot(7, entities)
+    assert netcode.snapshot_ticks(data) == (7, 0)
+    assert netcode.read_snapshot(data) == entities
+
+
+def test_delta_snapshot():
+    """A delta holds only what changed, and rebuilds the tick's entities."""
+    base = records()
+    entities = dict(base)
+    entities[1] = netcode.entity(1, netcode.TANK, 0, 2, 1.75, 2.25, math.pi)
+    del entities[3]
+    entities[4] = netcode.entity(4, netcode.FLAG, 0, 0, 9.5, 9.5, 0)
+
+    data = netcode.snapshot(8, entities, 7, base)
+    assert netcode.snapshot_ticks(data) == (8, 7)
+    assert len(data) < len(netcode.snapshot(8, entities))
+    assert netcode.read_snapshot(data, base) == entities
+
+    # Nothing changed: no entity is sent
+    assert (len(netcode.snapshot(9, entities, 8, entities))
+            == len(netcode.snapshot(9, {})))
+
+
+def test_quantized():
+    """Positions and angles are kept to their quantization."""
+    record = netcode.entity(1, netcode.TANK, 0, 3, 1.5, 2.25, math.pi)
+    assert netcode.position(record) == (1.5, 2.25)
+    assert netcode.angle(record) == math.pi
+    # Off the map, positions are clamped
+    assert netcode.position(netcode.entity(1, 0, 0, 0, -1, 2000, 0)) == (
+        0, 0xFFFF / netcode.POSITION_SCALE)
+
+
+def test_messages():
+    """Welcome and input messages read back what they were made of."""
+    map_bytes = maps.map_to_bytes(maps.map0)
+    assert netcode.read_welcome(netcode.welcome(2, 30, map_bytes)) == (
+        2, 30, map_bytes)
+    assert netcode.read_input(netcode.input_message(12, -1, 1, 1)) == (
+        12, -1, 1, 1)
+
+
+def test_server_snapshots():
+    """The server's snapshots, as deltas, rebuild every tick of its game."""
+    game = server.GameServer(server.new_gamestate(maps.map0, 1, 30))
+    assert game.tick_rate == game.gs.settings.FRAMERATE == 30
+
+    base_tick, base = 0, None
+    for _ in range(90):
+        game.step()
+        entities = game.history[game.tick]
+        data = netcode.snapshot(game.tick, entities, base_tick, base)
+        assert netcode.read_snapshot(data, base) == entities
+        base_tick, base = game.tick, entities
@@ -0,0 +1,51 @@
+"""Tests of the uniform grid index."""
+from spatialindex import GridIndex
+
+
+def filled_index():
+    """Return a 20x20 tile index of named points, and the points."""
+    points = {'a': (0.5, 0.5), 'b': (3.9, 3.9), 'c': (4.1, 4.1),
+              'd': (10, 10), 'e': (19.5, 0.5), 'f': (-2, 25)}
+    index = GridIndex(20, 20)
+    for name, (x, y) in points.items():
+        index.move(name, x, y)
+    return index, points
+
+
+def test_query_rect():
+    """Rectangles find the objects inside them, across cells."""
+    index, _ = filled_index()
+    assert index.query_rect(0, 0, 4, 4) == ['a', 'b']
+    assert index.query_rect(3, 3, 11, 11) == ['b', 'c', 'd']
+    assert index.query_rect(0, 0, 20, 20) == ['a', 'b', 'c', 'd', 'e']
+    assert index.query_rect(12, 12, 18, 18) == []
+
+
+def test_query_rect_off_map():
+    """Objects off the map are kept in the edge cells, and still found."""
+    index, _ = filled_index()
+    assert index.query_rect(-5, 20, 0, 30) == ['f']
+
+
+def test_query_radius():
+    """Radius queries find what a brute force distance check finds."""
+    index, points = filled_index()
+    for x, y, radius in [(4, 4, 0.2), (4, 4, 1), (0, 0, 6), (10, 5, 9)]:
+        expected = [name for name, (px, py) in points.items()
+                    if (px - x) ** 2 + (py - y) ** 2 <= radius ** 2]
+        assert index.query_radius(x, y, radius) == expected
+
+
+def test_move_and_remove():
+    """Moved objects are found at their new position, removed ones not."""
+    index, _ = filled_index()
+    index.move('a', 10.5, 10.5)
+    assert index.query_rect(0, 0, 2, 2) == []
+    # Results stay in the order the objects were first added
+    assert index.query_radius(10, 10, 1) == ['a', 'd']
+
+    index.remove('d')
+    index.remove('d')
+    assert 'd' not in index
+    assert len(index) == 5
+    assert index.query_radius(10, 10, 1) == ['a']